@@ -0,0 +1,458 @@
+import asyncio
+import itertools
+import json
+import multiprocessing
+import queue
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import asynccontextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+
+import uvicorn
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import StreamingResponse
+from loguru import logger
+from pydantic import BaseModel
+
+# Port exposed by the pipeline container (see docker/Dockerfile).
+SERVICE_PORT = 8669
+
+# Seconds between two checks for new results while a result stream is open.
+STREAM_POLL_INTERVAL = 0.2
+
+
+class ServiceBusy(RuntimeError):
+    """
+    Raised when a job does not fit into the queue of the JobManager.
+    """
+
+
+# Annotator of a worker process, the stage records queue of the service and the task the worker runs.
+_worker_annotator = None
+_worker_records: Optional["multiprocessing.Queue"] = None
+_worker_task: Optional[int] = None
+
+
+def _init_worker(annotator_factory: Callable, records: "multiprocessing.Queue") -> None:
+    """
+    Initializer of the worker processes of the JobManager: builds the annotator of the worker once and sends its
+    stage records (tagged with the task) to the service while the projects run.
+    """
+    global _worker_annotator, _worker_records
+    _worker_records = records
+    _worker_annotator = annotator_factory()
+    _worker_annotator.instrumentation.listeners.append(lambda record: _worker_records.put((_worker_task, record)))
+
+
+def _annotate_in_worker(task_id: int, project_name: str, project_url: str) -> Tuple[int, List[Dict]]:
+    """
+    Annotates a project in a worker process. The project only succeeded once its results are in the database.
+
+    Returns:
+        Tuple[int, List[Dict]]: The number of result rows and the stage records of the project. If the project fails
+        the stage records are attached to the exception as `stage_records`.
+    """
+    global _worker_task
+    _worker_task = task_id
+    try:
+        df_project = _worker_annotator.annotate_project(project_name, project_url)
+        _worker_annotator.component_aggregator.results_writer.flush()
+    except Exception as exc:
+        exc.stage_records = _worker_annotator.instrumentation.drain()
+        raise
+    finally:
+        _worker_task = None
+    # The records are only needed for the stage status, do not let them pile up in a long-running worker.
+    return len(df_project), _worker_annotator.instrumentation.drain()
+
+
+class Job:
+    """
+    A submitted list of projects. Every project is `queued`, `running`, `succeeded`, `failed` or `cancelled`
+    and keeps the status and wall time of its finished stages. Finished projects are appended to `results`
+    (in the order they finished) as the lines of the result stream: the status and the number of rows (the
+    rows themselves are in the results database, see ResultsWriter).
+    """
+    def __init__(self, job_id: str, projects: List[Tuple[str, str]]):
+        self.job_id = job_id
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.projects: Dict[str, Dict] = OrderedDict()
+        for project_name, project_url in projects:
+            self.projects.setdefault(project_name, {"url": project_url, "status": "queued", "stages": {},
+                                                    "rows": None, "error": None})
+        self.results: List[Dict] = []
+
+    @property
+    def done(self) -> bool:
+        return all(project["status"] in ("succeeded", "failed", "cancelled") for project in self.projects.values())
+
+    @property
+    def status(self) -> str:
+        if self.done:
+            return "finished"
+        if all(project["status"] == "queued" for project in self.projects.values()):
+            return "queued"
+        return "running"
+
+    def to_dict(self, details: bool = True) -> Dict:
+        counts = {}
+        for project in self.projects.values():
+            counts[project["status"]] = counts.get(project["status"], 0) + 1
+        job = {"job_id": self.job_id, "status": self.status, "created_at": self.created_at,
+               "finished_at": self.finished_at, "counts": counts}
+        if details:
+            job["projects"] = {name: dict(project, stages=dict(project["stages"]))
+                               for name, project in self.projects.items()}
+        return job
+
+
+class JobManager:
+    """
+    Runs the projects of submitted jobs on a bounded pool of worker processes. Every worker process keeps its
+    own ComponentAnnotator (and with it the ComponentExtractor, the auto-fl client and the database engine) for
+    the lifetime of the service, so the import and setup cost is paid once and not per batch. Processes keep
+    the Python stages of different projects (graph loading, community detection, aggregation) from competing
+    for the GIL, and keep the process wide redirection of the Arcan output to one project at a time.
+
+    The bookkeeping (queue, job and project status) stays in the service process: one dispatcher thread per
+    worker hands the next project to the pool and waits for its result. A project that is queued by several
+    jobs is annotated by one worker at a time (the runs share the Arcan output and manifest directories of the
+    project), the later runs wait until the earlier one finished.
+    """
+    def __init__(self, annotator_factory: Callable, num_workers: int = 1, max_queued: int = 1000,
+                 max_jobs: int = 100):
+        """
+        Initializes the JobManager instance.
+
+        Args:
+            annotator_factory (Callable): Creates a ComponentAnnotator, called once in every worker process (must
+                be picklable, e.g. a functools.partial of ComponentAnnotator).
+            num_workers (int): Number of projects annotated at the same time.
+            max_queued (int): Maximum number of queued projects, larger submissions raise ServiceBusy.
+            max_jobs (int): Number of finished jobs (with their results) that are kept.
+        """
+        self.annotator_factory = annotator_factory
+        self.num_workers = num_workers
+        self.max_queued = max_queued
+        self.max_jobs = max_jobs
+
+        self.jobs: Dict[str, Job] = OrderedDict()
+        self.queued = 0
+        self._queue: queue.Queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._dispatchers: List[threading.Thread] = []
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._records: Optional["multiprocessing.Queue"] = None
+        self._collector: Optional[threading.Thread] = None
+        self._task_ids = itertools.count()
+        # Projects that are annotated right now (with their job and task) and the tasks of other jobs that wait
+        # for them.
+        self._running: Dict[str, Tuple[Job, int]] = {}
+        self._waiting: Dict[str, List[Tuple[Job, str, str]]] = {}
+
+    def start(self) -> None:
+        """
+        Starts the worker processes (they create their annotators when they start) and the dispatcher threads.
+        """
+        self._records = multiprocessing.Queue()
+        self._collector = threading.Thread(target=self._collect_records, name="stage-records", daemon=True)
+        self._collector.start()
+        self._pool = self._create_pool()
+        for index in range(self.num_workers):
+            dispatcher = threading.Thread(target=self._work, name=f"annotator-{index}", daemon=True)
+            dispatcher.start()
+            self._dispatchers.append(dispatcher)
+        logger.info(f"Started {self.num_workers} annotation workers")
+
+    def stop(self) -> None:
+        """
+        Cancels the queued projects, waits until the running projects finished and stops the worker processes.
+        """
+        for job in list(self.jobs.values()):
+            self.cancel(job.job_id)
+        for _ in self._dispatchers:
+            self._queue.put(None)
+        for dispatcher in self._dispatchers:
+            dispatcher.join()
+        self._dispatchers = []
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+        if self._collector is not None:
+            self._records.put(None)
+            self._collector.join()
+            self._records.close()
+            self._collector = None
+
+    def submit(self, projects: List[Tuple[str, str]]) -> Job:
+        """
+        Queues a job.
+
+        Args:
+            projects (List[Tuple[str, str]]): (name, url) of the projects (duplicate names are annotated once).
+
+        Returns:
+            Job: The queued job.
+
+        Raises:
+            ValueError: If no project is given.
+            ServiceBusy: If the projects do not fit into the queue.
+        """
+        job = Job(uuid.uuid4().hex, projects)
+        if not job.projects:
+            raise ValueError("A job needs at least one project")
+        with self._lock:
+            if self.queued + len(job.projects) > self.max_queued:
+                raise ServiceBusy(f"{self.queued} projects are queued, {len(job.projects)} more exceed the limit "
+                                  f"of {self.max_queued}")
+            self.queued += len(job.projects)
+            self.jobs[job.job_id] = job
+            self._forget_finished_jobs()
+        for project_name, project in job.projects.items():
+            self._queue.put((job, project_name, project["url"]))
+        logger.info(f"Queued job {job.job_id} with {len(job.projects)} projects")
+        return job
+
+    def job(self, job_id: str) -> Optional[Job]:
+        return self.jobs.get(job_id)
+
+    def describe(self, job: Job, details: bool = True) -> Dict:
+        """
+        Returns a consistent copy of the state of a job (see Job.to_dict).
+        """
+        with self._lock:
+            return job.to_dict(details)
+
+    def describe_jobs(self) -> List[Dict]:
+        """
+        Returns the summaries of the known jobs (oldest first).
+        """
+        with self._lock:
+            return [job.to_dict(details=False) for job in self.jobs.values()]
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        """
+        Cancels the queued projects of a job (running projects are finished).
+
+        Returns:
+            Optional[Job]: The job (None if it is unknown).
+        """
+        with self._lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return None
+            for project_name, project in job.projects.items():
+                if project["status"] == "queued":
+                    project["status"] = "cancelled"
+                    job.results.append({"project": project_name, "status": "cancelled"})
+                    self.queued -= 1
+            self._finish(job)
+        return job
+
+    def results(self, job: Job, start: int) -> Tuple[List[Dict], bool]:
+        """
+        Returns the results of a job from position `start` on and whether the job is done.
+        """
+        with self._lock:
+            return job.results[start:], job.done
+
+    def _create_pool(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(max_workers=self.num_workers, initializer=_init_worker,
+                                   initargs=(self.annotator_factory, self._records))
+
+    def _work(self) -> None:
+        while True:
+            task = self._queue.get()
+            if task is None:
+                return
+            job, project_name, project_url = task
+            with self._lock:
+                project = job.projects[project_name]
+                if project["status"] != "queued":
+                    continue
+                if project_name in self._running:
+                    self._waiting.setdefault(project_name, []).append(task)
+                    continue
+                project["status"] = "running"
+                self.queued -= 1
+                task_id = next(self._task_ids)
+                self._running[project_name] = (job, task_id)
+                pool = self._pool
+
+            result = {"project": project_name}
+            try:
+                num_rows, records = pool.submit(_annotate_in_worker, task_id, project_name, project_url).result()
+                result.update(status="succeeded", rows=num_rows)
+            except Exception as exc:
+                records = getattr(exc, "stage_records", [])
+                logger.error(f"Project {project_name} of job {job.job_id} failed:\n{traceback.format_exc()}")
+                result.update(status="failed", error=f"{type(exc).__name__}: {exc}")
+                if isinstance(exc, BrokenProcessPool):
+                    self._replace_pool(pool)
+
+            with self._lock:
+                # The records of the result are complete, the streamed ones may still be on their way.
+                for record in records:
+                    self._update_stage(job, project_name, record)
+                del self._running[project_name]
+                # The first waiting task runs next, the others wait again (cancelled ones are skipped).
+                for waiting in self._waiting.pop(project_name, []):
+                    self._queue.put(waiting)
+                project.update(status=result["status"], error=result.get("error"), rows=result.get("rows"))
+                job.results.append(result)
+                self._finish(job)
+
+    def _replace_pool(self, broken: ProcessPoolExecutor) -> None:
+        """
+        Replaces a pool whose worker process died (killed out of memory, crashed). The projects in flight on the
+        broken pool fail, the following projects run on the new pool.
+        """
+        with self._lock:
+            if self._pool is not broken:
+                return
+            logger.warning("A worker process died, restarting the worker processes")
+            self._pool = self._create_pool()
+        broken.shutdown(wait=False)
+
+    def _collect_records(self) -> None:
+        """
+        Updates the stage status of the running projects with the records the worker processes send.
+        """
+        while True:
+            item = self._records.get()
+            if item is None:
+                return
+            task_id, record = item
+            with self._lock:
+                running = self._running.get(record["project"])
+                # Late records of a finished run are ignored, its result carried them.
+                if running is not None and running[1] == task_id:
+                    self._update_stage(running[0], record["project"], record)
+
+    @staticmethod
+    def _update_stage(job: Job, project_name: str, record: Dict) -> None:
+        if record["stage"] == "project" or record["project"] != project_name:
+            return
+        job.projects[project_name]["stages"][record["stage"]] = {"status": record["status"],
+                                                                 "wall_s": record["wall_s"]}
+
+    def _finish(self, job: Job) -> None:
+        if job.done and job.finished_at is None:
+            job.finished_at = time.time()
+            logger.info(f"Job {job.job_id} finished: {job.to_dict(details=False)['counts']}")
+
+    def _forget_finished_jobs(self) -> None:
+        finished = [job_id for job_id, job in self.jobs.items() if job.done]
+        for job_id in finished[:max(0, len(finished) - self.max_jobs)]:
+            del self.jobs[job_id]
+
+
+class ProjectRequest(BaseModel):
+    name: str
+    url: str
+
+
+class JobRequest(BaseModel):
+    projects: List[ProjectRequest]
+
+
+def create_app(manager: JobManager) -> FastAPI:
+    """
+    Creates the annotation job service.
+
+    Endpoints:
+        POST /jobs: Queues a list of projects ({"projects": [{"name": ..., "url": ...}]}), returns the job.
+        GET /jobs: Summaries of the known jobs.
+        GET /jobs/{job_id}: Status of a job with the status of every project and its finished stages.
+        GET /jobs/{job_id}/results: Streams the finished projects (status, number of rows or error) as JSON lines
+            until the job is done. The rows are read from the results database.
+        DELETE /jobs/{job_id}: Cancels the queued projects of a job.
+        GET /health: Liveness of the service and the number of queued projects.
+
+    Args:
+        manager (JobManager): Runs the jobs (started and stopped with the app).
+
+    Returns:
+        FastAPI: The service.
+    """
+    @asynccontextmanager
+    async def lifespan(_: FastAPI):
+        manager.start()
+        yield
+        manager.stop()
+
+    app = FastAPI(title="Component annotation jobs", lifespan=lifespan)
+
+    def get_job(job_id: str) -> Job:
+        job = manager.job(job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail=f"Unknown job {job_id}")
+        return job
+
+    @app.post("/jobs", status_code=202)
+    def submit_job(request: JobRequest):
+        try:
+            job = manager.submit([(project.name, project.url) for project in request.projects])
+        except ValueError as exc:
+            raise HTTPException(status_code=422, detail=str(exc))
+        except ServiceBusy as exc:
+            raise HTTPException(status_code=503, detail=str(exc))
+        return manager.describe(job)
+
+    @app.get("/jobs")
+    def list_jobs():
+        return manager.describe_jobs()
+
+    @app.get("/jobs/{job_id}")
+    def job_status(job_id: str):
+        return manager.describe(get_job(job_id))
+
+    @app.delete("/jobs/{job_id}")
+    def cancel_job(job_id: str):
+        return manager.describe(manager.cancel(get_job(job_id).job_id))
+
+    @app.get("/jobs/{job_id}/results")
+    async def job_results(job_id: str):
+        job = get_job(job_id)
+
+        async def lines():
+            sent = 0
+            while True:
+                results, done = manager.results(job, sent)
+                for result in results:
+                    yield json.dumps(result) + "\n"
+                sent += len(results)
+                if done and not results:
+                    return
+                if not results:
+                    await asyncio.sleep(STREAM_POLL_INTERVAL)
+
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+    @app.get("/health")
+    def health():
+        return {"status": "ok", "workers": manager.num_workers, "queued": manager.queued}
+
+    return app
+
+
+def serve(annotator_factory: Callable, num_workers: int = 1, host: str = "0.0.0.0", port: int = SERVICE_PORT,
+          max_queued: int = 1000) -> None:
+    """
+    Runs the annotation job service until it is stopped.
+
+    Args:
+        annotator_factory (Callable): Creates a ComponentAnnotator (called once per worker process, picklable).
+        num_workers (int): Number of projects annotated at the same time.
+        host (str): Interface the service listens on.
+        port (int): Port of the service.
+        max_queued (int): Maximum number of queued projects.
+    """
+    app = create_app(JobManager(annotator_factory, num_workers, max_queued))
+    uvicorn.run(app, host=host, port=port)
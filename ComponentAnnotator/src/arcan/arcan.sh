@@ -5,7 +5,7 @@ ARCAN_CLI_JAR=$(ls "${JARS}"/Arcan2-cli-*.jar)
 
 # The path to the JVM
 JAVA=java
-JAVA_MEMORY=28G
+JAVA_MEMORY=${ARCAN_JAVA_MEMORY:-28G}
 JVM_ARGS="--add-opens java.base/java.util.concurrent.atomic=ALL-UNNAMED --add-opens java.base/sun.reflect.generics.reflectiveObjects=ALL-UNNAMED --add-opens java.base/sun.reflect.annotation=ALL-UNNAMED -Xmx${JAVA_MEMORY}"
 
 ${JAVA} ${JVM_ARGS} -cp "${JARS}/lib/*:${ARCAN_CLI_JAR}" com.arcan.Main $@ || { echo "Failed to execute Arcan."; exit 1; }
\ No newline at end of file
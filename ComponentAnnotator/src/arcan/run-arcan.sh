@@ -1,5 +1,8 @@
 #!/bin/bash
 
+# Exit with the status of Arcan, not of tee (see ArcanSupervisor).
+set -o pipefail
+
 PROJECT=$1
 PROJECT_NAME=$2
 PROG_LANG=$3
@@ -9,12 +12,37 @@ REPOSITORY_PATH=$5
 OUT_PATH=$6
 LOGS_PATH=$7
 
+# Analysis mode: "history" (default) analyses a version every 28 days of the project history,
+# "snapshot" only analyses the newest commit, or COMMIT when it is given.
+MODE=${8:-history}
+COMMIT=$9
+
+# With ARCAN_LOCAL_INPUT=1 the repository has already been checked out in $REPOSITORY_PATH/$PROJECT_NAME
+# (from the local repository cache) and Arcan does not clone the remote itself.
+if [ "$ARCAN_LOCAL_INPUT" = "1" ]; then
+  REMOTE_ARGS=""
+else
+  REMOTE_ARGS="--remote $PROJECT"
+fi
+
 # /$PROJECT_NAME removed from REPISITORY_PATH for n
  # -v before this originally
 
+if [ "$MODE" = "snapshot" ]; then
+  if [ -n "$COMMIT" ]; then
+    mkdir -p $OUT_PATH/versions
+    echo $COMMIT > $OUT_PATH/versions/$PROJECT_NAME.txt
+    VERSION_ARGS="--versions $OUT_PATH/versions/$PROJECT_NAME.txt"
+  else
+    VERSION_ARGS=""
+  fi
+else
+  VERSION_ARGS="-e --startDate 1-1-1 --endDate 2024-12-31 --intervalDays 28"
+fi
+
 /component-annotator/src/arcan/arcan.sh analyze \
               -i $REPOSITORY_PATH/$PROJECT_NAME -p $PROJECT_NAME \
-              --remote $PROJECT \
+              $REMOTE_ARGS \
               -o $OUT_PATH -l $PROG_LANG -f $ARCAN_PATH/filters.yaml \
               output.writeDependencyGraph=true \
               output.writeAffected=false \
@@ -24,4 +52,4 @@ LOGS_PATH=$7
               metrics.smellCharacteristics=none \
               metrics.indexCalculators=none \
               detectors.smellDetectors=none \
-              -e --startDate 1-1-1 --endDate 2024-12-31 --intervalDays 28  2>&1 |& tee outfile $LOGS_PATH/$PROJECT_NAME.log
\ No newline at end of file
+              $VERSION_ARGS  2>&1 |& tee outfile $LOGS_PATH/$PROJECT_NAME.log
\ No newline at end of file
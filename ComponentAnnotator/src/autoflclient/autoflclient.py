@@ -0,0 +1,282 @@
+import asyncio
+import concurrent.futures
+import io
+import json
+import os
+import random
+import shutil
+import tempfile
+import threading
+from typing import Optional, List, Iterable, Tuple, Callable, Awaitable, BinaryIO, Set
+
+import httpx
+import pandas as pd
+from loguru import logger
+
+from autoflclient.responseparser import parse_label_stream
+
+# Hardcoded see docker-compose yaml file.
+AUTO_FL_URL = "http://auto-fl:8000"
+
+# Responses that are worth retrying (auto-fl overloaded or restarting).
+RETRY_STATUS_CODES = {429, 502, 503, 504}
+
+# Response bodies larger than this are spooled to disk while they are received.
+SPOOL_MAX_BYTES = 16 * 1024 * 1024
+
+
+class AutoFLError(RuntimeError):
+    """
+    Raised when auto-fl could not label the files of a project.
+    """
+
+
+class AutoFLClient:
+    """
+    Asynchronous client for the auto-fl annotator. All requests share one pooled HTTP session, at most
+    `max_concurrency` projects are labelled at the same time, every attempt is bounded by a timeout and
+    failed attempts are retried with exponential backoff and full jitter.
+
+    The blocking `label_files_blocking` runs the requests on a private event loop thread, so that synchronous
+    code (such as ComponentAnnotator) reuses the same connections for all projects.
+    """
+    def __init__(self, base_url: str = AUTO_FL_URL, max_concurrency: int = 4, timeout: float = 1800.0,
+                 connect_timeout: float = 10.0, retries: int = 3, backoff: float = 2.0, max_backoff: float = 60.0,
+                 transport: Optional[httpx.AsyncBaseTransport] = None, record_dir: Optional[str] = None):
+        """
+        Initializes the AutoFLClient instance.
+
+        Args:
+            base_url (str): Base URL of auto-fl.
+            max_concurrency (int): Maximum number of projects that are labelled at the same time.
+            timeout (float): Maximum number of seconds of a single attempt (auto-fl clones and labels the
+                project before it answers, so this is large).
+            connect_timeout (float): Maximum number of seconds to establish a connection.
+            retries (int): Number of retries after a failed attempt.
+            backoff (float): Base delay in seconds between attempts (doubled after every attempt).
+            max_backoff (float): Maximum delay in seconds between attempts.
+            transport (httpx.AsyncBaseTransport, optional): Transport of the HTTP session (e.g. an
+                httpx.ASGITransport for the stub server in tests).
+            record_dir (str, optional): Directory where every response body is recorded as `<project name>.json`
+                (can be served by the stub server, see stubserver.py).
+        """
+        self.base_url = base_url
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.transport = transport
+        self.record_dir = record_dir
+
+        self.requests = 0
+        self.failures = 0
+
+        self._client: Optional[httpx.AsyncClient] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        # Futures of the requests of the blocking API that are still running (see cancel_blocking).
+        self._blocking: Set[concurrent.futures.Future] = set()
+
+    async def __aenter__(self) -> "AutoFLClient":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.aclose()
+
+    async def label_files(self, project_name: str, remote: str, languages: List[str]) -> dict:
+        """
+        Requests auto-fl to label the files of a GitHub project.
+
+        Args:
+            project_name (str): Name of the GitHub project.
+            remote (str): HTML URL of the GitHub project.
+            languages (List[str]): Languages of the files to label (e.g. ["java"]).
+
+        Returns:
+            dict: The `result` of the auto-fl response (taxonomy and versions).
+
+        Raises:
+            AutoFLError: If all attempts failed.
+        """
+        async def read_result(response: httpx.Response) -> dict:
+            body = await response.aread()
+            self._record(project_name, io.BytesIO(body))
+            return json.loads(body)["result"]
+
+        return await self._label(project_name, remote, languages, read_result)
+
+    async def label_files_frame(self, project_name: str, remote: str, languages: List[str]) -> pd.DataFrame:
+        """
+        Requests auto-fl to label the files of a GitHub project and parses the response incrementally
+        (see responseparser.parse_label_stream). The response body is spooled to a temporary file while it
+        is received, so large responses are never held in memory as a whole.
+
+        Args:
+            project_name (str): Name of the GitHub project.
+            remote (str): HTML URL of the GitHub project.
+            languages (List[str]): Languages of the files to label (e.g. ["java"]).
+
+        Returns:
+            pd.DataFrame: The file annotations.
+
+        Raises:
+            AutoFLError: If all attempts failed or the response could not be parsed.
+        """
+        async def parse_body(response: httpx.Response) -> pd.DataFrame:
+            with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES) as body:
+                async for chunk in response.aiter_bytes():
+                    body.write(chunk)
+                body.seek(0)
+                self._record(project_name, body)
+                body.seek(0)
+                return await asyncio.to_thread(parse_label_stream, body)
+
+        return await self._label(project_name, remote, languages, parse_body)
+
+    async def _label(self, project_name: str, remote: str, languages: List[str],
+                     handle: Callable[[httpx.Response], Awaitable]):
+        """
+        Sends a labelling request (with retries) and passes the successful response to `handle`.
+        """
+        client, semaphore = self._session()
+        request = client.build_request("POST", "/label/files",
+                                       json={"name": project_name, "remote": remote, "languages": languages})
+
+        async def attempt():
+            response = await client.send(request, stream=True)
+            try:
+                if response.status_code in RETRY_STATUS_CODES:
+                    return None, f"auto-fl responded with {response.status_code}"
+                response.raise_for_status()
+                return await handle(response), None
+            finally:
+                await response.aclose()
+
+        async with semaphore:
+            for attempt_number in range(self.retries + 1):
+                self.requests += 1
+                try:
+                    result, error = await asyncio.wait_for(attempt(), self.timeout)
+                    if error is None:
+                        return result
+                except asyncio.TimeoutError:
+                    error = f"auto-fl did not respond within {self.timeout}s"
+                except httpx.TransportError as exc:
+                    error = f"{type(exc).__name__}: {exc}"
+                except (httpx.HTTPStatusError, KeyError, ValueError) as exc:
+                    # Not retried: auto-fl answered, but could not label the project.
+                    self.failures += 1
+                    raise AutoFLError(f"auto-fl failed to label {project_name}: {exc}") from exc
+
+                if attempt_number < self.retries:
+                    delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt_number))
+                    logger.warning(f"Labelling {project_name} failed ({error}), retrying in {delay:.1f}s")
+                    await asyncio.sleep(delay)
+
+        self.failures += 1
+        raise AutoFLError(f"auto-fl failed to label {project_name} after {self.retries + 1} attempts: {error}")
+
+    async def label_many(self, projects: Iterable[Tuple[str, str]],
+                         languages: List[str]) -> List[object]:
+        """
+        Labels the files of several projects concurrently (at most `max_concurrency` at the same time).
+
+        Args:
+            projects (Iterable[Tuple[str, str]]): (project name, project html url) pairs.
+            languages (List[str]): Languages of the files to label.
+
+        Returns:
+            List[object]: Per project the `result` of the auto-fl response or the AutoFLError.
+        """
+        return await asyncio.gather(*(self.label_files(project_name, remote, languages)
+                                      for project_name, remote in projects), return_exceptions=True)
+
+    def label_files_blocking(self, project_name: str, remote: str, languages: List[str]) -> dict:
+        """
+        Blocking version of label_files (can be called from any thread).
+        """
+        return self.run_blocking(self.label_files(project_name, remote, languages))
+
+    def label_files_frame_blocking(self, project_name: str, remote: str, languages: List[str]) -> pd.DataFrame:
+        """
+        Blocking version of label_files_frame (can be called from any thread).
+        """
+        return self.run_blocking(self.label_files_frame(project_name, remote, languages))
+
+    def run_blocking(self, coroutine: Awaitable):
+        """
+        Runs a coroutine of this client on the event loop thread of the blocking API and waits for the result.
+        """
+        future = asyncio.run_coroutine_threadsafe(coroutine, self._background_loop())
+        with self._lock:
+            self._blocking.add(future)
+        try:
+            return future.result()
+        finally:
+            with self._lock:
+                self._blocking.discard(future)
+
+    def cancel_blocking(self) -> int:
+        """
+        Cancels the running requests of the blocking API. The waiting callers get a
+        concurrent.futures.CancelledError.
+
+        Returns:
+            int: Number of cancelled requests.
+        """
+        with self._lock:
+            futures = list(self._blocking)
+        return sum(future.cancel() for future in futures)
+
+    async def aclose(self) -> None:
+        """
+        Closes the HTTP session.
+        """
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+            self._semaphore = None
+
+    def close(self) -> None:
+        """
+        Closes the HTTP session and stops the event loop thread of the blocking API.
+        """
+        with self._lock:
+            loop, self._loop = self._loop, None
+        if loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(self.aclose(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        self._loop_thread.join()
+        loop.close()
+
+    def _record(self, project_name: str, body: BinaryIO) -> None:
+        if self.record_dir is None:
+            return
+        os.makedirs(self.record_dir, exist_ok=True)
+        with open(os.path.join(self.record_dir, f"{project_name}.json"), "wb") as file:
+            shutil.copyfileobj(body, file)
+
+    def _session(self) -> Tuple[httpx.AsyncClient, asyncio.Semaphore]:
+        # Created lazily, inside the event loop that uses them.
+        if self._client is None:
+            limits = httpx.Limits(max_connections=self.max_concurrency,
+                                  max_keepalive_connections=self.max_concurrency)
+            timeout = httpx.Timeout(self.timeout, connect=self.connect_timeout)
+            self._client = httpx.AsyncClient(base_url=self.base_url, limits=limits, timeout=timeout,
+                                             transport=self.transport)
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._client, self._semaphore
+
+    def _background_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._loop_thread = threading.Thread(target=self._loop.run_forever, name="auto-fl-client",
+                                                     daemon=True)
+                self._loop_thread.start()
+            return self._loop
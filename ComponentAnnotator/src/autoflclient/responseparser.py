@@ -0,0 +1,123 @@
+from array import array
+from typing import BinaryIO, Dict, List
+
+import ijson
+import numpy as np
+import pandas as pd
+
+# Columns of the file annotations (see ComponentAnnotator._annotate_file).
+FILE_ANNOT_COLUMNS = ["path", "package", "distribution", "unannotated", "label"]
+
+
+def taxonomy_array(taxonomy: Dict[str, str]) -> np.ndarray:
+    """
+    Converts the auto-fl taxonomy (label index as string -> label) into an array indexed by label index.
+
+    Args:
+        taxonomy (Dict[str, str]): Taxonomy of the auto-fl response.
+
+    Returns:
+        np.ndarray: Labels ordered by label index.
+    """
+    labels = np.empty(len(taxonomy), dtype=object)
+    for index, label in taxonomy.items():
+        labels[int(index)] = label
+    return labels
+
+
+def file_annotation_frame(paths: List[str], packages: List[str], distributions: np.ndarray,
+                          unannotated: List[bool], taxonomy: Dict[str, str]) -> pd.DataFrame:
+    """
+    Builds the file annotation frame from column data. The labels of all files are computed with a single
+    argmax over the stacked distributions.
+
+    Args:
+        paths (List[str]): Path per file.
+        packages (List[str]): Package per file.
+        distributions (np.ndarray): 2-D array (files x labels) of label distributions.
+        unannotated (List[bool]): Unannotated flag per file.
+        taxonomy (Dict[str, str]): Taxonomy of the auto-fl response.
+
+    Returns:
+        pd.DataFrame: File annotations. `distribution` holds one float32 row view of `distributions` per
+        file and `package`/`label` are categoricals.
+    """
+    if len(paths) == 0:
+        return pd.DataFrame(columns=FILE_ANNOT_COLUMNS)
+
+    labels = taxonomy_array(taxonomy)[np.argmax(distributions, axis=1)]
+    return pd.DataFrame({
+        "path": paths,
+        "package": pd.Categorical(packages),
+        "distribution": list(distributions),
+        "unannotated": np.asarray(unannotated, dtype=bool),
+        "label": pd.Categorical(labels),
+    })
+
+
+def parse_label_response(result: dict) -> pd.DataFrame:
+    """
+    Parses the `result` of an auto-fl response (only the files of the first version).
+
+    Args:
+        result (dict): Result of the auto-fl response.
+
+    Returns:
+        pd.DataFrame: File annotations (see file_annotation_frame).
+    """
+    files = list(result['versions'][0]['files'].values())
+    distributions = np.asarray([file["annotation"]["distribution"] for file in files], dtype=np.float32)
+    return file_annotation_frame([file["path"] for file in files], [file["package"] for file in files], distributions,
+                                 [file["annotation"]["unannotated"] for file in files], result["taxonomy"])
+
+
+def parse_label_stream(stream: BinaryIO) -> pd.DataFrame:
+    """
+    Parses an auto-fl response body incrementally (same output as parse_label_response). Files are converted
+    into column data one at a time, so the response is never held in memory as Python objects.
+
+    Args:
+        stream (BinaryIO): The response body (`{"result": ...}`).
+
+    Returns:
+        pd.DataFrame: File annotations (see file_annotation_frame).
+
+    Raises:
+        ValueError: If the response is not valid JSON or the distributions have different lengths.
+    """
+    taxonomy = {}
+    paths, packages, unannotated = [], [], []
+    distributions = array("f")
+    width = None
+
+    version = -1
+    builder, depth = None, 0
+    try:
+        for prefix, event, value in ijson.parse(stream, use_float=True):
+            if builder is not None:
+                builder.event(event, value)
+                depth += {"start_map": 1, "start_array": 1, "end_map": -1, "end_array": -1}.get(event, 0)
+                if depth == 0:
+                    file = builder.value
+                    distribution = file["annotation"]["distribution"]
+                    if width is None:
+                        width = len(distribution)
+                    elif len(distribution) != width:
+                        raise ValueError(f"Distribution of {file['path']} has {len(distribution)} labels, "
+                                         f"expected {width}")
+                    distributions.extend(float(probability) for probability in distribution)
+                    paths.append(file["path"])
+                    packages.append(file["package"])
+                    unannotated.append(file["annotation"]["unannotated"])
+                    builder = None
+            elif prefix == "result.versions.item" and event == "start_map":
+                version += 1
+            elif version == 0 and prefix == "result.versions.item.files" and event == "map_key":
+                builder = ijson.ObjectBuilder()
+            elif prefix.startswith("result.taxonomy.") and event == "string":
+                taxonomy[prefix[len("result.taxonomy."):]] = value
+    except ijson.JSONError as exc:
+        raise ValueError(f"Invalid auto-fl response: {exc}") from exc
+
+    matrix = np.frombuffer(distributions, dtype=np.float32).reshape(len(paths), width or 0)
+    return file_annotation_frame(paths, packages, matrix, unannotated, taxonomy)
@@ -0,0 +1,93 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+from typing import Dict, Optional
+
+import uvicorn
+from fastapi import FastAPI, HTTPException
+from pydantic import BaseModel
+
+
+class Analysis(BaseModel):
+    name: str
+    remote: str
+    languages: list = []
+
+
+def load_recorded_responses(directory: str) -> Dict[str, dict]:
+    """
+    Loads recorded auto-fl responses (one `<project name>.json` file per project with the response body, see
+    AutoFLClient `record_dir`).
+
+    Args:
+        directory (str): Directory with the recorded responses.
+
+    Returns:
+        Dict[str, dict]: Project name -> result.
+    """
+    responses = {}
+    for filename in sorted(os.listdir(directory)):
+        if filename.endswith(".json"):
+            with open(os.path.join(directory, filename)) as file:
+                responses[filename[:-len(".json")]] = json.load(file)["result"]
+    return responses
+
+
+def create_app(responses: Dict[str, dict], delay: float = 0.0, failure_rate: float = 0.0,
+               seed: Optional[int] = None) -> FastAPI:
+    """
+    Creates a stub auto-fl server that serves recorded responses, so that the pipeline can be run and
+    benchmarked without the annotator.
+
+    Args:
+        responses (Dict[str, dict]): Project name -> result of the auto-fl response.
+        delay (float): Seconds the server waits before answering a request (simulated labelling time).
+        failure_rate (float): Fraction of requests answered with 503 (simulated overload).
+        seed (int, optional): Seed of the failure simulation.
+
+    Returns:
+        FastAPI: The stub server. `app.state.stats` counts the requests and the maximum number of concurrent
+        requests.
+    """
+    app = FastAPI(title="auto-fl stub")
+    app.state.stats = {"requests": 0, "failed": 0, "in_flight": 0, "max_in_flight": 0}
+    rng = random.Random(seed)
+
+    @app.post("/label/files")
+    async def label_files(analysis: Analysis):
+        stats = app.state.stats
+        stats["requests"] += 1
+        stats["in_flight"] += 1
+        stats["max_in_flight"] = max(stats["max_in_flight"], stats["in_flight"])
+        try:
+            if delay:
+                await asyncio.sleep(delay)
+            if failure_rate and rng.random() < failure_rate:
+                stats["failed"] += 1
+                raise HTTPException(status_code=503, detail="auto-fl stub overloaded")
+            if analysis.name not in responses:
+                raise HTTPException(status_code=404, detail=f"No recorded response for {analysis.name}")
+            return {"result": responses[analysis.name]}
+        finally:
+            stats["in_flight"] -= 1
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stub auto-fl server serving recorded responses.")
+    parser.add_argument("responses", help="Directory with recorded responses (<project name>.json).")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--delay", type=float, default=0.0, help="Seconds before every response.")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Fraction of requests answered with 503.")
+    args = parser.parse_args()
+
+    app = create_app(load_recorded_responses(args.responses), args.delay, args.failure_rate)
+    uvicorn.run(app, host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
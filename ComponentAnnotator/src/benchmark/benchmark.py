@@ -0,0 +1,516 @@
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from types import SimpleNamespace
+from typing import Dict, List, Optional, Tuple
+
+import networkx as nx
+import numpy as np
+import pandas as pd
+from loguru import logger
+
+from componentaggregator.componentaggregator import ComponentAggregator
+from componentannotator.componentannotator import ComponentAnnotator
+from componentextractor.communitydetection import COMMUNITY_DETECTORS, create_detector, to_networkx
+from componentextractor.csrgraph import read_graphml_csr
+from instrumentation.instrumentation import summarize
+from replay.replay import Fixtures
+
+
+def synthetic_project(num_nodes: int, num_communities: int = None, avg_degree: int = 4,
+                      num_labels: int = 20, unmatched_ratio: float = 0.05, seed: int = 42):
+    """
+    Generates a synthetic project: an Arcan-like dependency graph, auto-fl-like file annotations
+    and a community structure over the graph.
+
+    Args:
+        num_nodes (int): Number of nodes (files) in the dependency graph.
+        num_communities (int): Number of communities (default is roughly sqrt(num_nodes)).
+        avg_degree (int): Average number of outgoing dependencies per node.
+        num_labels (int): Number of labels in the taxonomy.
+        unmatched_ratio (float): Fraction of graph nodes that do not have a file annotation.
+        seed (int): Seed of the random generator.
+
+    Returns:
+        Tuple[nx.DiGraph, pd.DataFrame, SimpleNamespace]: Dependency graph, file annotations and
+        components (with a `communities` attribute like cdlib's NodeClustering).
+    """
+    rng = np.random.default_rng(seed)
+    if num_communities is None:
+        num_communities = max(1, int(np.sqrt(num_nodes)))
+
+    node_ids = [f"n{i}" for i in range(num_nodes)]
+    community_of = rng.integers(0, num_communities, size=num_nodes)
+    paths = [f"src/main/java/pkg{community_of[i]}/File{i}.java" for i in range(num_nodes)]
+
+    dep_graph = nx.DiGraph()
+    dep_graph.add_nodes_from((node_id, {"filePathRelative": path, "constructType": "FILE"})
+                             for node_id, path in zip(node_ids, paths))
+    sources = rng.integers(0, num_nodes, size=num_nodes * avg_degree)
+    targets = rng.integers(0, num_nodes, size=num_nodes * avg_degree)
+    dep_graph.add_edges_from((node_ids[s], node_ids[t]) for s, t in zip(sources, targets) if s != t)
+
+    annotated = rng.random(num_nodes) >= unmatched_ratio
+    distributions = rng.random((num_nodes, num_labels), dtype=np.float32)
+    distributions /= distributions.sum(axis=1, keepdims=True)
+    file_annot = pd.DataFrame({
+        "path": [path for path, keep in zip(paths, annotated) if keep],
+        "package": [f"pkg{community_of[i]}" for i in range(num_nodes) if annotated[i]],
+        "distribution": [list(distributions[i]) for i in range(num_nodes) if annotated[i]],
+        "unannotated": rng.random(int(annotated.sum())) < 0.1,
+        "label": [f"Label{np.argmax(distributions[i])}" for i in range(num_nodes) if annotated[i]],
+    })
+
+    communities = [[] for _ in range(num_communities)]
+    for node_id, community in zip(node_ids, community_of):
+        communities[community].append(node_id)
+    components = SimpleNamespace(communities=[community for community in communities if community])
+
+    return dep_graph, file_annot, components
+
+
+def legacy_aggregate(components, file_annot: pd.DataFrame, dep_graph) -> pd.DataFrame:
+    """
+    Reference implementation of ComponentAggregator.build_aggregate before it was vectorized
+    (one boolean scan and one concat per node, one concat per community). Used to check the
+    output of the vectorized implementation and as the benchmark baseline.
+    """
+    df_project = pd.DataFrame(columns=file_annot.columns)
+    df_project["component"] = None
+    df_project['componentlabel'] = None
+    df_project['mismatch'] = None
+    df_project['case'] = None
+
+    for community_id, community in enumerate(components.communities):
+        df_component = pd.DataFrame(columns=file_annot.columns)
+        for node_id in community:
+            file_path = dep_graph.nodes[node_id]['filePathRelative']
+            row = file_annot.loc[file_annot['path'] == file_path]
+            df_component = pd.concat([df_component, row])
+
+        label_counts = df_component['label'].value_counts()
+        majority_label = label_counts.idxmax() if not label_counts.empty else "None"
+
+        df_component['componentlabel'] = majority_label
+        df_component['component'] = community_id
+        df_component['mismatch'] = df_component['label'] != df_component['componentlabel']
+        df_project = pd.concat([df_project, df_component])
+
+    return df_project
+
+
+def _aggregator(components, file_annot: pd.DataFrame, dep_graph) -> ComponentAggregator:
+    aggregator = ComponentAggregator()
+    aggregator.set_state(components, file_annot, dep_graph, "benchmark")
+    return aggregator
+
+
+def bench_aggregation(sizes: List[int], legacy_max_nodes: int = 10000) -> List[Tuple]:
+    """
+    Benchmarks the vectorized aggregation against the legacy implementation on synthetic projects.
+
+    Args:
+        sizes (List[int]): Graph sizes (number of nodes) to benchmark.
+        legacy_max_nodes (int): The legacy implementation is quadratic, it is skipped above this size.
+
+    Returns:
+        List[Tuple]: (nodes, vectorized seconds, legacy seconds or None) per size.
+    """
+    results = []
+    for num_nodes in sizes:
+        dep_graph, file_annot, components = synthetic_project(num_nodes)
+        aggregator = _aggregator(components, file_annot, dep_graph)
+
+        start = time.perf_counter()
+        aggregator.build_aggregate()
+        vectorized = time.perf_counter() - start
+
+        legacy = None
+        if num_nodes <= legacy_max_nodes:
+            start = time.perf_counter()
+            legacy_aggregate(components, file_annot, dep_graph)
+            legacy = time.perf_counter() - start
+
+        speedup = f"{legacy / vectorized:.1f}x" if legacy is not None else "legacy skipped"
+        legacy_str = f"{legacy:.3f}s" if legacy is not None else "-"
+        logger.info(f"aggregate nodes={num_nodes}: vectorized {vectorized:.3f}s, legacy {legacy_str} ({speedup})")
+        results.append((num_nodes, vectorized, legacy))
+
+    return results
+
+
+def measure(function, *args):
+    """
+    Runs a function and measures its wall time and peak (Python heap) memory with tracemalloc.
+
+    Returns:
+        Tuple[object, float, int]: Result of the function, seconds and peak bytes.
+    """
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        result = function(*args)
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def bench_graphml(sizes: List[int]) -> List[Tuple]:
+    """
+    Compares nx.read_graphml with the streaming read_graphml_csr loader on synthetic GraphML files.
+
+    Args:
+        sizes (List[int]): Graph sizes (number of nodes) to benchmark.
+
+    Returns:
+        List[Tuple]: (nodes, networkx seconds, networkx peak bytes, csr seconds, csr peak bytes) per size.
+    """
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for num_nodes in sizes:
+            dep_graph, _, _ = synthetic_project(num_nodes)
+            path = os.path.join(tmp_dir, f"dependency-graph-{num_nodes}.graphml")
+            nx.write_graphml(dep_graph, path)
+            del dep_graph
+
+            _, nx_seconds, nx_peak = measure(nx.read_graphml, path)
+            _, csr_seconds, csr_peak = measure(read_graphml_csr, path)
+
+            logger.info(f"graphml nodes={num_nodes} ({os.path.getsize(path) / 2 ** 20:.1f} MiB): "
+                        f"networkx {nx_seconds:.2f}s / {nx_peak / 2 ** 20:.1f} MiB peak, "
+                        f"csr {csr_seconds:.2f}s / {csr_peak / 2 ** 20:.1f} MiB peak "
+                        f"({nx_peak / max(csr_peak, 1):.1f}x less memory)")
+            results.append((num_nodes, nx_seconds, nx_peak, csr_seconds, csr_peak))
+
+    return results
+
+
+def planted_graph(num_nodes: int, num_communities: Optional[int] = None, avg_degree: int = 4,
+                  mixing: float = 0.2, seed: int = 42) -> nx.DiGraph:
+    """
+    Generates an Arcan-like dependency graph with a planted community structure: a fraction `mixing` of
+    the dependencies crosses communities, the others stay within the community (package) of the file.
+
+    Args:
+        num_nodes (int): Number of nodes (files).
+        num_communities (int): Number of communities (default is roughly sqrt(num_nodes)).
+        avg_degree (int): Average number of outgoing dependencies per node.
+        mixing (float): Fraction of dependencies between communities.
+        seed (int): Seed of the random generator.
+
+    Returns:
+        nx.DiGraph: The dependency graph (files of community c are in package pkg<c>).
+    """
+    rng = np.random.default_rng(seed)
+    if num_communities is None:
+        num_communities = max(1, int(np.sqrt(num_nodes)))
+
+    community_of = rng.integers(0, num_communities, size=num_nodes)
+    members = [np.flatnonzero(community_of == community) for community in range(num_communities)]
+    node_ids = [f"n{i}" for i in range(num_nodes)]
+
+    dep_graph = nx.DiGraph()
+    dep_graph.add_nodes_from((node_ids[i], {"filePathRelative": f"src/main/java/pkg{community_of[i]}/File{i}.java"})
+                             for i in range(num_nodes))
+    sources = rng.integers(0, num_nodes, size=num_nodes * avg_degree)
+    crossing = rng.random(len(sources)) < mixing
+    targets = rng.integers(0, num_nodes, size=len(sources))
+    for index in np.flatnonzero(~crossing):
+        community = members[community_of[sources[index]]]
+        targets[index] = community[rng.integers(0, len(community))]
+    dep_graph.add_edges_from((node_ids[s], node_ids[t]) for s, t in zip(sources, targets) if s != t)
+    return dep_graph
+
+
+def _partition_labels(communities, nodes: List[str]) -> np.ndarray:
+    """
+    Community index per node (nodes that are not in any community get their own singleton community).
+    """
+    label_of = {node_id: index for index, community in enumerate(communities) for node_id in community}
+    labels = [label_of.get(node_id, -1) for node_id in nodes]
+    next_label = len(communities)
+    for position, label in enumerate(labels):
+        if label == -1:
+            labels[position] = next_label
+            next_label += 1
+    return np.array(labels)
+
+
+def normalized_mutual_information(first, second, nodes: List[str]) -> float:
+    """
+    NMI (arithmetic mean normalization) of two partitions of the same nodes.
+
+    Args:
+        first: Communities of the first partition.
+        second: Communities of the second partition.
+        nodes (List[str]): The nodes of the graph.
+
+    Returns:
+        float: NMI in [0, 1] (1 for identical partitions).
+    """
+    first_labels = _partition_labels(first, nodes)
+    second_labels = _partition_labels(second, nodes)
+    _, first_codes = np.unique(first_labels, return_inverse=True)
+    _, second_codes = np.unique(second_labels, return_inverse=True)
+
+    joint = np.zeros((first_codes.max() + 1, second_codes.max() + 1))
+    np.add.at(joint, (first_codes, second_codes), 1)
+    joint /= len(nodes)
+    first_marginal, second_marginal = joint.sum(axis=1), joint.sum(axis=0)
+
+    nonzero = joint > 0
+    mutual_information = np.sum(joint[nonzero] * np.log(joint[nonzero] /
+                                                        np.outer(first_marginal, second_marginal)[nonzero]))
+    first_entropy = -np.sum(first_marginal * np.log(first_marginal))
+    second_entropy = -np.sum(second_marginal * np.log(second_marginal))
+    if first_entropy + second_entropy == 0:
+        return 1.0
+    return float(2 * mutual_information / (first_entropy + second_entropy))
+
+
+def partition_modularity(graph: nx.Graph, communities) -> float:
+    """
+    Modularity of a partition on the undirected graph (nodes without a community count as singletons).
+    """
+    undirected = graph.to_undirected(as_view=True)
+    nodes = list(undirected.nodes)
+    labels = _partition_labels(communities, nodes)
+    partition: Dict[int, set] = {}
+    for node_id, label in zip(nodes, labels.tolist()):
+        partition.setdefault(label, set()).add(node_id)
+    return nx.community.modularity(undirected, partition.values())
+
+
+def bench_communities(sizes: List[int], graphml_paths: List[str], backends: List[str], seed: int = 42,
+                      compact: bool = False) -> List[Tuple]:
+    """
+    Runs the community detection backends on synthetic graphs (with a planted community structure) and
+    on recorded Arcan graphs. Reports runtime, peak memory (Python heap in a second run, native allocations of
+    Infomap and igraph are not traced), modularity and the NMI with the communities found by Infomap.
+
+    Args:
+        sizes (List[int]): Sizes (number of nodes) of the synthetic graphs.
+        graphml_paths (List[str]): Recorded Arcan dependency graphs.
+        backends (List[str]): Names of the backends (see COMMUNITY_DETECTORS).
+        seed (int): Seed of the synthetic graphs and of the backends.
+        compact (bool): Load the recorded graphs as CSRGraphs.
+
+    Returns:
+        List[Tuple]: (graph, backend, seconds, peak bytes, communities, modularity, NMI with Infomap) per run.
+    """
+    graphs = [(f"synthetic-{num_nodes}", planted_graph(num_nodes, seed=seed)) for num_nodes in sizes]
+    graphs += [(os.path.basename(path), read_graphml_csr(path) if compact else nx.read_graphml(path))
+               for path in graphml_paths]
+    backends = ["infomap"] + [backend for backend in backends if backend != "infomap"]
+
+    results = []
+    for graph_name, graph in graphs:
+        nx_graph = to_networkx(graph)
+        nodes = list(nx_graph.nodes)
+        reference = None
+        for backend in backends:
+            detector = create_detector(backend, **({"seed": seed} if backend != "package" else {}))
+            # tracemalloc slows down Python code considerably, so time and memory are measured in separate runs.
+            start = time.perf_counter()
+            components = detector.detect(graph)
+            seconds = time.perf_counter() - start
+            _, _, peak = measure(detector.detect, graph)
+            communities = components.communities
+            if reference is None:
+                reference = communities
+            modularity = partition_modularity(nx_graph, communities)
+            nmi = normalized_mutual_information(reference, communities, nodes)
+
+            logger.info(f"communities {graph_name} ({len(nodes)} nodes) {backend}: {seconds:.2f}s, "
+                        f"{peak / 2 ** 20:.1f} MiB peak, {len(communities)} communities, "
+                        f"modularity {modularity:.3f}, NMI with infomap {nmi:.3f}")
+            results.append((graph_name, backend, seconds, peak, len(communities), modularity, nmi))
+
+    return results
+
+
+def auto_fl_response(file_annot: pd.DataFrame, num_labels: int) -> Dict:
+    """
+    Builds an auto-fl response body for file annotations (the inverse of responseparser.parse_label_response).
+    """
+    files = {
+        path: {"path": path, "package": package,
+               "annotation": {"distribution": [float(value) for value in distribution],
+                              "unannotated": bool(unannotated)}}
+        for path, package, distribution, unannotated in zip(file_annot["path"], file_annot["package"],
+                                                             file_annot["distribution"], file_annot["unannotated"])
+    }
+    taxonomy = {str(index): f"Label{index}" for index in range(num_labels)}
+    return {"result": {"taxonomy": taxonomy, "versions": [{"files": files}]}}
+
+
+def synthetic_fixtures(fixtures_dir: str, num_projects: int, num_nodes: int, num_labels: int = 20,
+                       seed: int = 42) -> Fixtures:
+    """
+    Generates a fixtures directory (see replay.Fixtures) with synthetic projects of a configurable size, so
+    that the pipeline can be replayed without recorded production data.
+
+    Args:
+        fixtures_dir (str): The fixtures directory.
+        num_projects (int): Number of projects.
+        num_nodes (int): Number of files (graph nodes) per project.
+        num_labels (int): Number of labels in the taxonomy.
+        seed (int): Seed of the first project (project i uses seed + i).
+
+    Returns:
+        Fixtures: The generated fixtures.
+    """
+    fixtures = Fixtures(fixtures_dir)
+    projects = []
+    for index in range(num_projects):
+        project_name = f"synthetic-{num_nodes}-{index}"
+        dep_graph, file_annot, _ = synthetic_project(num_nodes, num_labels=num_labels, seed=seed + index)
+        nx.write_graphml(dep_graph, fixtures.graph_file(project_name, must_exist=False))
+        with open(os.path.join(fixtures.autofl_dir, f"{project_name}.json"), "w") as file:
+            json.dump(auto_fl_response(file_annot, num_labels), file)
+        projects.append({"name": project_name, "html_url": f"https://github.com/synthetic/{project_name}"})
+    fixtures.record_projects(projects)
+    return fixtures
+
+
+def bench_pipeline(fixtures_dir: str, num_workers: int = 1, pipelined: bool = False, compact: bool = False,
+                   latency: float = 0.0, community_detection: str = "infomap") -> Dict:
+    """
+    Replays all projects of a fixtures directory through ComponentAnnotator (results go to a temporary SQLite
+    database) and reports the end-to-end throughput and the per stage times.
+
+    Args:
+        fixtures_dir (str): Recorded or synthetic fixtures (see replay.Fixtures).
+        num_workers (int): Number of worker processes.
+        pipelined (bool): Run the labelling and graph stages of a project concurrently.
+        compact (bool): Load the dependency graphs as CSR graphs.
+        latency (float): Seconds the replayed auto-fl waits before every response.
+        community_detection (str): Community detection backend.
+
+    Returns:
+        Dict: projects, succeeded, failed, elapsed_s, projects_per_hour, files_per_second and the mean wall time
+        per stage (`stages`).
+    """
+    projects = [(project["name"], project["html_url"]) for project in Fixtures(fixtures_dir).load_projects()]
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        # The aggregator also writes a CSV per project into the working directory.
+        os.chdir(tmp_dir)
+        try:
+            annotator = ComponentAnnotator("java", pipelined=pipelined, compact_graph=compact,
+                                           replay_dir=os.path.join(cwd, fixtures_dir), replay_latency=latency,
+                                           community_detection=community_detection,
+                                           database_url=f"sqlite:///{os.path.join(tmp_dir, 'results.db')}")
+            frames = annotator.annotate_project_list(projects, num_workers)
+        finally:
+            os.chdir(cwd)
+
+    stats = annotator.batch_stats
+    summary = summarize(annotator.instrumentation.records)
+    num_files = sum(len(df_project) for df_project in frames)
+    result = {
+        "projects": len(projects),
+        "succeeded": stats["succeeded"],
+        "failed": stats["failed"],
+        "elapsed_s": stats["elapsed"],
+        "projects_per_hour": stats["projects_per_hour"],
+        "files_per_second": num_files / stats["elapsed"] if stats["elapsed"] > 0 else 0.0,
+        "stages": summary["wall_mean_s"].to_dict() if not summary.empty else {},
+    }
+    logger.info(f"pipeline {len(projects)} projects ({num_workers} workers, pipelined={pipelined}): "
+                f"{result['elapsed_s']:.2f}s, {result['projects_per_hour']:.0f} projects/hour, "
+                f"{result['files_per_second']:.0f} files/s, {result['failed']} failed")
+    return result
+
+
+def compare_to_baseline(result: Dict, baseline: Dict, tolerance: float = 0.2) -> List[str]:
+    """
+    Compares a pipeline benchmark result with a baseline result (see bench_pipeline).
+
+    Args:
+        result (Dict): The current result.
+        baseline (Dict): The baseline result.
+        tolerance (float): Allowed relative slowdown.
+
+    Returns:
+        List[str]: Descriptions of the regressions (empty if there are none).
+    """
+    regressions = []
+    if result["projects_per_hour"] < baseline["projects_per_hour"] * (1 - tolerance):
+        regressions.append(f"throughput {result['projects_per_hour']:.0f} projects/hour, "
+                           f"baseline {baseline['projects_per_hour']:.0f}")
+    for stage, seconds in result["stages"].items():
+        baseline_seconds = baseline["stages"].get(stage)
+        if baseline_seconds is not None and seconds > baseline_seconds * (1 + tolerance):
+            regressions.append(f"stage {stage} {seconds:.3f}s per project, baseline {baseline_seconds:.3f}s")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks for the component annotation pipeline.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    aggregate_parser = subparsers.add_parser("aggregate", help="Benchmark ComponentAggregator.build_aggregate.")
+    aggregate_parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    aggregate_parser.add_argument("--legacy-max-nodes", type=int, default=10000)
+
+    graphml_parser = subparsers.add_parser("graphml", help="Compare the GraphML loaders (time and peak memory).")
+    graphml_parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+
+    communities_parser = subparsers.add_parser("communities", help="Compare the community detection backends.")
+    communities_parser.add_argument("--sizes", type=int, nargs="*", default=[1000, 10000, 50000])
+    communities_parser.add_argument("--graphml", nargs="*", default=[], help="Recorded Arcan dependency graphs.")
+    communities_parser.add_argument("--backends", nargs="+", default=list(COMMUNITY_DETECTORS),
+                                    choices=list(COMMUNITY_DETECTORS))
+    communities_parser.add_argument("--seed", type=int, default=42)
+    communities_parser.add_argument("--compact", action="store_true", help="Load recorded graphs as CSR graphs.")
+
+    fixtures_parser = subparsers.add_parser("fixtures", help="Generate synthetic fixtures for the pipeline benchmark.")
+    fixtures_parser.add_argument("fixtures_dir")
+    fixtures_parser.add_argument("--projects", type=int, default=10)
+    fixtures_parser.add_argument("--nodes", type=int, default=1000, help="Files per project.")
+    fixtures_parser.add_argument("--seed", type=int, default=42)
+
+    pipeline_parser = subparsers.add_parser("pipeline", help="Replay fixtures through the whole pipeline.")
+    pipeline_parser.add_argument("fixtures_dir", help="Recorded (main.py --record) or synthetic fixtures.")
+    pipeline_parser.add_argument("--workers", type=int, default=1)
+    pipeline_parser.add_argument("--pipelined", action="store_true")
+    pipeline_parser.add_argument("--compact", action="store_true")
+    pipeline_parser.add_argument("--latency", type=float, default=0.0, help="Seconds per replayed auto-fl response.")
+    pipeline_parser.add_argument("--community-detection", default="infomap", choices=list(COMMUNITY_DETECTORS))
+    pipeline_parser.add_argument("--output", help="Write the result (JSON) to this file.")
+    pipeline_parser.add_argument("--baseline", help="Fail if the result is slower than this earlier result (JSON).")
+    pipeline_parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative slowdown.")
+
+    args = parser.parse_args()
+    if args.command == "aggregate":
+        bench_aggregation(args.sizes, args.legacy_max_nodes)
+    elif args.command == "graphml":
+        bench_graphml(args.sizes)
+    elif args.command == "communities":
+        bench_communities(args.sizes, args.graphml, args.backends, args.seed, args.compact)
+    elif args.command == "fixtures":
+        synthetic_fixtures(args.fixtures_dir, args.projects, args.nodes, seed=args.seed)
+    elif args.command == "pipeline":
+        result = bench_pipeline(args.fixtures_dir, args.workers, args.pipelined, args.compact, args.latency,
+                                args.community_detection)
+        if args.output:
+            with open(args.output, "w") as file:
+                json.dump(result, file, indent=1)
+        if args.baseline:
+            with open(args.baseline) as file:
+                regressions = compare_to_baseline(result, json.load(file), args.tolerance)
+            for regression in regressions:
+                logger.error(f"Performance regression: {regression}")
+            if regressions:
+                sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,29 +1,47 @@
+import time
+from datetime import datetime, timezone
+from typing import Callable, List, Optional
+
+import networkx as nx
+import numpy as np
 import pandas as pd
-from sqlalchemy import create_engine
 from loguru import logger
 
+from componentaggregator.pathindex import PathIndex
+from componentextractor.csrgraph import CSRGraph
+from instrumentation.instrumentation import Instrumentation
+from resultswriter.resultswriter import ResultsWriter
+
 class ComponentAggregator:
-    def __init__(self):
+    def __init__(self, results_writer: Optional[ResultsWriter] = None, sinks: Optional[List] = None,
+                 instrumentation: Optional[Instrumentation] = None):
         """
         Initializes a ComponentAggregator instance with default attributes.
 
+        Args:
+            results_writer (ResultsWriter, optional): Writer for the component annotations (default is a
+                ResultsWriter for the pipeline database, see docker-compose yaml file).
+            sinks (List, optional): Additional outputs (e.g. ParquetSink) the component annotations are written to.
+            instrumentation (Instrumentation, optional): Records the aggregate, write (database) and sinks stages.
+
         Fields:
             self.components (cdlib.classes.node_clustering.NodeClustering): Node (file) community representation of project.
             self.file_annot (pd.DataFrame): DataFrame containing file annotations associated with components.
+            self.path_index (PathIndex): Index of the annotation paths, matches the graph paths to annotations.
+            self.match_stats (Dict): Match counts of the last aggregate (see PathIndex.reconcile).
         """
         self.project_name = None
         self.components = None
         self.dep_graph = None
         self.file_annot = None
+        self.path_index = None
+        self.match_stats = {}
         self.valid = False
 
-        # Hardcoded see docker-compose yaml file.
-        self.db_username = "pipeline_user"
-        self.db_password = "pipeline_pw"
-        self.db_host = "db_pipeline"
-        self.db_name = "pipeline"
-        self.engine = create_engine(
-            f'postgresql+psycopg://{self.db_username}:{self.db_password}@{self.db_host}/{self.db_name}')
+        self.results_writer = results_writer if results_writer is not None else ResultsWriter()
+        self.engine = self.results_writer.engine
+        self.sinks = sinks if sinks is not None else []
+        self.instrumentation = instrumentation if instrumentation is not None else Instrumentation()
 
     def set_state(self, components, file_annot: pd.DataFrame, dep_graph, project_name: str):
         """
@@ -32,19 +50,25 @@ class ComponentAggregator:
         Args:
             components (cdlib.classes.node_clustering.NodeClustering): Node (file) community representation of project.
             file_annot (pd.DataFrame): DataFrame containing file annotations associated with components.
-            dep_graph:
+            dep_graph (nx.Graph | CSRGraph): Dependency graph of the project.
             project_name:
         """
         self.components = components
         self.dep_graph = dep_graph
         self.file_annot = file_annot
+        self.path_index = PathIndex(file_annot['path'])
+        self.match_stats = {}
         self.project_name = project_name
         self.valid = True
 
-    def create_aggregate(self) -> pd.DataFrame:
+    def create_aggregate(self, on_written: Optional[Callable[[pd.DataFrame], None]] = None) -> pd.DataFrame:
         """
         Creates an aggregated representation of components based on the provided graph and file annotations.
-        NOTE: Also puts resulting dataframe inside a postgres database.
+        NOTE: Also writes resulting dataframe to the component_annotations table (see ResultsWriter).
+
+        Args:
+            on_written (Callable, optional): Called with the dataframe once it is in the database (the write may be
+                asynchronous, see ResultsWriter), or right away if there is nothing to write.
 
         Returns:
             pd.DataFrame: Dataframe containing files in the project with component and component-label information.
@@ -52,104 +76,185 @@ class ComponentAggregator:
         if not self.valid:
             raise ValueError("Illegal state -> project not set.")
 
-        communities = self.components.communities
+        if not self.components.communities:
+            df_project = self._handle_no_communities(self._initialize_project_dataframe())
+            if on_written is not None:
+                on_written(df_project)
+            return df_project
 
-        df_project = self._initialize_project_dataframe()
-        if not communities:
-            return self._handle_no_communities(df_project)
-
-        for community_id, community in enumerate(communities):
-            df_component = self._create_component_dataframe(community)
-            majority_label = self._get_majority_label(df_component)
+        with self.instrumentation.stage(self.project_name, "aggregate") as counts:
+            df_project = self.build_aggregate()
+            counts["rows"] = len(df_project)
+            counts.update(self.match_stats)
+        project_name = self.project_name
+        enqueued_at, enqueued = datetime.now(timezone.utc).isoformat(), time.perf_counter()
 
-            df_project = self._update_project_dataframe(df_project, df_component, community_id, majority_label)
+        def written(write_s: float) -> None:
+            # The write stage is the database transaction (asynchronous by default, see ResultsWriter);
+            # queued_s is the time from handing the rows to the writer until they were in the database.
+            self.instrumentation.record_stage(project_name, "write", write_s, enqueued_at, rows=len(df_project),
+                                              queued_s=time.perf_counter() - enqueued)
+            if on_written is not None:
+                on_written(df_project)
 
-        self._save_to_database(df_project)
+        with self.instrumentation.stage(self.project_name, "sinks", rows=len(df_project)):
+            self._save_to_database(df_project, written)
 
         return df_project
 
-    def _initialize_project_dataframe(self) -> pd.DataFrame:
+    def build_aggregate(self) -> pd.DataFrame:
         """
-        Initializes the project dataframe.
+        Builds the aggregated dataframe without writing it anywhere.
+
+        The aggregation is vectorized: one node -> community table is built for all communities, joined
+        once against the file annotations (graph paths are reconciled with the annotation paths by the
+        PathIndex, see _match_files) and the majority label of every component is computed
+        with a single groupby. Rows are ordered by community, then by node order within the community and
+        then by the order of the file annotations (same as annotating the communities one by one).
 
         Returns:
-            pd.DataFrame: Initialized project dataframe.
+            pd.DataFrame: Dataframe containing files in the project with component and component-label information.
         """
-        df_project = pd.DataFrame(columns=self.file_annot.columns)
-        df_project["component"] = None
-        df_project['componentlabel'] = None
-        df_project['mismatch'] = None
-        df_project['case'] = None
-        return df_project
+        if not self.valid:
+            raise ValueError("Illegal state -> project not set.")
 
-    def _handle_no_communities(self, df_project: pd.DataFrame) -> pd.DataFrame:
+        communities = self.components.communities
+        df_project = self._initialize_project_dataframe()
+        if not communities:
+            return self._handle_no_communities(df_project)
+
+        matches = self._match_files(communities)
+        if matches.empty:
+            return df_project
+
+        majority_labels = self._majority_labels(matches)
+
+        df_matched = self.file_annot.iloc[matches['row'].to_numpy()]
+        component_labels = matches['component'].map(majority_labels).to_numpy()
+        df_matched = df_matched.assign(component=matches['component'].to_numpy(),
+                                       componentlabel=component_labels,
+                                       mismatch=df_matched['label'].to_numpy() != component_labels,
+                                       case=np.nan)
+        # Same (object) column types as the initialized project dataframe.
+        return df_matched[df_project.columns].astype(object)
+
+    def _community_membership(self, communities) -> pd.DataFrame:
         """
-        Handles the case where no communities are found.
+        Creates the node -> community table.
 
         Args:
-            df_project (pd.DataFrame): Project dataframe.
+            communities: The communities from the components.
 
         Returns:
-            pd.DataFrame: Updated project dataframe for the no communities case.
+            pd.DataFrame: One row per (node, community) with the file path of the node.
         """
-        logger.error("No communities from infomap detected. Returning empty dataframe")
-        new_row = {'projectname': self.project_name, "case": "no_communities_found"}
-        df_project = pd.concat([df_project, pd.DataFrame([new_row])], ignore_index=True)
-        return df_project
+        sizes = [len(community) for community in communities]
+        nodes = [node_id for community in communities for node_id in community]
+        if isinstance(self.dep_graph, CSRGraph):
+            node_paths = self.dep_graph.node_attributes('filePathRelative')
+        else:
+            node_paths = nx.get_node_attributes(self.dep_graph, 'filePathRelative')
+        return pd.DataFrame({
+            'component': np.repeat(np.arange(len(communities)), sizes),
+            'path': [node_paths.get(node_id) for node_id in nodes],
+        })
 
-    def _create_component_dataframe(self, community) -> pd.DataFrame:
+    def _match_files(self, communities) -> pd.DataFrame:
         """
-        Creates a dataframe for a given community.
+        Joins the node -> community table with the file annotations. The file path of every node is resolved
+        to an annotation path by the path index (exact or unambiguous suffix match), the match counts are kept
+        in self.match_stats.
 
         Args:
-            community: A community from the components.
+            communities: The communities from the components.
 
         Returns:
-            pd.DataFrame: Dataframe for the given community.
+            pd.DataFrame: Matched (component, row, label) triples in output order, `row` being the
+            position of the file annotation in self.file_annot.
         """
-        df_component = pd.DataFrame(columns=self.file_annot.columns)
-        for node_id in community:
-            node_attr = self.dep_graph.nodes[node_id]
-            file_path = node_attr['filePathRelative']
-            row = self.file_annot.loc[self.file_annot['path'] == file_path]
-            df_component = pd.concat([df_component, row])
-        return df_component
+        membership = self._community_membership(communities)
+        keys, self.match_stats = self.path_index.reconcile(membership['path'])
+        membership = pd.DataFrame({'component': membership['component'].to_numpy(), 'key': keys,
+                                   'order': np.arange(len(membership))})
+        self._log_match_stats()
+
+        rows = pd.DataFrame({'key': self.path_index.row_keys,
+                             'row': np.arange(len(self.file_annot)),
+                             'label': self.file_annot['label'].to_numpy()})
+
+        matches = membership[membership['key'] >= 0].merge(rows[rows['key'] >= 0], on='key', how='inner')
+        return matches.sort_values(['order', 'row'], kind='stable').reset_index(drop=True)
 
-    def _get_majority_label(self, df_component: pd.DataFrame) -> str:
+    def _log_match_stats(self):
+        stats = self.match_stats
+        if stats["suffix"] or stats["ambiguous"] or stats["unmatched"]:
+            logger.info(f"Matched {stats['exact'] + stats['suffix']} of {stats['nodes']} files of {self.project_name} "
+                        f"to annotations ({stats['match_rate']:.1%}): {stats['exact']} exact, {stats['suffix']} by "
+                        f"path suffix, {stats['ambiguous']} ambiguous, {stats['unmatched']} unmatched")
+
+    @staticmethod
+    def _majority_labels(matches: pd.DataFrame) -> pd.Series:
         """
-        Gets the majority label for a component.
+        Gets the majority label of every component and "None" for components without labels. Ties are broken
+        like `value_counts().idxmax()` of the component's labels (the legacy aggregate), which does not sort tied
+        counts stably, so tied components are resolved with value_counts itself.
 
         Args:
-            df_component (pd.DataFrame): Dataframe for a component.
+            matches (pd.DataFrame): Output of _match_files.
+
+        Returns:
+            pd.Series: Majority label indexed by component.
+        """
+        counts = matches.groupby(['component', 'label'], sort=False).size().reset_index(name='count')
+        leaders = counts[counts['count'] == counts.groupby('component', sort=False)['count'].transform('max')]
+        tied = leaders['component'].duplicated(keep=False).to_numpy()
+
+        majority_labels = pd.Series("None", index=pd.unique(matches['component']), dtype=object)
+        majority_labels.loc[leaders.loc[~tied, 'component'].to_numpy()] = leaders.loc[~tied, 'label'].to_numpy()
+        if tied.any():
+            tied_matches = matches[matches['component'].isin(leaders.loc[tied, 'component'])]
+            tie_labels = tied_matches.groupby('component', sort=False)['label'].agg(
+                lambda labels: labels.value_counts().idxmax())
+            majority_labels.loc[tie_labels.index] = tie_labels.to_numpy()
+        return majority_labels
+
+    def _initialize_project_dataframe(self) -> pd.DataFrame:
+        """
+        Initializes the project dataframe.
 
         Returns:
-            str: Majority label.
+            pd.DataFrame: Initialized project dataframe.
         """
-        label_counts = df_component['label'].value_counts()
-        majority_label = label_counts.idxmax() if not label_counts.empty else "None"
-        return majority_label
+        df_project = pd.DataFrame(columns=self.file_annot.columns)
+        df_project["component"] = None
+        df_project['componentlabel'] = None
+        df_project['mismatch'] = None
+        df_project['case'] = None
+        return df_project
 
-    def _update_project_dataframe(self, df_project, df_component, community_id, component_label) -> pd.DataFrame:
+    def _handle_no_communities(self, df_project: pd.DataFrame) -> pd.DataFrame:
         """
-        Updates the project dataframe with information from a component.
+        Handles the case where no communities are found.
 
         Args:
             df_project (pd.DataFrame): Project dataframe.
-            df_component (pd.DataFrame): Dataframe for a component.
-            community_id: ID of the current community.
-            component_label: label for the component.
+
+        Returns:
+            pd.DataFrame: Updated project dataframe for the no communities case.
         """
-        df_component['componentlabel'] = component_label
-        df_component['component'] = community_id
-        df_component['mismatch'] = df_component['label'] != df_component['componentlabel']
-        return pd.concat([df_project, df_component])
+        logger.error("No communities from infomap detected. Returning empty dataframe")
+        new_row = {'projectname': self.project_name, "case": "no_communities_found"}
+        df_project = pd.concat([df_project, pd.DataFrame([new_row])], ignore_index=True)
+        return df_project
 
-    def _save_to_database(self, df_project: pd.DataFrame):
+    def _save_to_database(self, df_project: pd.DataFrame, on_written: Optional[Callable[[float], None]] = None):
         """
         Saves the project dataframe to the database and CSV file.
 
         Args:
             df_project (pd.DataFrame): Project dataframe.
+            on_written (Callable, optional): Called with the write time once the dataframe is in the database
+                (see ResultsWriter.write).
         """
         if df_project.empty:
             new_row = {'projectname': self.project_name, "case": "no_file_matches"}
@@ -158,6 +263,7 @@ class ComponentAggregator:
             df_project['case'] = "success"
 
         df_project['projectname'] = self.project_name
-        df_project.to_sql(self.project_name, self.engine, if_exists='replace', index=False)
-        df_project.to_csv(f'output_{self.project_name}.csv', index=False)
-        logger.info(f"Wrote component annotations for {self.project_name} to database.")
\ No newline at end of file
+        self.results_writer.write(self.project_name, df_project, on_written)
+        for sink in self.sinks:
+            sink.write(self.project_name, df_project)
+        df_project.to_csv(f'output_{self.project_name}.csv', index=False)
\ No newline at end of file
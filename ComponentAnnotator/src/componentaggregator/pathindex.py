@@ -0,0 +1,158 @@
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+# Kinds of matches (see PathIndex.resolve), in the order of their codes in PathIndex.reconcile.
+MATCH_KINDS = ("exact", "suffix", "ambiguous", "unmatched")
+
+
+def normalize_path(path: Optional[str]) -> Optional[str]:
+    """
+    Normalizes a file path for matching: forward slashes, no leading "./" or "/" and no empty components.
+
+    Args:
+        path (str, optional): The file path.
+
+    Returns:
+        Optional[str]: The normalized path (None for a missing or empty path).
+    """
+    if not isinstance(path, str):
+        return None
+    components = [component for component in path.replace("\\", "/").split("/") if component not in ("", ".")]
+    return "/".join(components) if components else None
+
+
+class _TrieNode:
+    """
+    Node of the reversed path trie. `terminal` is the key of the path that ends here, `unique` the key of the
+    only path below this node (-1 if there is none, -2 if there are several).
+    """
+    __slots__ = ("children", "terminal", "unique")
+
+    def __init__(self):
+        self.children: Dict[str, "_TrieNode"] = {}
+        self.terminal = -1
+        self.unique = -1
+
+
+class PathIndex:
+    """
+    Reconciles the file paths of the dependency graph (Arcan's `filePathRelative`) with the file paths of the
+    annotations (auto-fl's `path`), which are not always rooted the same way (module prefixes, leading
+    slashes, `src/main/java` below a module directory, ...).
+
+    A graph path is matched exactly (after normalize_path) or, failing that, by component-wise suffix: either
+    the annotation path ends with the whole graph path, or the graph path ends with the whole annotation path.
+    The annotation paths are stored in a trie of reversed path components, so a lookup walks the graph path
+    once from its file name upwards. A suffix match must be unambiguous: several annotation paths ending with
+    the graph path, or several graph paths claiming the same annotation, are left unmatched.
+    """
+    def __init__(self, paths: Iterable[Optional[str]]):
+        """
+        Initializes the PathIndex instance.
+
+        Args:
+            paths (Iterable[str]): The annotation paths, in row order (duplicates share a key).
+        """
+        self.keys: Dict[str, int] = {}
+        self.paths: List[str] = []
+        self.root = _TrieNode()
+
+        row_keys = []
+        for path in paths:
+            normalized = normalize_path(path)
+            if normalized is None:
+                row_keys.append(-1)
+                continue
+            key = self.keys.get(normalized)
+            if key is None:
+                key = self.keys[normalized] = len(self.paths)
+                self.paths.append(normalized)
+                self._insert(normalized, key)
+            # The unnormalized path is an alias, so that paths written the same way skip the normalization.
+            self.keys.setdefault(path, key)
+            row_keys.append(key)
+        # Key of every annotation row (-1 for rows without a path).
+        self.row_keys = np.asarray(row_keys, dtype=np.int64)
+        # Hash index of the (normalized and unnormalized) annotation paths for the bulk lookup in reconcile.
+        self._lookup = pd.Index(list(self.keys), dtype=object)
+        self._lookup_keys = np.fromiter(self.keys.values(), dtype=np.int64, count=len(self.keys))
+
+    def _insert(self, path: str, key: int) -> None:
+        node = self.root
+        for component in reversed(path.split("/")):
+            node = node.children.setdefault(component, _TrieNode())
+            # -1: no path below yet, -2: more than one path below.
+            node.unique = key if node.unique == -1 else -2
+        node.terminal = key
+
+    def resolve(self, path: Optional[str]) -> tuple:
+        """
+        Finds the annotation path of a graph path.
+
+        Args:
+            path (str, optional): The graph path.
+
+        Returns:
+            tuple: (key, kind) with the key of the annotation path (-1 if unmatched) and the kind of the match
+            ("exact", "suffix", "ambiguous" or "unmatched").
+        """
+        normalized = normalize_path(path)
+        if normalized is None:
+            return -1, "unmatched"
+        key = self.keys.get(normalized)
+        if key is not None:
+            return key, "exact"
+
+        node, longest_suffix, consumed = self.root, -1, True
+        for component in reversed(normalized.split("/")):
+            node = node.children.get(component)
+            if node is None:
+                consumed = False
+                break
+            if node.terminal >= 0:
+                longest_suffix = node.terminal
+        # The annotation path ends with the whole graph path.
+        if consumed and node.unique >= 0:
+            return node.unique, "suffix"
+        # The graph path ends with the whole annotation path.
+        if longest_suffix >= 0:
+            return longest_suffix, "suffix"
+        return -1, "ambiguous" if consumed else "unmatched"
+
+    def reconcile(self, paths: Sequence[Optional[str]]) -> tuple:
+        """
+        Resolves the paths of the graph nodes.
+
+        Args:
+            paths (Sequence[str]): File paths of the graph nodes (e.g. a list or a pd.Series).
+
+        Returns:
+            tuple: (keys, stats) with the key of the annotation path of every node (np.ndarray, -1 if unmatched,
+            compare with row_keys) and the match counts (nodes, exact, suffix, ambiguous, unmatched, match_rate).
+        """
+        # Paths written like an annotation path are looked up at once, only the others are resolved one by one.
+        paths = pd.Series(paths, dtype=object)
+        positions = self._lookup.get_indexer(paths)
+        keys = np.full(len(paths), -1, dtype=np.int64)
+        keys[positions >= 0] = self._lookup_keys[positions[positions >= 0]]
+        kinds = np.where(keys >= 0, 0, 3).astype(np.int8)
+        for position in np.flatnonzero(keys < 0):
+            keys[position], kind = self.resolve(paths.iat[position])
+            kinds[position] = MATCH_KINDS.index(kind)
+
+        # An annotation claimed by an exact match, or by more than one suffix match, is not reassigned.
+        suffix = kinds == 1
+        if suffix.any():
+            suffix_keys, suffix_counts = np.unique(keys[suffix], return_counts=True)
+            contested = np.union1d(suffix_keys[suffix_counts > 1], keys[kinds == 0])
+            dropped = suffix & np.isin(keys, contested)
+            keys[dropped] = -1
+            kinds[dropped] = 2
+
+        counts = np.bincount(kinds, minlength=len(MATCH_KINDS))
+        stats = {kind: int(count) for kind, count in zip(MATCH_KINDS, counts)}
+        stats["nodes"] = len(keys)
+        stats["match_rate"] = (stats["exact"] + stats["suffix"]) / len(keys) if len(keys) else 0.0
+        return keys, stats
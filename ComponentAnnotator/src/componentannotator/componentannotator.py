@@ -1,13 +1,30 @@
-from typing import List, Tuple
+import itertools
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, FIRST_COMPLETED, FIRST_EXCEPTION, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, List, Tuple, Iterable, Iterator, Optional, Set
 import numpy as np
 import pandas as pd
-import requests
 from loguru import logger
 from requests import HTTPError
 
+from autoflclient.autoflclient import AutoFLClient, AUTO_FL_URL
+from componentextractor.arcansupervisor import ArcanSupervisor, DEFAULT_ARCAN_TIMEOUT
+from componentextractor.communitycache import CommunityCache, MemoizedDetector
+from componentextractor.communitydetection import create_detector
 from componentextractor.componentextractor import ComponentExtractor
+from componentextractor.graphcache import GraphCache
+from projectextractor.preflight import PreflightCache, PreflightChecker
 from projectextractor.projectextractor import ProjectExtractor
+from replay.replay import Fixtures
+from repositorycache.repositorycache import RepositoryCache
+from resultswriter.parquetsink import ParquetSink
+from resultswriter.resultswriter import DEFAULT_DATABASE_URL, ResultsWriter
+from scheduler.scheduler import CostModel, load_deferred, log_plan, merge_deferred, plan_batch, save_deferred
+from stagemanifest.stagemanifest import StageManifest
 from componentaggregator.componentaggregator import ComponentAggregator
+from instrumentation.instrumentation import Instrumentation
 
 
 def get_label(distribution, taxonomy):
@@ -23,105 +40,709 @@ def get_label(distribution, taxonomy):
     """
     return taxonomy[str(np.argmax(distribution))]
 
+
+# Per-process annotator used by the workers of the process pool (see `_init_worker`).
+_worker_annotator: Optional["ComponentAnnotator"] = None
+
+
+def _init_worker(config: dict) -> None:
+    """
+    Initializer for the worker processes of `ComponentAnnotator.iter_annotate_project_list`.
+    Every worker builds its own ComponentAnnotator once so that it can be reused for all the
+    projects the worker processes.
+
+    Args:
+        config: Keyword arguments for the ComponentAnnotator of the worker (see ComponentAnnotator.config).
+    """
+    global _worker_annotator
+    _worker_annotator = ComponentAnnotator(**config)
+
+
+def _annotate_in_worker(project_name: str, project_url: str, size_kb: Optional[int] = None,
+                        commit: Optional[str] = None) -> Tuple[pd.DataFrame, List[dict]]:
+    """
+    Annotates a single project inside a worker process.
+
+    Args:
+        project_name: Name of the GitHub project.
+        project_url: HTML URL of the GitHub project.
+        size_kb: Repository size of the project (GitHub `size`), recorded for the cost model if known.
+        commit: Commit to analyse in snapshot mode (see ComponentAnnotator.annotate_project).
+
+    Returns:
+        Tuple[pd.DataFrame, List[dict]]: Dataframe containing files in the project with component and
+        component-label information, and the stage records of the project (see Instrumentation). If the project
+        fails the stage records are attached to the exception as `stage_records`.
+    """
+    if size_kb is not None:
+        _worker_annotator.project_sizes[project_name] = size_kb
+    try:
+        df_components = _worker_annotator.annotate_project(project_name, project_url, commit)
+    except Exception as exc:
+        exc.stage_records = _worker_annotator.instrumentation.drain()
+        raise
+    return df_components, _worker_annotator.instrumentation.drain()
+
+
+def unpack_project(project: Tuple) -> Tuple[str, str, Optional[str]]:
+    """
+    Splits a project tuple of a project list into name, html url and the pinned commit (None if not given).
+    """
+    project_name, project_url, *pinned = project
+    return project_name, project_url, pinned[0] if pinned else None
+
+
+def projects_per_hour(num_projects: int, elapsed_seconds: float) -> float:
+    """
+    Computes the batch throughput.
+
+    Args:
+        num_projects: Number of projects that were processed (succeeded or failed).
+        elapsed_seconds: Wall-clock time of the batch in seconds.
+
+    Returns:
+        float: Throughput in projects/hour.
+    """
+    if elapsed_seconds <= 0:
+        return 0.0
+    return num_projects * 3600.0 / elapsed_seconds
+
+
 class ComponentAnnotator:
     """
     The ComponentAnnotator class is responsible for annotating files in abandoned GitHub projects.
     It utilizes the ProjectExtractor to find abandoned projects, the ComponentExtractor to run the
     Arcan tool for component information, and the auto-fl annotator for file-level annotations (weak labels).
     """
-    def __init__(self, language: str = "java"):
+    def __init__(self, language: str = "java", pipelined: bool = False, graph_cache_dir: Optional[str] = None,
+                 compact_graph: bool = False, analysis_mode: str = "history",
+                 repository_cache_dir: Optional[str] = None, repository_filter: Optional[str] = None,
+                 manifest_path: Optional[str] = None, force: bool = False, parquet_dir: Optional[str] = None, auto_fl_url: str = AUTO_FL_URL,
+                 community_detection: str = "infomap", community_parameters: Optional[dict] = None,
+                 community_cache_dir: Optional[str] = None, metrics_path: Optional[str] = None,
+                 database_url: str = DEFAULT_DATABASE_URL, record_dir: Optional[str] = None,
+                 replay_dir: Optional[str] = None, replay_latency: float = 0.0,
+                 arcan_timeout: Optional[float] = DEFAULT_ARCAN_TIMEOUT, arcan_max_rss_mb: Optional[float] = None,
+                 arcan_heap: Optional[str] = None, arcan_slots: Optional[int] = None,
+                 github_cache_dir: Optional[str] = None, incremental: bool = False, schedule: bool = False,
+                 time_budget: Optional[float] = None, cost_history: Optional[List[str]] = None,
+                 deferred_path: Optional[str] = None,
+                 preflight: bool = False, max_size_kb: Optional[int] = None, preflight_cache: Optional[str] = None):
         """
         Initializes the ComponentAnnotator with default values for the ProjectExtractor.
 
         Args:
             language: The programming language used in the project.
+            pipelined: If True the auto-fl labelling and the Arcan graph extraction of a project
+                run at the same time instead of one after another.
+            graph_cache_dir: Directory for compact on-disk copies of the parsed dependency graphs
+                (default is None, graphs are only cached in memory).
+            compact_graph: Stream the dependency graphs into compact CSR graphs instead of networkx graphs
+                (lower peak memory for large projects).
+            analysis_mode: Arcan analysis mode, "history" (a version every 28 days) or "snapshot" (newest commit only).
+            repository_cache_dir: Directory of the local git mirror cache. If given, repositories are cloned once
+                and updated incrementally between runs (default is None, Arcan clones the remote every run).
+            repository_filter: Partial clone filter of the mirrors in the repository cache, e.g. "blob:none" (blobs
+                are then fetched when a version is checked out; default is None, full mirrors).
+            manifest_path: Path of the stage manifest (SQLite). If given, the completed stages of every project
+                are checkpointed and annotate_project skips or resumes projects of an interrupted batch.
+            force: Ignore (and reset) the stages recorded in the manifest.
+            parquet_dir: If given, the component annotations of every project are also appended to a Parquet
+                dataset (partitioned by project) in this directory.
+            auto_fl_url: Base URL of the auto-fl annotator (e.g. a stub server, see autoflclient.stubserver).
+            community_detection: Community detection backend (see componentextractor.communitydetection).
+            community_parameters: Parameters of the community detection backend (e.g. {"seed": 42}).
+            community_cache_dir: Directory of the memoized community detection results. If given, the communities of
+                a graph are only computed once per backend and parameters (default is None, no memo).
+            metrics_path: JSONL file the per stage timing and memory records are appended to (default is None,
+                records are only kept for the batch summary).
+            database_url: SQLAlchemy URL of the results database (e.g. "sqlite:///results.db" for local runs).
+            record_dir: If given, the GitHub search results, auto-fl responses and Arcan dependency graphs are
+                recorded into this fixtures directory (see replay.Fixtures).
+            replay_dir: If given, the inputs are replayed from this fixtures directory instead of querying GitHub,
+                auto-fl and running Arcan.
+            replay_latency: Seconds the replayed auto-fl waits before every response.
+            arcan_timeout: Maximum seconds of an Arcan run (None for no limit).
+            arcan_max_rss_mb: Maximum resident memory of an Arcan run in MiB (default is None, no limit).
+            arcan_heap: Maximum heap of the Arcan JVM, e.g. "8G" (default is the heap configured in arcan.sh).
+            arcan_slots: Maximum number of concurrent Arcan runs on this machine, shared by all worker processes
+                (default is derived from the number of cores and the available memory).
+            github_cache_dir: Directory of the GitHub search response cache (conditional requests, default is None).
+            incremental: Check the remote HEAD of every project first (git ls-remote) and reuse the stored aggregate
+                of projects whose HEAD did not change since they were annotated; projects whose HEAD changed are
+                annotated again. Requires a manifest.
+            schedule: Order the projects of annotate_projects by their estimated cost, longest first (see
+                scheduler.plan_batch). The GitHub search is then finished before the first project starts.
+            time_budget: Seconds a batch of annotate_projects may take; projects that are not expected to finish
+                within the budget are deferred (implies schedule).
+            cost_history: JSONL metrics files of earlier batches the cost model is fitted to (default is
+                metrics_path).
+            deferred_path: JSON file of the deferred projects. The projects deferred by earlier batches are
+                scheduled with the next batch, the projects deferred again are stored for the one after
+                (default is None, deferred projects are only kept in self.deferred_projects).
+            preflight: Check the projects before the heavy stages (existence, renames, primary language and size,
+                see projectextractor.preflight) and skip the ineligible ones. GitHub search results are checked
+                with their search metadata, project lists with concurrent requests (see preflight_projects).
+            max_size_kb: Maximum repository size in KiB (GitHub `size`) of pre-flight checked projects
+                (default is None, no limit).
+            preflight_cache: SQLite file of the pre-flight results, reused for a week (default is None, no cache).
         """
-        self.project_extractor = ProjectExtractor(min_stars=100, last_pushed_date="2022-01-01", language=language)
-        self.component_extractor = ComponentExtractor(language)
-        self.component_aggregator = ComponentAggregator()
+        if incremental and manifest_path is None:
+            raise ValueError("The incremental mode needs a manifest (manifest_path)")
+        if record_dir is not None and replay_dir is not None:
+            raise ValueError("Cannot record and replay fixtures at the same time")
+
+        # Constructor arguments, used to build the annotators of worker processes.
+        self.config = {"language": language, "pipelined": pipelined, "graph_cache_dir": graph_cache_dir,
+                       "compact_graph": compact_graph, "analysis_mode": analysis_mode,
+                       "repository_cache_dir": repository_cache_dir, "repository_filter": repository_filter,
+                       "manifest_path": manifest_path,
+                       "force": force, "parquet_dir": parquet_dir,
+                       "auto_fl_url": auto_fl_url, "community_detection": community_detection,
+                       "community_parameters": community_parameters, "community_cache_dir": community_cache_dir,
+                       "metrics_path": metrics_path, "database_url": database_url, "record_dir": record_dir,
+                       "replay_dir": replay_dir, "replay_latency": replay_latency, "arcan_timeout": arcan_timeout,
+                       "arcan_max_rss_mb": arcan_max_rss_mb, "arcan_heap": arcan_heap, "arcan_slots": arcan_slots,
+                       "github_cache_dir": github_cache_dir, "incremental": incremental, "schedule": schedule,
+                       "time_budget": time_budget, "cost_history": cost_history, "deferred_path": deferred_path,
+                       "preflight": preflight,
+                       "max_size_kb": max_size_kb, "preflight_cache": preflight_cache}
+
+        self.project_extractor = ProjectExtractor(min_stars=100, last_pushed_date="2022-01-01", language=language,
+                                                  cache_dir=github_cache_dir)
+        repository_cache = None
+        if repository_cache_dir is not None:
+            # The snapshot mode only needs the newest commit.
+            repository_cache = RepositoryCache(repository_cache_dir, shallow=analysis_mode == "snapshot",
+                                               blob_filter=repository_filter)
+        community_detector = create_detector(community_detection, **(community_parameters or {}))
+        if community_cache_dir is not None:
+            community_detector = MemoizedDetector(community_detector, CommunityCache(community_cache_dir))
+        self.instrumentation = Instrumentation(metrics_path)
+        arcan_supervisor = ArcanSupervisor(arcan_timeout, arcan_max_rss_mb, arcan_heap, arcan_slots)
+        self.component_extractor = ComponentExtractor(language, GraphCache(graph_cache_dir, compact=compact_graph),
+                                                      analysis_mode, repository_cache, community_detector,
+                                                      self.instrumentation, arcan_supervisor)
+        sinks = [ParquetSink(parquet_dir)] if parquet_dir is not None else []
+        self.component_aggregator = ComponentAggregator(ResultsWriter(database_url), sinks=sinks,
+                                                        instrumentation=self.instrumentation)
+        self.fixtures = Fixtures(replay_dir or record_dir) if (replay_dir or record_dir) is not None else None
+        self.replay = replay_dir is not None
+        if self.replay:
+            self.auto_fl_client = self.fixtures.auto_fl_client(replay_latency)
+        else:
+            self.auto_fl_client = AutoFLClient(auto_fl_url, record_dir=self.fixtures.autofl_dir
+                                               if self.fixtures is not None else None)
         self.language = language
+        self.pipelined = pipelined
+        self.manifest = StageManifest(manifest_path) if manifest_path is not None else None
+        self.force = force
+        self.incremental = incremental
+        self.schedule = schedule or time_budget is not None
+        self.time_budget = time_budget
+        self.cost_history = cost_history if cost_history is not None else [metrics_path]
+        self.deferred_path = deferred_path
+        # Repository sizes (GitHub `size` in KiB) of the found or checked projects, recorded with the project stage.
+        self.project_sizes: Dict[str, int] = {}
+        self.deferred_projects: List[dict] = []
+        self.preflight_checker = None
+        if preflight:
+            self.preflight_checker = PreflightChecker(language, max_size_kb, cache=PreflightCache(preflight_cache)
+                                                      if preflight_cache is not None else None)
+        # Pre-flight results of the projects skipped by the last pre-flight check.
+        self.ineligible_projects: List[dict] = []
+        self.batch_stats = {}
 
         logger.info(f"Initialized ComponentAnnotator (project programming language -> {language})")
 
-    def annotate_project(self, project_name, project_url) -> pd.DataFrame:
+    def annotate_project(self, project_name, project_url, commit: Optional[str] = None) -> pd.DataFrame:
         """
         Annotate a single GitHub project
         then runs the arcan tool (encapsulated in component_extractor) to get component information
         and in after that runs the annotator (auto-fl) to get file level annotations (weak labels)
         for all the files in the project.
+        With a stage manifest, finished projects are loaded from the manifest and unfinished projects
+        resume from their last completed stage. In incremental mode, finished projects whose remote HEAD changed
+        are annotated again.
+
+        Args:
+            project_name: Name of the GitHub project.
+            project_url: HTML URL of the GitHub project.
+            commit: Commit to analyse in snapshot mode (default is the newest commit). In incremental mode the
+                snapshot is pinned to the checked remote HEAD if no commit is given, and a pinned commit replaces
+                the remote HEAD in the check.
 
         Returns:
             pd.DataFrame: pd.DataFrame: Dataframe containing files in the project with component and component-label information.
         """
         logger.info(f"Retrieving and annotating components of project `{project_name}`")
 
-        file_annot = self._annotate_file(project_name, project_url)     # Failed? Then this returns empty DataFrame.
-        if file_annot.empty:
-            raise RuntimeError("Auto-fl failed to annotate project.")
+        size_kb = self.project_sizes.get(project_name)
+        arcan_supervisor = self.component_extractor.arcan_supervisor
+        arcan_supervisor.reset()
+        with self.instrumentation.stage(project_name, "project", size_kb=size_kb) as counts:
+            try:
+                df_components, counts["reused"] = self._annotate_project(project_name, project_url, commit)
+                counts["rows"] = len(df_components)
+            finally:
+                # Peak memory of the project's Arcan run (None if Arcan did not run).
+                counts["children_max_rss_mb"] = arcan_supervisor.peak_rss_mb
+        return df_components
 
-        components = self.component_extractor.set_project(project_name, project_url).infomap_components()
+    def _annotate_project(self, project_name: str, project_url: str,
+                          commit: Optional[str] = None) -> Tuple[pd.DataFrame, bool]:
+        """
+        The stages of annotate_project (measured as a whole as the `project` stage).
+
+        Returns:
+            Tuple[pd.DataFrame, bool]: The component annotations and whether they were loaded from the manifest.
+        """
+        head = self._check_head(project_name, project_url, commit) if self.incremental else None
+        # Analyse the commit the manifest records, a push after the check must not end up in the results.
+        commit = commit or head
+        completed = self._completed_stages(project_name)
+        if "aggregate" in completed:
+            logger.info(f"Project `{project_name}` was already annotated, loading stored aggregate")
+            return self.manifest.load_aggregate(project_name), True
+
+        file_annot = self.manifest.load_labels(project_name) if "labels" in completed else None
+        components = self._resume_extraction(project_name, project_url, completed, commit)
+
+        if file_annot is None and components is None and self.pipelined:
+            file_annot, components = self._run_stages_pipelined(project_name, project_url, commit)
+        else:
+            if file_annot is None:
+                file_annot = self._label_files(project_name, project_url)
+            if components is None:
+                components = self._extract_components(project_name, project_url, commit)
         # component_extractor handles arcan failed exceptions.
         dep_graph = self.component_extractor.dependency_graph()
+        if self.fixtures is not None and not self.replay:
+            self.fixtures.record_graph(project_name, self.component_extractor.graph_file)
 
         self.component_aggregator.set_state(components, file_annot, dep_graph, project_name)
 
-        # Dataframe contains component identifier and component label for each file.
-        df_components = self.component_aggregator.create_aggregate()
+        # Dataframe contains component identifier and component label for each file. The aggregate stage is
+        # recorded once the results are in the database, a failed (asynchronous) write leaves it open.
+        on_written = None
+        if self.manifest is not None:
+            def on_written(df_written: pd.DataFrame) -> None:
+                self.manifest.save_aggregate(project_name, df_written)
+                if head is not None:
+                    self.manifest.save_commit(project_name, head)
+        df_components = self.component_aggregator.create_aggregate(on_written)
         logger.info(f"Finished annotating components of project `{project_name}`")
-        return df_components
+        return df_components, False
+
+    def _check_head(self, project_name: str, project_url: str, commit: Optional[str] = None) -> Optional[str]:
+        """
+        Compares the remote HEAD of the project (or the pinned commit) with the commit it was annotated at. If the
+        project changed, its stored stages are reset so that it is annotated again.
 
-    def annotate_project_list(self, projects: List[Tuple]) -> List[pd.DataFrame]:
+        Returns:
+            Optional[str]: The remote HEAD or the pinned commit (None if the HEAD could not be determined, the stored
+            stages are kept then).
+        """
+        try:
+            head = commit or RepositoryCache.remote_head(project_url)
+        except RuntimeError as exc:
+            logger.warning(f"Could not check the HEAD of `{project_name}`, keeping its stored stages: {exc}")
+            return None
+
+        annotated_at = self.manifest.commit(project_name)
+        if annotated_at == head:
+            logger.info(f"Project `{project_name}` did not change since it was annotated ({head[:10]})")
+        elif self.manifest.completed_stages(project_name):
+            logger.info(f"Project `{project_name}` changed ({(annotated_at or 'unknown')[:10]} -> {head[:10]}), "
+                        f"annotating it again")
+            self.manifest.reset(project_name)
+        return head
+
+    def _completed_stages(self, project_name: str) -> Set[str]:
+        """
+        Returns the stages of the project that completed in an earlier run (always empty without a manifest).
+        """
+        if self.manifest is None:
+            return set()
+        if self.force:
+            self.manifest.reset(project_name)
+            return set()
+        return self.manifest.completed_stages(project_name)
+
+    def _resume_extraction(self, project_name: str, project_url: str, completed: Set[str],
+                           commit: Optional[str] = None):
+        """
+        Resumes the Arcan/Infomap stage from the manifest.
+
+        Returns:
+            The stored communities (None if they have to be computed). If only the Arcan stage completed, the
+            extractor is set to the stored graph so that Arcan is not run again.
+        """
+        if "graph" not in completed:
+            return None
+        graph_file = self.manifest.output(project_name, "graph")
+        if not os.path.exists(graph_file):
+            logger.info(f"Stored dependency graph of `{project_name}` is gone, running Arcan again")
+            return None
+
+        self.component_extractor.set_project(project_name, project_url, commit).resume(graph_file)
+        if "communities" in completed:
+            return self.manifest.load_communities(project_name)
+        # Only the communities have to be computed.
+        return self._detect_communities(project_name)
+
+    def _label_files(self, project_name: str, project_url: str) -> pd.DataFrame:
+        """
+        Auto-fl stage of annotate_project.
+
+        Raises:
+            RuntimeError: If auto-fl did not return any file annotations.
+        """
+        with self.instrumentation.stage(project_name, "labels") as counts:
+            file_annot = self._annotate_file(project_name, project_url)     # Failed? Then this returns empty DataFrame.
+            counts["files"] = len(file_annot)
+        if file_annot.empty:
+            raise RuntimeError("Auto-fl failed to annotate project.")
+        if self.manifest is not None:
+            self.manifest.save_labels(project_name, file_annot)
+        return file_annot
+
+    def _extract_components(self, project_name: str, project_url: str, commit: Optional[str] = None):
+        """
+        Arcan + Infomap stage of annotate_project.
+        """
+        self._set_extractor_project(project_name, project_url, commit)
+        return self._detect_communities(project_name)
+
+    def _set_extractor_project(self, project_name: str, project_url: str, commit: Optional[str] = None) -> None:
+        """
+        Sets the project (and the commit of a snapshot) of the extractor. When replaying, the recorded dependency
+        graph is used instead of Arcan.
+        """
+        self.component_extractor.set_project(project_name, project_url, commit)
+        if self.replay:
+            self.component_extractor.resume(self.fixtures.graph_file(project_name))
+
+    def _detect_communities(self, project_name: str):
+        """
+        Runs Arcan (if needed) and the community detection on the project the extractor is set to and
+        checkpoints both stages.
+        """
+        if self.manifest is None:
+            return self.component_extractor.detect_components()
+
+        self.component_extractor.dependency_graph()
+        self.manifest.save_graph(project_name, self.component_extractor.graph_file)
+        components = self.component_extractor.detect_components()
+        self.manifest.save_communities(project_name, components)
+        return components
+
+    def _run_stages_pipelined(self, project_name: str, project_url: str, commit: Optional[str] = None):
+        """
+        Runs the auto-fl stage and the Arcan/Infomap stage at the same time. If one of the stages fails
+        the other one is cancelled: a running Arcan process is terminated, and a pending auto-fl request
+        is cancelled. Both stages have ended when this returns, so a cancelled stage cannot save its results
+        or stage records while the next project runs.
+
+        Returns:
+            Tuple[pd.DataFrame, cdlib.classes.node_clustering.NodeClustering]: File annotations and components.
+        """
+        # Reset the extractor before the stages start so that a cancel() from the labelling stage
+        # cannot be undone by set_project() in the extraction stage.
+        self._set_extractor_project(project_name, project_url, commit)
+
+        pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix=f"stages-{project_name}")
+        labels_future = pool.submit(self._label_files, project_name, project_url)
+        components_future = pool.submit(self._detect_communities, project_name)
+        try:
+            done, _ = wait([labels_future, components_future], return_when=FIRST_EXCEPTION)
+            failed = [future for future in done if future.exception() is not None]
+            if failed:
+                if failed[0] is labels_future:
+                    logger.info(f"Auto-fl stage failed for `{project_name}`, cancelling graph extraction")
+                    self.component_extractor.cancel()
+                    # Wait for the extraction thread so it does not touch the extractor of the next project.
+                    wait([components_future])
+                else:
+                    logger.info(f"Graph extraction failed for `{project_name}`, cancelling auto-fl stage")
+                    # The request may not have started yet when the first cancel arrives.
+                    while not labels_future.done():
+                        self.auto_fl_client.cancel_blocking()
+                        wait([labels_future], timeout=0.1)
+                raise failed[0].exception()
+
+            return labels_future.result(), components_future.result()
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def annotate_project_list(self, projects: Iterable[Tuple], num_workers: int = 1) -> List[pd.DataFrame]:
         """
         See annotate_projects. Difference here is that projects is a list of tuples.
 
         Args:
-            projects (List[Tuple]): (project name, project html url) pairs.
+            projects (Iterable[Tuple]): (project name, project html url) pairs, optionally with the commit to
+                analyse in snapshot mode as third field.
+            num_workers (int): Number of worker processes. With 1 (default) projects are annotated one
+                after another in the current process.
 
         Returns:
             List[pd.DataFrame]: For each project annotations for the project including component annotations
+            (in the order in which the projects finished).
         """
-        df_components_list = []
+        return [df_components for _, df_components in self.iter_annotate_project_list(projects, num_workers)]
 
-        for project_name, project_url in projects:
-            try:
-                df_components_list.append(self.annotate_project(project_name, project_url))
-            except RuntimeError as exc:
-                logger.error(f"{exc}")
-            except ValueError as exc:
-                logger.error(f"{exc}")
+    def iter_annotate_project_list(self, projects: Iterable[Tuple],
+                                   num_workers: int = 1) -> Iterator[Tuple[str, pd.DataFrame]]:
+        """
+        Annotates the projects and yields the results as soon as each project is finished.
+        With `num_workers > 1` the projects are distributed over a pool of worker processes (each with
+        its own ComponentAnnotator), so that the auto-fl, Arcan, Infomap and database stages of
+        different projects overlap. A project that fails does not affect the other projects.
+
+        Args:
+            projects (Iterable[Tuple]): (project name, project html url[, commit]) tuples. May be a lazy iterable.
+            num_workers (int): Number of worker processes.
 
-        return df_components_list
+        Yields:
+            Tuple[str, pd.DataFrame]: (project name, component annotations) in order of completion.
+        """
+        self.batch_stats = {"succeeded": 0, "failed": 0, "elapsed": 0.0, "projects_per_hour": 0.0}
+        self.instrumentation.drain()
+        start = time.perf_counter()
 
+        try:
+            if num_workers <= 1:
+                yield from self._annotate_sequential(projects)
+            else:
+                yield from self._annotate_parallel(projects, num_workers)
+        finally:
+            self._flush_results()
+            self._log_batch_throughput(time.perf_counter() - start)
+            self.instrumentation.log_summary()
+
+    def _flush_results(self) -> None:
+        """
+        Waits until the results written by this process are in the database (worker processes flush
+        their own results when they exit).
+        """
+        try:
+            self.component_aggregator.results_writer.flush()
+        except RuntimeError as exc:
+            logger.error(f"Could not write all component annotations: {exc}")
+
+    def _annotate_sequential(self, projects: Iterable[Tuple]) -> Iterator[Tuple[str, pd.DataFrame]]:
+        for project in projects:
+            project_name, project_url, commit = unpack_project(project)
+            try:
+                df_components = self.annotate_project(project_name, project_url, commit)
+            except Exception as exc:
+                # Same isolation as in the worker processes (errors of the manifest and cache layers included).
+                self._record_failure(project_name, exc)
+                continue
+            self.batch_stats["succeeded"] += 1
+            yield project_name, df_components
+
+    def _annotate_parallel(self, projects: Iterable[Tuple], num_workers: int) -> Iterator[Tuple[str, pd.DataFrame]]:
+        logger.info(f"Annotating projects with {num_workers} worker processes")
+        project_iter = iter(projects)
+        while True:
+            unsubmitted = []
+            broken = yield from self._annotate_in_pool(project_iter, num_workers, unsubmitted)
+            if not broken:
+                return
+            # A worker process that died (killed out of memory, crashed) breaks the whole pool.
+            logger.warning("A worker process died, restarting the worker pool for the remaining projects")
+            project_iter = itertools.chain(unsubmitted, project_iter)
+
+    def _annotate_in_pool(self, project_iter: Iterator[Tuple], num_workers: int,
+                          unsubmitted: List[Tuple]) -> Iterator[Tuple[str, pd.DataFrame]]:
+        """
+        Annotates projects of `project_iter` in a new process pool until the projects run out or the pool breaks.
+        The projects in flight when the pool breaks are recorded as failed, a project that could not be submitted
+        to the broken pool is added to `unsubmitted`.
 
-    def annotate_projects(self, num_proj: int) -> List[pd.DataFrame]:
+        Returns:
+            bool: Whether the pool broke (the returned value of the generator).
         """
-        Uses the project extractor to find abandoned GitHub projects. Then annotates the files
-        and extracts the components.
+        pending = {}
+        broken = False
+
+        def submit_next(pool: ProcessPoolExecutor) -> bool:
+            nonlocal broken
+            project = next(project_iter, None)
+            if project is None:
+                return False
+            project_name, project_url, commit = unpack_project(project)
+            try:
+                future = pool.submit(_annotate_in_worker, project_name, project_url,
+                                     self.project_sizes.get(project_name), commit)
+            except BrokenProcessPool:
+                unsubmitted.append(project)
+                broken = True
+                return False
+            pending[future] = project_name
+            return True
+
+        with ProcessPoolExecutor(max_workers=num_workers, initializer=_init_worker,
+                                 initargs=(self.config,)) as pool:
+            try:
+                # Keep a bounded number of projects in flight so that lazy project sources are consumed
+                # only as fast as the workers can handle them.
+                while len(pending) < 2 * num_workers and submit_next(pool):
+                    pass
+
+                while pending:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        project_name = pending.pop(future)
+                        try:
+                            df_components, records = future.result()
+                        except BrokenProcessPool as exc:
+                            broken = True
+                            self._record_failure(project_name, exc)
+                        except Exception as exc:
+                            # Includes exceptions of the worker that could not be unpickled.
+                            self.instrumentation.extend(getattr(exc, "stage_records", []))
+                            self._record_failure(project_name, exc)
+                        else:
+                            self.instrumentation.extend(records)
+                            self.batch_stats["succeeded"] += 1
+                            yield project_name, df_components
+                        if not broken:
+                            submit_next(pool)
+            finally:
+                for future in pending:
+                    future.cancel()
+        return broken
+
+    def _record_failure(self, project_name: str, exc: Exception) -> None:
+        logger.error(f"{exc}")
+        logger.error(f"Failed to annotate project `{project_name}`")
+        self.batch_stats["failed"] += 1
+
+    def _log_batch_throughput(self, elapsed: float) -> None:
+        num_projects = self.batch_stats["succeeded"] + self.batch_stats["failed"]
+        self.batch_stats["elapsed"] = elapsed
+        self.batch_stats["projects_per_hour"] = projects_per_hour(num_projects, elapsed)
+        self.batch_stats["reused"] = sum(1 for record in self.instrumentation.records
+                                         if record["stage"] == "project" and record.get("reused"))
+        logger.info(f"Batch finished: {self.batch_stats['succeeded']} succeeded ({self.batch_stats['reused']} reused "
+                    f"stored annotations), {self.batch_stats['failed']} failed in {elapsed:.1f}s "
+                    f"({self.batch_stats['projects_per_hour']:.2f} projects/hour)")
+
+    def annotate_projects(self, num_proj: int, num_workers: int = 1) -> List[pd.DataFrame]:
+        """
+        Uses the project extractor to find abandoned GitHub projects (or the recorded projects when replaying).
+        Then annotates the files and extracts the components. Projects are annotated as soon as they are found,
+        while the search continues. With scheduling, the projects are ordered by their estimated cost once the
+        search finished (see schedule_projects).
 
         Args:
             num_proj (int): Number of random projects from GitHub to annotate.
+            num_workers (int): Number of worker processes (see iter_annotate_project_list).
 
         Returns:
             List[pd.DataFrame]: For each project annotations for the project including component annotations.
         """
-        abandoned_projects = []
+        if self.replay:
+            abandoned_projects = self.fixtures.load_projects()[:num_proj]
+            self._record_sizes(abandoned_projects)
+            if self.schedule:
+                return self.annotate_project_list(self.schedule_projects(abandoned_projects, num_workers), num_workers)
+            projects = [(project['name'], project['html_url']) for project in abandoned_projects]
+            return self.annotate_project_list(projects, num_workers)
+
+        discovered = []
+        found = self._discover_projects(num_proj, discovered)
+        if self.preflight_checker is not None:
+            found = self.preflight_search_results(found)
+        projects = ((project['name'], project['html_url']) for project in found)
         try:
-            abandoned_projects = self.project_extractor.find_abandoned_projects(num_proj)
-            logger.info("Finished retrieving abandoned projects from GitHub")
-        except HTTPError as exc:
-            logger.error("Failed to retrieve abandoned projects from GitHub")
+            if self.schedule:
+                projects = self.schedule_projects(list(found), num_workers)
+            return self.annotate_project_list(projects, num_workers)
+        finally:
+            if self.fixtures is not None:
+                self.fixtures.record_projects(discovered)
+
+    def schedule_projects(self, projects: List[dict], num_workers: int = 1) -> List[Tuple[str, str]]:
+        """
+        Orders projects longest (estimated) first and defers the projects that do not fit into the time budget
+        (see scheduler.plan_batch). The cost model is fitted to the metrics of earlier batches (cost_history).
+        Deferred projects are kept in self.deferred_projects and, with a deferred_path, stored for the next batch;
+        the projects deferred by the last batch are added to this one.
 
-        df_components_list = []
+        Args:
+            projects (List[dict]): Projects with `name`, `html_url` and optionally the GitHub `size` (in KiB).
+            num_workers (int): Number of workers of the batch.
 
-        for project in abandoned_projects:
-            try:
-                df_components_list.append(self.annotate_project(project['name'], project['html_url']))
-            except RuntimeError as exc:
-                logger.error(f"{exc}")
-            except ValueError as exc:
-                logger.error(f"{exc}")
+        Returns:
+            List[Tuple[str, str]]: (project name, project html url) in processing order.
+        """
+        if self.deferred_path is not None:
+            projects = merge_deferred(projects, load_deferred(self.deferred_path))
+        self._record_sizes(projects)
+        cost_model = CostModel.from_metrics(self.cost_history)
+        ordered, self.deferred_projects, makespan = plan_batch(projects, cost_model, num_workers, self.time_budget)
+        log_plan(ordered, self.deferred_projects, makespan)
+        if self.deferred_path is not None:
+            save_deferred(self.deferred_path, self.deferred_projects)
+        return [(project['name'], project['html_url']) for project in ordered]
+
+    def preflight_projects(self, projects: List[Tuple[str, str]]) -> List[Tuple[str, str]]:
+        """
+        Checks a project list concurrently before annotating it (see projectextractor.preflight). The results of
+        the ineligible projects are kept in self.ineligible_projects, the known repository sizes in
+        self.project_sizes (for the scheduler and the project stage records).
+
+        Args:
+            projects (List[Tuple[str, str]]): (project name, project html url) pairs.
+
+        Returns:
+            List[Tuple[str, str]]: (project name, project html url) of the eligible projects, with the current URL
+            of renamed repositories.
+        """
+        if self.preflight_checker is None:
+            return projects
+        results = self.preflight_checker.check(projects)
+        self._record_sizes(results)
+        eligible, self.ineligible_projects = self.preflight_checker.split(results)
+        return eligible
+
+    def preflight_search_results(self, projects: Iterator[dict]) -> Iterator[dict]:
+        """
+        Skips the ineligible GitHub search results. The search items carry the repository metadata, so they are
+        checked without further requests.
+        """
+        self.ineligible_projects = []
+        for project in projects:
+            result = self.preflight_checker.evaluate(project['name'], project['html_url'], project)
+            if result["eligible"]:
+                yield project
+            else:
+                logger.info(f"Pre-flight excluded `{project['name']}` ({result['reason']}): {project['html_url']}")
+                self.ineligible_projects.append(result)
+
+    def _discover_projects(self, num_proj: int, discovered: List[dict]) -> Iterator[dict]:
+        """
+        Yields the abandoned projects of the project extractor (and collects them in `discovered`). A failed search
+        ends the discovery, the projects found so far are still annotated.
+        """
+        try:
+            for project in self.project_extractor.iter_abandoned_projects(num_proj):
+                discovered.append(project)
+                self._record_sizes([project])
+                yield project
+            logger.info("Finished retrieving abandoned projects from GitHub")
+        except HTTPError as exc:
+            logger.error(f"Failed to retrieve abandoned projects from GitHub: {exc}")
 
-        return df_components_list
+    def _record_sizes(self, projects: Iterable[dict]) -> None:
+        """
+        Records the known repository sizes (GitHub `size` in KiB) of projects (search items or pre-flight results).
+        """
+        self.project_sizes.update({project['name']: project['size'] for project in projects
+                                   if project.get('size') is not None})
 
     def _annotate_file(self, project_name: str, remote: str) -> pd.DataFrame:
         """
@@ -134,31 +755,13 @@ class ComponentAnnotator:
         Returns:
             pd.DataFrame: A pandas DataFrame containing information about annotated files.
 
+        Raises:
+            AutoFLError: If auto-fl did not respond in time or failed after all retries.
+
         Notes:
             - Only Java projects are fully supported and tested with the auto-fl annotator.
         """
-        url = 'http://auto-fl:8000/label/files'
-        analysis = {
-            "name": project_name,  # "Waikato|weka-3.8",
-            "remote": remote,  # "https://github.com/Waikato/weka-3.8",
-            "languages": [self.language]  # ["java"]
-        }
-
-        res = requests.post(url, json=analysis)
-        res = res.json()['result']
-        taxonomy = res['taxonomy']
-        file_entries = []
-        files = res['versions'][0]['files']
-        for file_name in files:
-            file = files[file_name]
-            file_entries.append({
-                "path": file["path"],
-                "package": file["package"],
-                "distribution": file["annotation"]["distribution"],
-                "unannotated": file["annotation"]["unannotated"],
-                "label": get_label(file["annotation"]["distribution"], taxonomy)
-            })
-
-        file_annot = pd.DataFrame(file_entries)
+        # The response is parsed incrementally into a typed frame (see autoflclient.responseparser).
+        file_annot = self.auto_fl_client.label_files_frame_blocking(project_name, remote, [self.language])
         # Skip package and project level annotations
         return file_annot
\ No newline at end of file
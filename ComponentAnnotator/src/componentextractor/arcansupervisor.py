@@ -0,0 +1,319 @@
+import fcntl
+import os
+import re
+import shutil
+import signal
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from subprocess import Popen, STDOUT, TimeoutExpired
+from typing import Dict, List, Optional
+
+from loguru import logger
+
+# Default maximum heap of the Arcan JVM (see arcan.sh).
+DEFAULT_JVM_HEAP = "28G"
+
+# Default maximum duration of an Arcan run in seconds.
+DEFAULT_ARCAN_TIMEOUT = 6 * 3600.0
+
+# Memory of the JVM and of git on top of the heap, used to size the number of slots.
+JVM_OVERHEAD_MB = 2048
+
+# Known failures in the Arcan output, checked in order.
+ARCAN_ERROR_PATTERNS = [
+    ("out_of_memory", re.compile(r"java\.lang\.OutOfMemoryError.*")),
+    ("clone", re.compile(r".*(Repository not found|Authentication failed|could not read Username|"
+                         r"TransportException).*")),
+    ("java", re.compile(r"(Exception in thread .*|\S+(Exception|Error): .*)")),
+]
+
+# Number of output lines kept in ArcanFailure.log_tail.
+LOG_TAIL_LINES = 20
+
+
+class ArcanFailure(RuntimeError):
+    """
+    Raised when an Arcan run failed. `reason` is one of "timeout", "memory", "out_of_memory", "clone", "java",
+    "exit" (non-zero exit status), "no_output" (no dependency graph written), "setup" (e.g. the checkout failed)
+    or "cancelled".
+    """
+    def __init__(self, project_name: str, reason: str, message: str, exit_code: Optional[int] = None,
+                 log_tail: Optional[List[str]] = None):
+        super().__init__(f"Arcan failed for {project_name} ({reason}): {message}")
+        self.project_name = project_name
+        self.reason = reason
+        self.message = message
+        self.exit_code = exit_code
+        self.log_tail = log_tail if log_tail is not None else []
+
+    def __reduce__(self):
+        # Raised in worker processes, so it has to survive pickling with all its fields (and `stage_records`).
+        return (ArcanFailure, (self.project_name, self.reason, self.message, self.exit_code, self.log_tail),
+                self.__dict__)
+
+
+def parse_memory(size: str) -> int:
+    """
+    Converts a JVM memory size (e.g. "28G", "512m") into MiB.
+    """
+    match = re.fullmatch(r"(\d+)([kKmMgGtT]?)", size.strip())
+    if match is None:
+        raise ValueError(f"Invalid memory size {size}")
+    factor = {"": 1 / 2 ** 20, "k": 1 / 1024, "m": 1, "g": 1024, "t": 1024 ** 2}[match.group(2).lower()]
+    return max(1, int(int(match.group(1)) * factor))
+
+
+def available_memory_mb() -> int:
+    """
+    Returns the memory available for new processes in MiB (MemAvailable, 0 if it cannot be determined).
+    """
+    try:
+        with open("/proc/meminfo") as meminfo:
+            for line in meminfo:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) // 1024
+    except (OSError, ValueError):
+        pass
+    return 0
+
+
+def default_slots(jvm_heap: str = DEFAULT_JVM_HEAP) -> int:
+    """
+    Number of concurrent Arcan runs the machine can sustain: one per core, limited by the available memory
+    divided by the memory of a run (heap plus JVM_OVERHEAD_MB).
+    """
+    slots = os.cpu_count() or 1
+    available = available_memory_mb()
+    if available > 0:
+        slots = min(slots, available // (parse_memory(jvm_heap) + JVM_OVERHEAD_MB))
+    return max(1, slots)
+
+
+def session_rss_mb(session_id: int) -> float:
+    """
+    Returns the total resident memory in MiB of all processes of a session (the Arcan script, the JVM and git).
+    """
+    page_mb = os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    total = 0.0
+    for pid in os.listdir("/proc"):
+        if not pid.isdigit():
+            continue
+        try:
+            with open(f"/proc/{pid}/stat") as stat:
+                # The command name may contain spaces, the other fields follow the closing parenthesis.
+                fields = stat.read().rsplit(")", 1)[1].split()
+        except (OSError, IndexError):
+            continue
+        if int(fields[3]) == session_id:
+            total += int(fields[21]) * page_mb
+    return total
+
+
+def classify_output(lines: List[str]) -> Optional[tuple]:
+    """
+    Finds the first known failure in the Arcan output.
+
+    Returns:
+        Optional[tuple]: (reason, matching line) or None.
+    """
+    for reason, pattern in ARCAN_ERROR_PATTERNS:
+        for line in lines:
+            match = pattern.search(line)
+            if match is not None:
+                return reason, match.group(0).strip()
+    return None
+
+
+class ArcanSupervisor:
+    """
+    Runs the Arcan script with a wall-clock limit, a watchdog on the resident memory of the whole process
+    tree, a configurable JVM heap and a bounded number of concurrent runs. The runs share `slots` lock files in
+    `slot_dir`, so the limit holds across the worker processes of a batch. Failures are raised as ArcanFailure
+    and the partial outputs of a failed run are removed.
+    """
+    def __init__(self, timeout: Optional[float] = DEFAULT_ARCAN_TIMEOUT, max_rss_mb: Optional[float] = None,
+                 jvm_heap: Optional[str] = None, slots: Optional[int] = None, slot_dir: Optional[str] = None,
+                 poll_interval: float = 1.0, kill_grace: float = 10.0):
+        """
+        Initializes the ArcanSupervisor instance.
+
+        Args:
+            timeout (float, optional): Maximum seconds of a run (None for no limit).
+            max_rss_mb (float, optional): Maximum resident memory of the run (script, JVM and git) in MiB
+                (None for no limit).
+            jvm_heap (str, optional): Maximum heap of the JVM, e.g. "8G" (default is DEFAULT_JVM_HEAP).
+            slots (int, optional): Maximum number of concurrent runs (default is default_slots).
+            slot_dir (str, optional): Directory of the slot lock files (default is a directory in the system
+                temporary directory, shared by all processes of the machine).
+            poll_interval (float): Seconds between two checks of a running process.
+            kill_grace (float): Seconds between SIGTERM and SIGKILL when a run is stopped.
+        """
+        self.timeout = timeout
+        self.max_rss_mb = max_rss_mb
+        self.jvm_heap = jvm_heap
+        self.slots = slots if slots is not None else default_slots(jvm_heap or DEFAULT_JVM_HEAP)
+        self.slot_dir = slot_dir if slot_dir is not None else os.path.join(tempfile.gettempdir(), "arcan-slots")
+        self.poll_interval = poll_interval
+        self.kill_grace = kill_grace
+        os.makedirs(self.slot_dir, exist_ok=True)
+
+        # Peak resident memory (MiB) of the script, JVM and git of the last run, sampled every poll_interval
+        # (None if no run started since the last reset).
+        self.peak_rss_mb: Optional[float] = None
+        self._process: Optional[Popen] = None
+        self._cancelled = False
+        self._lock = threading.Lock()
+
+    def run(self, project_name: str, command: List[str], env: Optional[Dict[str, str]] = None,
+            output_dir: Optional[str] = None, cleanup_paths: Optional[List[str]] = None) -> None:
+        """
+        Runs Arcan once a slot is free and waits until it finished.
+
+        Args:
+            project_name (str): Name of the project (for logs and errors).
+            command (List[str]): The Arcan script and its arguments.
+            env (Dict[str, str], optional): Environment of the script (default is the current environment).
+            output_dir (str, optional): Directory the dependency graphs are written to. If given, a run that does
+                not write a GraphML file there fails.
+            cleanup_paths (List[str], optional): Paths removed when the run fails (in addition to output_dir).
+
+        Raises:
+            ArcanFailure: If the run timed out, exceeded the memory limit, exited with a non-zero status, did not
+                write a dependency graph or was cancelled.
+        """
+        try:
+            with self._slot(project_name):
+                self._run(project_name, command, env)
+            if output_dir is not None and not self._has_graph(output_dir):
+                raise ArcanFailure(project_name, "no_output", f"no dependency graph written to {output_dir}")
+        except ArcanFailure:
+            for path in [output_dir] + list(cleanup_paths or []):
+                if path is not None and os.path.exists(path):
+                    shutil.rmtree(path, ignore_errors=True)
+            raise
+
+    def reset(self) -> None:
+        """
+        Clears a cancellation, so that the next run can start, and the peak memory of the last run.
+        """
+        with self._lock:
+            self._cancelled = False
+            self.peak_rss_mb = None
+
+    def cancel(self) -> None:
+        """
+        Stops the current run (or the wait for a slot) and refuses new runs until reset. Safe to call from
+        another thread.
+        """
+        with self._lock:
+            self._cancelled = True
+            process = self._process
+        if process is not None:
+            self._stop(process)
+
+    @contextmanager
+    def _slot(self, project_name: str):
+        """
+        Holds one of the slot lock files while the run is active.
+        """
+        waiting_logged = False
+        while True:
+            for slot in range(self.slots):
+                slot_file = open(os.path.join(self.slot_dir, f"slot-{slot}.lock"), "a")
+                try:
+                    fcntl.flock(slot_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    slot_file.close()
+                    continue
+                try:
+                    yield slot
+                finally:
+                    fcntl.flock(slot_file, fcntl.LOCK_UN)
+                    slot_file.close()
+                return
+
+            if self._cancelled:
+                raise ArcanFailure(project_name, "cancelled", "cancelled while waiting for a slot")
+            if not waiting_logged:
+                logger.info(f"All {self.slots} Arcan slots are busy, {project_name} waits for a free slot")
+                waiting_logged = True
+            time.sleep(self.poll_interval)
+
+    def _run(self, project_name: str, command: List[str], env: Optional[Dict[str, str]]) -> None:
+        env = dict(env if env is not None else os.environ)
+        if self.jvm_heap is not None:
+            env["ARCAN_JAVA_MEMORY"] = self.jvm_heap
+
+        with tempfile.TemporaryFile(mode="w+", errors="replace") as output:
+            with self._lock:
+                if self._cancelled:
+                    raise ArcanFailure(project_name, "cancelled", "cancelled before the run started")
+                # New session so that the script, the JVM and git can be measured and stopped together.
+                self._process = Popen(command, stdout=output, stderr=STDOUT, env=env, start_new_session=True)
+                self.peak_rss_mb = 0.0
+            process = self._process
+            try:
+                reason, message = self._watch(process)
+            finally:
+                with self._lock:
+                    self._process = None
+
+            output.seek(0)
+            lines = output.read().splitlines()
+
+        log_tail = lines[-LOG_TAIL_LINES:]
+        if reason is None and self._cancelled:
+            reason, message = "cancelled", "run was cancelled"
+        if reason is not None:
+            raise ArcanFailure(project_name, reason, message, process.returncode, log_tail)
+        if process.returncode != 0:
+            reason, message = classify_output(lines) or ("exit", f"exited with status {process.returncode}")
+            raise ArcanFailure(project_name, reason, message, process.returncode, log_tail)
+
+    def _watch(self, process: Popen) -> tuple:
+        """
+        Waits for the process and stops it when it exceeds a limit.
+
+        Returns:
+            tuple: (reason, message) if the process was stopped, (None, None) otherwise.
+        """
+        start = time.monotonic()
+        while True:
+            try:
+                process.wait(self.poll_interval)
+                return None, None
+            except TimeoutExpired:
+                pass
+
+            elapsed = time.monotonic() - start
+            if self.timeout is not None and elapsed > self.timeout:
+                self._stop(process)
+                return "timeout", f"did not finish within {self.timeout:.0f}s"
+            rss = session_rss_mb(process.pid)
+            self.peak_rss_mb = max(self.peak_rss_mb or 0.0, rss)
+            if self.max_rss_mb is not None:
+                if rss > self.max_rss_mb:
+                    self._stop(process)
+                    return "memory", f"used {rss:.0f} MiB, limit is {self.max_rss_mb:.0f} MiB"
+
+    def _stop(self, process: Popen) -> None:
+        """
+        Terminates the process group of a run (SIGKILL if it does not exit within the grace period).
+        """
+        for sig in (signal.SIGTERM, signal.SIGKILL):
+            if process.poll() is not None:
+                return
+            try:
+                os.killpg(process.pid, sig)
+            except ProcessLookupError:
+                return
+            try:
+                process.wait(self.kill_grace)
+            except TimeoutExpired:
+                continue
+
+    @staticmethod
+    def _has_graph(output_dir: str) -> bool:
+        return os.path.isdir(output_dir) and any(name.endswith(".graphml") for name in os.listdir(output_dir))
@@ -0,0 +1,161 @@
+import hashlib
+import json
+import os
+import tempfile
+from typing import Dict, List, Optional
+
+import networkx as nx
+import numpy as np
+from cdlib import NodeClustering
+from loguru import logger
+
+from componentextractor.communitydetection import CommunityDetector, _clustering
+from componentextractor.csrgraph import CSRGraph
+
+
+def graph_content_hash(graph) -> str:
+    """
+    Hash of the content of a dependency graph: its nodes (ids and file paths) and edges (with their `weight`,
+    which the community detection uses), independent of the order in which they are stored. Re-running Arcan on the same commit gives the same hash, even though
+    the GraphML file is new.
+
+    Args:
+        graph (nx.Graph | CSRGraph): The dependency graph.
+
+    Returns:
+        str: Hex digest of the graph content.
+    """
+    if isinstance(graph, CSRGraph):
+        node_ids = graph.node_ids
+        paths = graph.node_attribute('filePathRelative')
+        sources = np.repeat(np.arange(graph.number_of_nodes()), np.diff(graph.indptr))
+        targets = np.asarray(graph.indices)
+        weights = graph.weights
+    else:
+        node_ids = list(graph.nodes)
+        node_paths = nx.get_node_attributes(graph, 'filePathRelative')
+        paths = [node_paths.get(node_id) for node_id in node_ids]
+        position = {node_id: index for index, node_id in enumerate(node_ids)}
+        edge_list = list(graph.edges(data='weight'))
+        edges = np.array([(position[u], position[v]) for u, v, _ in edge_list], dtype=np.int64).reshape(-1, 2)
+        sources, targets = edges[:, 0], edges[:, 1]
+        # Same convention as read_graphml_csr: no weights without a weighted edge, otherwise 1.0 if missing.
+        weights = None
+        if any(weight is not None for _, _, weight in edge_list):
+            weights = np.array([1.0 if weight is None else weight for _, _, weight in edge_list], dtype=np.float64)
+
+    # Relabel the nodes by the rank of their id, so that the hash does not depend on the node order.
+    order = sorted(range(len(node_ids)), key=lambda index: str(node_ids[index]))
+    rank = np.empty(len(node_ids), dtype=np.int64)
+    rank[order] = np.arange(len(node_ids))
+    edges = np.column_stack((rank[sources], rank[targets])) if len(node_ids) else np.empty((0, 2), dtype=np.int64)
+    if not graph.is_directed():
+        edges = np.sort(edges, axis=1)
+    if weights is None:
+        edge_order = np.lexsort((edges[:, 1], edges[:, 0]))
+    else:
+        weights = np.asarray(weights, dtype=np.float64)
+        edge_order = np.lexsort((weights, edges[:, 1], edges[:, 0]))
+        weights = weights[edge_order]
+    edges = edges[edge_order]
+
+    digest = hashlib.sha256()
+    digest.update(b"directed" if graph.is_directed() else b"undirected")
+    for index in order:
+        digest.update(f"{node_ids[index]}\0{paths[index] or ''}\n".encode())
+    digest.update(np.ascontiguousarray(edges, dtype=np.int64).tobytes())
+    if weights is not None:
+        digest.update(b"weights")
+        digest.update(np.ascontiguousarray(weights).tobytes())
+    return digest.hexdigest()
+
+
+class CommunityCache:
+    """
+    On-disk memo of community detection results, keyed by graph content hash, backend and backend
+    parameters. A result is stored as `<key>.json` in the cache directory.
+    """
+    def __init__(self, cache_dir: str):
+        """
+        Initializes the CommunityCache instance.
+
+        Args:
+            cache_dir (str): Directory of the stored results.
+        """
+        self.cache_dir = cache_dir
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    @staticmethod
+    def key(graph_hash: str, detector: CommunityDetector) -> str:
+        """
+        Cache key of a detector run on a graph.
+        """
+        description = json.dumps({"graph": graph_hash, "backend": detector.name, "parameters": detector.parameters},
+                                 sort_keys=True)
+        return hashlib.sha256(description.encode()).hexdigest()[:32]
+
+    def get(self, key: str) -> Optional[Dict]:
+        """
+        Returns the stored result (method_name, method_parameters and communities) or None.
+        """
+        path = self._path(key)
+        if not os.path.exists(path):
+            self.misses += 1
+            return None
+        with open(path) as file:
+            self.hits += 1
+            return json.load(file)
+
+    def put(self, key: str, method_name: str, parameters: Dict, communities: List[List[str]]) -> None:
+        """
+        Stores a result.
+        """
+        # A unique temporary file, so that workers storing the same result do not write into each other's file.
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as file:
+                json.dump({"method_name": method_name, "method_parameters": parameters,
+                           "communities": communities}, file)
+            os.replace(tmp_path, self._path(key))
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+
+class MemoizedDetector(CommunityDetector):
+    """
+    Wraps a community detector: a graph whose content, backend and parameters were seen before (in this or
+    an earlier run) is not processed again, its stored communities are returned instead.
+    """
+    def __init__(self, detector: CommunityDetector, cache: CommunityCache):
+        """
+        Initializes the MemoizedDetector instance.
+
+        Args:
+            detector (CommunityDetector): The wrapped detector.
+            cache (CommunityCache): The memo.
+        """
+        self.detector = detector
+        self.cache = cache
+        self.name = detector.name
+
+    @property
+    def parameters(self) -> Dict:
+        return self.detector.parameters
+
+    def detect(self, graph) -> NodeClustering:
+        key = CommunityCache.key(graph_content_hash(graph), self.detector)
+        stored = self.cache.get(key)
+        if stored is not None:
+            logger.info(f"Reusing {self.name} communities of graph {key} from {self.cache.cache_dir}")
+            return _clustering(stored["communities"], graph, stored["method_name"], stored["method_parameters"])
+
+        components = self.detector.detect(graph)
+        self.cache.put(key, components.method_name, self.detector.parameters, components.communities)
+        return components
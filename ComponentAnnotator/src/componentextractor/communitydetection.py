@@ -0,0 +1,277 @@
+import os
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+import networkx as nx
+import numpy as np
+from cdlib import NodeClustering, algorithms
+
+from componentextractor.csrgraph import CSRGraph, infomap_csr
+
+# Seed of the stochastic backends, so that the components (and their ids) are reproducible between runs.
+DEFAULT_SEED = 42
+
+
+def canonical_communities(communities) -> List[List[str]]:
+    """
+    Orders communities canonically: the nodes of a community by id, the communities by size (largest first)
+    and then by their first node. The component ids (positions) then only depend on the partition itself.
+
+    Args:
+        communities: Communities (lists of node ids).
+
+    Returns:
+        List[List[str]]: The communities in canonical order.
+    """
+    ordered = [sorted(community) for community in communities if community]
+    return sorted(ordered, key=lambda community: (-len(community), community[0]))
+
+
+def _clustering(communities: List[List[str]], graph, method_name: str, parameters: Dict) -> NodeClustering:
+    """
+    Wraps communities (lists of node ids) into a NodeClustering, like the cdlib algorithms do.
+    """
+    if isinstance(graph, CSRGraph):
+        clustering = NodeClustering(communities, None, method_name, method_parameters=parameters)
+        clustering.graph = graph
+        return clustering
+    return NodeClustering(communities, graph, method_name, method_parameters=parameters)
+
+
+def _edge_arrays(graph) -> Tuple[List[str], np.ndarray, np.ndarray]:
+    """
+    Returns the node ids and the edges (as source/target node positions) of a networkx graph or CSRGraph.
+    """
+    if isinstance(graph, CSRGraph):
+        sources = np.repeat(np.arange(graph.number_of_nodes()), np.diff(graph.indptr))
+        return graph.node_ids, sources, np.asarray(graph.indices)
+
+    node_ids = list(graph.nodes)
+    position = {node_id: index for index, node_id in enumerate(node_ids)}
+    edges = np.array([(position[u], position[v]) for u, v in graph.edges()], dtype=np.int64).reshape(-1, 2)
+    return node_ids, edges[:, 0], edges[:, 1]
+
+
+def to_networkx(graph) -> nx.Graph:
+    """
+    Returns the graph as a networkx graph (CSRGraphs are converted, without node attributes).
+    """
+    if not isinstance(graph, CSRGraph):
+        return graph
+    converted = nx.DiGraph() if graph.is_directed() else nx.Graph()
+    converted.add_nodes_from(graph.node_ids)
+    converted.add_edges_from((graph.node_ids[u], graph.node_ids[v]) for u, v in graph.edges())
+    return converted
+
+
+class CommunityDetector:
+    """
+    Strategy for detecting the components (communities) of a dependency graph. Subclasses implement
+    `_detect`; `parameters` describes the configuration (used for reporting and memoization).
+    """
+    name = "base"
+
+    def detect(self, graph) -> NodeClustering:
+        """
+        Detects the communities of a dependency graph.
+
+        Args:
+            graph (nx.Graph | CSRGraph): The dependency graph.
+
+        Returns:
+            cdlib.classes.node_clustering.NodeClustering: The communities (lists of node ids) in canonical order.
+        """
+        components = self._detect(graph)
+        components.communities = canonical_communities(components.communities)
+        return components
+
+    def _detect(self, graph) -> NodeClustering:
+        raise NotImplementedError
+
+    @property
+    def parameters(self) -> Dict:
+        return {}
+
+    def __repr__(self) -> str:
+        parameters = ", ".join(f"{key}={value}" for key, value in self.parameters.items())
+        return f"{type(self).__name__}({parameters})"
+
+
+class InfomapDetector(CommunityDetector):
+    """
+    Infomap (the default, cdlib.algorithms.infomap with a fixed seed).
+    """
+    name = "infomap"
+
+    def __init__(self, trials: int = 1, seed: Optional[int] = DEFAULT_SEED, flags: str = ""):
+        """
+        Args:
+            trials (int): Number of Infomap runs, the best partition is kept.
+            seed (int, optional): Seed of Infomap's random generator (None for a random seed).
+            flags (str): Additional Infomap flags.
+        """
+        self.trials = trials
+        self.seed = seed
+        self.flags = flags
+
+    @property
+    def parameters(self) -> Dict:
+        return {"trials": self.trials, "seed": self.seed, "flags": self.flags}
+
+    def infomap_flags(self) -> str:
+        flags = [self.flags] if self.flags else []
+        if self.trials != 1:
+            flags.append(f"--num-trials {self.trials}")
+        if self.seed is not None:
+            flags.append(f"--seed {self.seed}")
+        return " ".join(flags)
+
+    def _detect(self, graph) -> NodeClustering:
+        if isinstance(graph, CSRGraph):
+            return infomap_csr(graph, self.infomap_flags())
+        return algorithms.infomap(graph, flags=self.infomap_flags())
+
+
+class LeidenDetector(CommunityDetector):
+    """
+    Leiden (leidenalg, directed modularity with a resolution parameter).
+    """
+    name = "leiden"
+
+    def __init__(self, resolution: float = 1.0, seed: Optional[int] = DEFAULT_SEED, iterations: int = 2):
+        """
+        Args:
+            resolution (float): Resolution parameter (higher values give smaller communities).
+            seed (int, optional): Seed of leidenalg's random generator (None for a random seed).
+            iterations (int): Number of iterations (-1 iterates until the partition is stable).
+        """
+        self.resolution = resolution
+        self.seed = seed
+        self.iterations = iterations
+
+    @property
+    def parameters(self) -> Dict:
+        return {"resolution": self.resolution, "seed": self.seed, "iterations": self.iterations}
+
+    def _detect(self, graph) -> NodeClustering:
+        import igraph
+        import leidenalg
+
+        node_ids, sources, targets = _edge_arrays(graph)
+        directed = graph.is_directed()
+        ig_graph = igraph.Graph(n=len(node_ids), edges=np.column_stack((sources, targets)).tolist(),
+                                directed=directed)
+        partition = leidenalg.find_partition(ig_graph, leidenalg.RBConfigurationVertexPartition,
+                                             resolution_parameter=self.resolution, seed=self.seed,
+                                             n_iterations=self.iterations)
+        communities = [[node_ids[index] for index in community] for community in partition if community]
+        return _clustering(communities, graph, "Leiden", self.parameters)
+
+
+class LouvainDetector(CommunityDetector):
+    """
+    Louvain (networkx.community.louvain_communities).
+    """
+    name = "louvain"
+
+    def __init__(self, resolution: float = 1.0, seed: Optional[int] = DEFAULT_SEED):
+        """
+        Args:
+            resolution (float): Resolution parameter (higher values give smaller communities).
+            seed (int, optional): Seed of the random node order (None for a random seed).
+        """
+        self.resolution = resolution
+        self.seed = seed
+
+    @property
+    def parameters(self) -> Dict:
+        return {"resolution": self.resolution, "seed": self.seed}
+
+    def _detect(self, graph) -> NodeClustering:
+        communities = nx.community.louvain_communities(to_networkx(graph), resolution=self.resolution,
+                                                       seed=self.seed)
+        return _clustering([list(community) for community in communities], graph, "Louvain", self.parameters)
+
+
+class LabelPropagationDetector(CommunityDetector):
+    """
+    Asynchronous label propagation (networkx, on the undirected graph). Tends to find many small
+    communities that vary between seeds.
+    """
+    name = "label_propagation"
+
+    def __init__(self, seed: Optional[int] = DEFAULT_SEED):
+        """
+        Args:
+            seed (int, optional): Seed of the random update order (None for a random seed).
+        """
+        self.seed = seed
+
+    @property
+    def parameters(self) -> Dict:
+        return {"seed": self.seed}
+
+    def _detect(self, graph) -> NodeClustering:
+        undirected = to_networkx(graph).to_undirected()
+        communities = nx.community.asyn_lpa_communities(undirected, seed=self.seed)
+        return _clustering([list(community) for community in communities], graph, "Label Propagation",
+                           self.parameters)
+
+
+class PackageDetector(CommunityDetector):
+    """
+    Groups the files by their directory (package structure) instead of by their dependencies. Nodes without
+    a file path (e.g. package or library nodes of Arcan) are not part of any component.
+    """
+    name = "package"
+
+    def __init__(self, depth: Optional[int] = None):
+        """
+        Args:
+            depth (int, optional): Only use the first `depth` directories of the path (default is None,
+                the full directory).
+        """
+        self.depth = depth
+
+    @property
+    def parameters(self) -> Dict:
+        return {"depth": self.depth}
+
+    def _detect(self, graph) -> NodeClustering:
+        if isinstance(graph, CSRGraph):
+            node_paths = graph.node_attributes('filePathRelative')
+        else:
+            node_paths = nx.get_node_attributes(graph, 'filePathRelative')
+
+        groups = defaultdict(list)
+        for node_id, path in node_paths.items():
+            directories = os.path.dirname(path.replace("\\", "/")).split("/")
+            if self.depth is not None:
+                directories = directories[:self.depth]
+            groups["/".join(directories)].append(node_id)
+        return _clustering(list(groups.values()), graph, "Package", self.parameters)
+
+
+COMMUNITY_DETECTORS = {
+    detector.name: detector
+    for detector in (InfomapDetector, LeidenDetector, LouvainDetector, LabelPropagationDetector, PackageDetector)
+}
+
+
+def create_detector(name: str, **parameters) -> CommunityDetector:
+    """
+    Creates a community detector by name.
+
+    Args:
+        name (str): One of COMMUNITY_DETECTORS.
+        **parameters: Parameters of the detector (e.g. seed).
+
+    Returns:
+        CommunityDetector: The detector.
+
+    Raises:
+        ValueError: If the detector is unknown.
+    """
+    if name not in COMMUNITY_DETECTORS:
+        raise ValueError(f"Unknown community detection backend {name}, expected one of {list(COMMUNITY_DETECTORS)}")
+    return COMMUNITY_DETECTORS[name](**parameters)
@@ -1,10 +1,17 @@
 import networkx as nx
-from cdlib import algorithms
 import os
+import re
+import threading
 from os.path import join, exists
-from subprocess import call
+from typing import Optional
 from loguru import logger
 
+from componentextractor.arcansupervisor import ArcanFailure, ArcanSupervisor
+from componentextractor.communitydetection import CommunityDetector, InfomapDetector
+from componentextractor.graphcache import GraphCache
+from instrumentation.instrumentation import Instrumentation
+from repositorycache.repositorycache import RepositoryCache
+
 def check_status(path) -> bool:
     """
     Checks if the project has already been processed.
@@ -57,17 +64,70 @@ def find_file_by_extension(directory: str, target_extension: str) -> str:
 
     raise ValueError(f"No file with extension {target_extension} found in {directory}")
 
+
+# Arcan writes the dependency graph of version X (versionIndex) with id Y (commit hash) to dependency-graph-X_Y.graphml
+DEPENDENCY_GRAPH_PATTERN = re.compile(r"^dependency-graph-(\d+)_([0-9A-Za-z]+)\.graphml$")
+
+ANALYSIS_MODES = ("history", "snapshot")
+
+
+def select_dependency_graph(directory: str, commit: Optional[str] = None) -> str:
+    """
+    Selects the dependency graph in an Arcan output directory deterministically: the graph of the newest
+    analysed version, or the graph of the given commit.
+
+    Args:
+        directory (str): The Arcan output directory of a project.
+        commit (str, optional): (Abbreviated) hash of the commit whose graph should be selected.
+
+    Returns:
+        str: The filename of the selected graph.
+    """
+    versions = []
+    for filename in os.listdir(directory):
+        match = DEPENDENCY_GRAPH_PATTERN.match(filename)
+        if match is None:
+            continue
+        version_id = match.group(2)
+        if commit is not None and not (version_id.startswith(commit) or commit.startswith(version_id)):
+            continue
+        versions.append((int(match.group(1)), filename))
+
+    if versions:
+        return max(versions)[1]
+    if commit is not None:
+        raise ValueError(f"No dependency graph for commit {commit} found in {directory}")
+
+    # Unknown naming scheme, fall back to any GraphML file.
+    return find_file_by_extension(directory, ".graphml")
+
 class ComponentExtractor:
     """
     The ComponentExtractor class is responsible for extracting component graphs using the Arcan tool.
     """
-    def __init__(self, language: str):
+    def __init__(self, language: str, graph_cache: Optional[GraphCache] = None, analysis_mode: str = "history",
+                 repository_cache: Optional[RepositoryCache] = None,
+                 community_detector: Optional[CommunityDetector] = None,
+                 instrumentation: Optional[Instrumentation] = None,
+                 arcan_supervisor: Optional[ArcanSupervisor] = None):
         """
         Initializes the ComponentExtractor instance.
 
         Args:
             language: The programming language of the project.
+            graph_cache: Cache for the parsed dependency graphs (default is an in-memory only cache).
+            analysis_mode: "history" analyses a version of the project every 28 days of its history,
+                "snapshot" only analyses the newest commit (or the commit pinned with set_project).
+            repository_cache: Local mirror cache of the repositories. If given Arcan analyses a local checkout
+                instead of cloning the remote itself (default is None).
+            community_detector: Backend used by detect_components (default is Infomap, see communitydetection.py).
+            instrumentation: Records the arcan, graph_load and communities stages (default is in-memory only).
+            arcan_supervisor: Runs Arcan with time and memory limits and a bounded number of concurrent runs
+                (default is an ArcanSupervisor with its default limits).
         """
+        if analysis_mode not in ANALYSIS_MODES:
+            raise ValueError(f"Unknown analysis mode {analysis_mode}, expected one of {ANALYSIS_MODES}")
+
         self.arcan_graphs: str = ""
         self.arcan_script: str = "/component-annotator/src/arcan/run-arcan.sh"           # NOTE: arcan.bat should be run on Windows
         self.arcan_path: str = "/component-annotator/src/arcan"
@@ -75,32 +135,76 @@ class ComponentExtractor:
         self.arcan_out: str = "/component-annotator/data/"
         self.logs_path: str = "/component-annotator/data/arcan-log"
         self.language: str = arcan_language_str(language)
+        self.graph_cache: GraphCache = graph_cache if graph_cache is not None else GraphCache()
+        self.analysis_mode: str = analysis_mode
+        self.repository_cache: Optional[RepositoryCache] = repository_cache
+        self.community_detector: CommunityDetector = (community_detector if community_detector is not None
+                                                      else InfomapDetector())
+        self.instrumentation: Instrumentation = instrumentation if instrumentation is not None else Instrumentation()
+        self.arcan_supervisor: ArcanSupervisor = (arcan_supervisor if arcan_supervisor is not None
+                                                  else ArcanSupervisor())
 
         # Class data.
         self.dep_graph = None
         self.project_name = None
         self.project_url = None
+        self.commit = None
+        self.graph_file = None
         self.valid = False
         self.arcan_run = False
+        self.cancelled = False
+        self._lock = threading.Lock()
 
-    def set_project(self, project: str, project_url: str):
+    def set_project(self, project: str, project_url: str, commit: Optional[str] = None):
         """
         Args:
             project (str): The name of the GitHub project.
             project_url (str): The URL of the GitHub project.
+            commit (str, optional): Commit to analyse in snapshot mode (default is the newest commit).
         """
         self.project_name = project
         self.project_url = project_url
+        self.commit = commit
+        self.graph_file = None
+        self.dep_graph = None
         self.arcan_run = False
         self.valid = True
+        self.cancelled = False
+        self.arcan_supervisor.reset()
+        return self
+
+    def resume(self, graph_file: str):
+        """
+        Uses the dependency graph of an earlier Arcan run of the current project instead of running Arcan.
+
+        Args:
+            graph_file (str): Path of the GraphML file written by the earlier run.
+        """
+        if not os.path.exists(graph_file):
+            raise ValueError(f"Dependency graph {graph_file} of {self.project_name} does not exist anymore")
+        self.graph_file = graph_file
+        self.dep_graph = None
+        self.arcan_run = True
         return self
 
+    def cancel(self) -> None:
+        """
+        Cancels the extraction for the current project. A running Arcan process (including the JVM it
+        started) is terminated and a pending Arcan run is not started anymore. Safe to call from
+        another thread.
+        """
+        with self._lock:
+            self.cancelled = True
+            self.valid = False
+        logger.info(f"Cancelling graph extraction for {self.project_name}")
+        self.arcan_supervisor.cancel()
+
     def dependency_graph(self):
         """
         Returns the dependency graph for a given project.
 
         Returns:
-            nx.Graph: The dependency graph.
+            nx.Graph | CSRGraph: The dependency graph (a CSRGraph if the graph cache is compact).
         """
         if not self.valid:
             raise ValueError("ComponentExtractor illegal state -> project not set or arcan failed")
@@ -116,49 +220,105 @@ class ComponentExtractor:
         Returns:
             cdlib.classes.node_clustering.NodeClustering: The result of the Infomap algorithm.
         """
-        return algorithms.infomap(self.dependency_graph())
+        return InfomapDetector().detect(self.dependency_graph())
+
+    def detect_components(self):
+        """
+        Runs the configured community detection backend on the dependency graph.
+
+        Returns:
+            cdlib.classes.node_clustering.NodeClustering: The detected communities.
+        """
+        dep_graph = self.dependency_graph()
+        with self.instrumentation.stage(self.project_name, "communities",
+                                        backend=self.community_detector.name) as counts:
+            components = self.community_detector.detect(dep_graph)
+            counts["communities"] = len(components.communities)
+        return components
 
     def _init_dep_graph(self):
         if not self.valid:
             raise ValueError("ComponentExtractor illegal state -> project not set or arcan failed")
 
         if not self.arcan_run:
-            self._run_arcan()
+            with self.instrumentation.stage(self.project_name, "arcan") as counts:
+                try:
+                    self._run_arcan()
+                finally:
+                    counts["children_max_rss_mb"] = self.arcan_supervisor.peak_rss_mb
         self.arcan_run = True
 
-        #if self.dep_graph is None:
-        directory: str = self.arcan_out + "arcanOutput/" + self.project_name + "/"
-        if not os.path.exists(directory):
-            self.valid = False
-            raise ValueError("ComponentExtractor illegal state -> project directory cannot be found")
+        if self.cancelled:
+            raise RuntimeError(f"Graph extraction for {self.project_name} was cancelled")
+
+        if self.graph_file is None:
+            directory: str = self._output_directory()
+            if not os.path.exists(directory):
+                self.valid = False
+                raise ValueError("ComponentExtractor illegal state -> project directory cannot be found")
 
-        file = find_file_by_extension(directory, ".graphml")
-        self.dep_graph = nx.read_graphml(directory + file)
+            file = select_dependency_graph(directory, self.commit if self.analysis_mode == "snapshot" else None)
+            self.graph_file = directory + file
+
+        # Parsed at most once per process, detect_components and annotate_project share the graph.
+        if self.dep_graph is not None:
+            return
+        with self.instrumentation.stage(self.project_name, "graph_load") as counts:
+            self.dep_graph = self.graph_cache.load(self.project_name, self.graph_file)
+            counts["nodes"] = self.dep_graph.number_of_nodes()
+            counts["edges"] = self.dep_graph.number_of_edges()
+
+    def _output_directory(self) -> str:
+        return self.arcan_out + "arcanOutput/" + self.project_name + "/"
+
+    def _remove_previous_graphs(self) -> None:
+        """
+        Removes dependency graphs of earlier runs, so that the selected graph always comes from the current run.
+        """
+        directory = self._output_directory()
+        if not os.path.exists(directory):
+            return
+        for filename in os.listdir(directory):
+            if DEPENDENCY_GRAPH_PATTERN.match(filename):
+                os.remove(join(directory, filename))
 
     def _run_arcan(self) -> None:
         """
-        Runs the script to extract the graphs using Arcan.
+        Runs the script to extract the graphs using Arcan (see ArcanSupervisor).
         NOTE: Functionality of checking if project is already analyzed is removed.
+
+        Raises:
+            ArcanFailure: If the Arcan run failed (the extractor is invalid afterwards).
         """
         if not self.valid:
             raise ValueError("Illegal state -> project not set.")
 
-        try:
-
-            command = [self.arcan_script]
-
-            args = [self.project_url, self.project_name,
-                    self.language, self.arcan_path, self.repository_path, self.arcan_out, join(self.logs_path, 'arcan')]
-
-            command.extend(args)
+        command = [self.arcan_script, self.project_url, self.project_name, self.language, self.arcan_path,
+                   self.repository_path, self.arcan_out, join(self.logs_path, 'arcan'), self.analysis_mode]
+        if self.analysis_mode == "snapshot" and self.commit is not None:
+            command.append(self.commit)
 
+        self._remove_previous_graphs()
+        checkout = join(self.repository_path, self.project_name)
+        try:
+            env = dict(os.environ)
+            if self.repository_cache is not None:
+                self.repository_cache.checkout(self.project_url, checkout,
+                                               self.commit if self.analysis_mode == "snapshot" else None)
+                env["ARCAN_LOCAL_INPUT"] = "1"
+
+            if self.cancelled:
+                return
             logger.info(f"Running command: {' '.join(command)}")
-
-            call(" ".join(command), shell=True)
-
+            # A partial clone of Arcan is removed, a checkout of the repository cache is kept.
+            self.arcan_supervisor.run(self.project_name, command, env, self._output_directory(),
+                                      [checkout] if self.repository_cache is None else [])
             logger.info(f"Finished to extract graph for {self.project_name}")
 
-        except Exception as e:
+        except (RuntimeError, OSError) as e:
             logger.error(f"Failed to extract graph for {self.project_name}")
             logger.error(f"{e}")
-            self.valid = False
\ No newline at end of file
+            self.valid = False
+            if isinstance(e, ArcanFailure):
+                raise
+            raise ArcanFailure(self.project_name, "setup", str(e)) from e
@@ -0,0 +1,276 @@
+import os
+import tempfile
+import xml.etree.ElementTree as ET
+from array import array
+from collections import defaultdict
+from typing import Dict, List, Optional, Sequence, Iterator, Tuple
+
+import numpy as np
+from cdlib import NodeClustering
+
+GRAPHML_NS = "{http://graphml.graphdrawing.org/xmlns}"
+
+
+class CSRGraph:
+    """
+    Compact, array-backed representation of an Arcan dependency graph.
+
+    The adjacency is stored in CSR form: the targets of the outgoing edges of node `i` are
+    `indices[indptr[i]:indptr[i + 1]]`. Node attributes are stored as int32 codes into an interned
+    string table (-1 for a missing value), so that a string such as a package path is stored once.
+    """
+    def __init__(self, node_ids: List[str], indptr: np.ndarray, indices: np.ndarray, strings: List[str],
+                 node_attrs: Dict[str, np.ndarray], weights: Optional[np.ndarray] = None, directed: bool = True):
+        """
+        Initializes the CSRGraph instance.
+
+        Args:
+            node_ids (List[str]): GraphML ids of the nodes, the position is the node index.
+            indptr (np.ndarray): CSR row pointer (length: number of nodes + 1).
+            indices (np.ndarray): CSR column indices (length: number of edges).
+            strings (List[str]): Interned string table.
+            node_attrs (Dict[str, np.ndarray]): Per attribute the codes into `strings` of every node.
+            weights (np.ndarray, optional): Edge weights aligned with `indices`.
+            directed (bool): Whether the edges are directed.
+        """
+        self.node_ids = node_ids
+        self.indptr = indptr
+        self.indices = indices
+        self.strings = strings
+        self.node_attrs = node_attrs
+        self.weights = weights
+        self.directed = directed
+
+    def number_of_nodes(self) -> int:
+        return len(self.node_ids)
+
+    def number_of_edges(self) -> int:
+        return len(self.indices)
+
+    def is_directed(self) -> bool:
+        return self.directed
+
+    def edges(self) -> Iterator[Tuple[int, int]]:
+        """
+        Iterates over the edges as (source index, target index) pairs.
+        """
+        sources = np.repeat(np.arange(self.number_of_nodes()), np.diff(self.indptr))
+        return zip(sources.tolist(), self.indices.tolist())
+
+    def node_attribute(self, name: str) -> List[Optional[str]]:
+        """
+        Returns the values of a node attribute for all nodes (None where the attribute is missing).
+
+        Args:
+            name (str): Name of the attribute (e.g. filePathRelative).
+        """
+        codes = self.node_attrs.get(name)
+        if codes is None:
+            return [None] * self.number_of_nodes()
+        return [self.strings[code] if code >= 0 else None for code in codes.tolist()]
+
+    def node_attributes(self, name: str) -> Dict[str, str]:
+        """
+        Same as nx.get_node_attributes: node id -> value for the nodes that have the attribute.
+
+        Args:
+            name (str): Name of the attribute (e.g. filePathRelative).
+        """
+        return {node_id: value for node_id, value in zip(self.node_ids, self.node_attribute(name))
+                if value is not None}
+
+    def save_npz(self, path: str) -> None:
+        """
+        Saves the graph as an .npz file.
+
+        Args:
+            path (str): Destination path (.npz).
+        """
+        arrays = {
+            "node_ids": np.array(self.node_ids, dtype=str),
+            "indptr": self.indptr,
+            "indices": self.indices,
+            "strings": np.array(self.strings, dtype=str),
+            "attr_names": np.array(list(self.node_attrs), dtype=str),
+            "directed": np.array(self.directed),
+        }
+        for index, codes in enumerate(self.node_attrs.values()):
+            arrays[f"attr_{index}"] = codes
+        if self.weights is not None:
+            arrays["weights"] = self.weights
+
+        write_npz_atomic(path, arrays)
+
+    @classmethod
+    def load_npz(cls, path: str) -> "CSRGraph":
+        """
+        Loads a graph saved with save_npz.
+
+        Args:
+            path (str): Path of the .npz file.
+        """
+        with np.load(path, allow_pickle=False) as data:
+            node_attrs = {name: data[f"attr_{index}"] for index, name in enumerate(data["attr_names"].tolist())}
+            return cls(data["node_ids"].tolist(), data["indptr"], data["indices"], data["strings"].tolist(),
+                       node_attrs, data["weights"] if "weights" in data else None, bool(data["directed"]))
+
+
+def write_npz_atomic(path: str, arrays: Dict[str, np.ndarray]) -> None:
+    """
+    Writes arrays to a compressed .npz file through a unique temporary file in the destination directory,
+    so that concurrent writers of the same path never share a temporary file and readers never see a
+    truncated file.
+
+    Args:
+        path (str): Destination path (.npz).
+        arrays (Dict[str, np.ndarray]): Arrays to store, by name.
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp.npz")
+    try:
+        with os.fdopen(fd, "wb") as tmp_file:
+            np.savez_compressed(tmp_file, **arrays)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _discard(parent: Optional[ET.Element], elem: ET.Element) -> None:
+    """
+    Frees a processed element. The element is the last child of its parent at its end event, so
+    removing it keeps the partially built tree empty.
+    """
+    elem.clear()
+    if parent is not None and len(parent) and parent[-1] is elem:
+        del parent[-1]
+
+
+def read_graphml_csr(path: str, node_attributes: Sequence[str] = ("filePathRelative",)) -> CSRGraph:
+    """
+    Streams a GraphML file into a CSRGraph. Elements are discarded as soon as they are processed, so the
+    XML document is never held in memory as a whole and no networkx graph is built.
+
+    Args:
+        path (str): Path of the GraphML file.
+        node_attributes (Sequence[str]): Names of the node attributes to keep.
+
+    Returns:
+        CSRGraph: The dependency graph.
+    """
+    wanted = set(node_attributes)
+    node_keys = {}          # GraphML key id -> attribute name (node attributes that are kept)
+    weight_key = None
+    directed = True
+    graph_elem = None
+
+    node_index: Dict[str, int] = {}
+    node_ids: List[str] = []
+    strings: List[str] = []
+    string_codes: Dict[str, int] = {}
+    attr_codes: Dict[str, Dict[int, int]] = defaultdict(dict)
+    sources, targets, weights = array("i"), array("i"), array("d")
+
+    def index_of(node_id: str) -> int:
+        index = node_index.get(node_id)
+        if index is None:
+            index = node_index[node_id] = len(node_ids)
+            node_ids.append(node_id)
+        return index
+
+    def intern(value: str) -> int:
+        code = string_codes.get(value)
+        if code is None:
+            code = string_codes[value] = len(strings)
+            strings.append(value)
+        return code
+
+    for event, elem in ET.iterparse(path, events=("start", "end")):
+        tag = elem.tag.replace(GRAPHML_NS, "")
+        if event == "start":
+            if tag == "graph":
+                graph_elem = elem
+                directed = elem.get("edgedefault", "directed") == "directed"
+            continue
+
+        if tag == "key":
+            if elem.get("for") == "node" and elem.get("attr.name") in wanted:
+                node_keys[elem.get("id")] = elem.get("attr.name")
+            elif elem.get("for") == "edge" and elem.get("attr.name") == "weight":
+                weight_key = elem.get("id")
+        elif tag == "node":
+            index = index_of(elem.get("id"))
+            for data in elem.iter(GRAPHML_NS + "data"):
+                name = node_keys.get(data.get("key"))
+                if name is not None and data.text is not None:
+                    attr_codes[name][index] = intern(data.text)
+            _discard(graph_elem, elem)
+        elif tag == "edge":
+            sources.append(index_of(elem.get("source")))
+            targets.append(index_of(elem.get("target")))
+            if weight_key is not None:
+                weight = 1.0
+                for data in elem.iter(GRAPHML_NS + "data"):
+                    if data.get("key") == weight_key:
+                        weight = float(data.text)
+                weights.append(weight)
+            _discard(graph_elem, elem)
+        elif tag == "graph":
+            elem.clear()
+
+    num_nodes = len(node_ids)
+    sources = np.frombuffer(sources, dtype=np.int32)
+    targets = np.frombuffer(targets, dtype=np.int32)
+    order = np.argsort(sources, kind="stable")
+    indptr = np.zeros(num_nodes + 1, dtype=np.int64)
+    np.cumsum(np.bincount(sources, minlength=num_nodes), out=indptr[1:])
+
+    node_attrs = {}
+    for name in node_attributes:
+        codes = np.full(num_nodes, -1, dtype=np.int32)
+        if attr_codes[name]:
+            positions = np.fromiter(attr_codes[name].keys(), dtype=np.int64)
+            codes[positions] = np.fromiter(attr_codes[name].values(), dtype=np.int32)
+        node_attrs[name] = codes
+
+    edge_weights = np.frombuffer(weights, dtype=np.float64)[order] if weight_key is not None else None
+    return CSRGraph(node_ids, indptr, targets[order].copy(), strings, node_attrs, edge_weights, directed)
+
+
+def infomap_csr(graph: CSRGraph, flags: str = "") -> NodeClustering:
+    """
+    Runs Infomap directly on a CSRGraph (same behaviour as cdlib.algorithms.infomap on the equivalent
+    networkx graph, without building one).
+
+    Args:
+        graph (CSRGraph): The dependency graph.
+        flags (str): Flags for Infomap.
+
+    Returns:
+        cdlib.classes.node_clustering.NodeClustering: The communities (lists of node ids).
+    """
+    import infomap
+    from wurlitzer import pipes
+
+    if graph.is_directed() and "-d" not in flags and "--directed" not in flags:
+        flags += " -d"
+
+    modules = defaultdict(list)
+    with pipes():
+        im = infomap.Infomap(flags)
+        im.add_nodes({index: node_id for index, node_id in enumerate(graph.node_ids)})
+        if graph.weights is None:
+            for source, target in graph.edges():
+                im.add_link(source, target)
+        else:
+            for (source, target), weight in zip(graph.edges(), graph.weights.tolist()):
+                im.add_link(source, target, weight)
+        im.run()
+
+        for node_index, module_id in im.modules:
+            modules[module_id].append(graph.node_ids[node_index])
+
+    components = NodeClustering([list(community) for community in modules.values()], None, "Infomap",
+                                method_parameters={"flags": flags})
+    components.graph = graph
+    return components
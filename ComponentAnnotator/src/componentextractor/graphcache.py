@@ -0,0 +1,223 @@
+import hashlib
+import json
+import os
+from collections import OrderedDict
+from typing import Optional, Dict, List, Tuple
+
+import networkx as nx
+import numpy as np
+from loguru import logger
+
+from componentextractor.csrgraph import CSRGraph, read_graphml_csr, write_npz_atomic
+
+GRAPH_TYPES = {
+    "Graph": nx.Graph,
+    "DiGraph": nx.DiGraph,
+    "MultiGraph": nx.MultiGraph,
+    "MultiDiGraph": nx.MultiDiGraph,
+}
+
+# Attribute name under which the keys of multigraph edges are stored.
+EDGE_KEY_ATTR = "__key__"
+
+
+def file_fingerprint(path: str, use_hash: bool = False) -> str:
+    """
+    Fingerprint of a file based on its modification time and size (and optionally its content).
+
+    Args:
+        path (str): Path of the file.
+        use_hash (bool): Also hash the content of the file (slower, but robust against copies that
+            preserve the modification time).
+
+    Returns:
+        str: Hex fingerprint of the file.
+    """
+    stat = os.stat(path)
+    fingerprint = hashlib.sha1(f"{stat.st_mtime_ns}:{stat.st_size}".encode())
+    if use_hash:
+        with open(path, "rb") as file:
+            for chunk in iter(lambda: file.read(1 << 20), b""):
+                fingerprint.update(chunk)
+    return fingerprint.hexdigest()[:16]
+
+
+def _attribute_columns(items: List[Dict], prefix: str) -> Dict[str, np.ndarray]:
+    """
+    Converts a list of attribute dictionaries into typed columns plus a mask per attribute.
+    """
+    columns = {}
+    names = sorted({name for attrs in items for name in attrs})
+    columns[f"{prefix}_names"] = np.array(names, dtype=str)
+    for index, name in enumerate(names):
+        mask = np.array([name in attrs for attrs in items], dtype=bool)
+        present = [attrs[name] for attrs in items if name in attrs]
+        value_type = type(present[0])
+        if value_type not in (bool, int, float) or any(type(value) is not value_type for value in present):
+            value_type = str
+        fill = value_type()
+        values = [value_type(attrs[name]) if name in attrs else fill for attrs in items]
+        columns[f"{prefix}_{index}"] = np.array(values, dtype=value_type)
+        columns[f"{prefix}_mask_{index}"] = mask
+    return columns
+
+
+def _attribute_dicts(data, prefix: str, count: int) -> List[Dict]:
+    """
+    Inverse of _attribute_columns.
+    """
+    items = [{} for _ in range(count)]
+    for index, name in enumerate(data[f"{prefix}_names"].tolist()):
+        values = data[f"{prefix}_{index}"].tolist()
+        mask = data[f"{prefix}_mask_{index}"]
+        for position in np.flatnonzero(mask):
+            items[position][name] = values[position]
+    return items
+
+
+def save_graph_npz(graph: nx.Graph, path: str) -> None:
+    """
+    Saves a graph as a compact .npz file: node ids, an integer edge list and typed node/edge
+    attribute tables.
+
+    Args:
+        graph (nx.Graph): The graph to save.
+        path (str): Destination path (.npz).
+    """
+    nodes = list(graph.nodes)
+    position = {node_id: index for index, node_id in enumerate(nodes)}
+    if graph.is_multigraph():
+        edge_list = list(graph.edges(keys=True, data=True))
+        edges = [(position[u], position[v]) for u, v, _, _ in edge_list]
+        edge_attrs = [dict(attrs, **{EDGE_KEY_ATTR: key}) for _, _, key, attrs in edge_list]
+    else:
+        edge_list = list(graph.edges(data=True))
+        edges = [(position[u], position[v]) for u, v, _ in edge_list]
+        edge_attrs = [attrs for _, _, attrs in edge_list]
+
+    arrays = {
+        "graph_type": np.array(type(graph).__name__),
+        "graph_attrs": np.array(json.dumps(graph.graph)),
+        "nodes": np.array([str(node_id) for node_id in nodes], dtype=str),
+        "edges": np.array(edges, dtype=np.int64).reshape(-1, 2),
+    }
+    arrays.update(_attribute_columns([graph.nodes[node_id] for node_id in nodes], "node_attr"))
+    arrays.update(_attribute_columns(edge_attrs, "edge_attr"))
+
+    # Write to a temporary file first so that a crash never leaves a truncated cache entry.
+    write_npz_atomic(path, arrays)
+
+
+def load_graph_npz(path: str) -> nx.Graph:
+    """
+    Loads a graph saved with save_graph_npz.
+
+    Args:
+        path (str): Path of the .npz file.
+
+    Returns:
+        nx.Graph: The graph (same graph class as the saved graph).
+    """
+    with np.load(path, allow_pickle=False) as data:
+        graph = GRAPH_TYPES[str(data["graph_type"])]()
+        graph.graph.update(json.loads(str(data["graph_attrs"])))
+
+        nodes = data["nodes"].tolist()
+        node_attrs = _attribute_dicts(data, "node_attr", len(nodes))
+        graph.add_nodes_from(zip(nodes, node_attrs))
+
+        edges = data["edges"]
+        edge_attrs = _attribute_dicts(data, "edge_attr", len(edges))
+        if graph.is_multigraph():
+            graph.add_edges_from((nodes[u], nodes[v], attrs.pop(EDGE_KEY_ATTR), attrs)
+                                 for (u, v), attrs in zip(edges.tolist(), edge_attrs))
+        else:
+            graph.add_edges_from((nodes[u], nodes[v], attrs) for (u, v), attrs in zip(edges.tolist(), edge_attrs))
+    return graph
+
+
+class GraphCache:
+    """
+    Cache for the dependency graphs produced by Arcan. A GraphML file is parsed at most once per process
+    (per project and file fingerprint) and, if a cache directory is given, a compact .npz copy of the graph
+    is kept on disk so that later runs do not need to parse the XML at all.
+
+    With `compact=True` the graphs are streamed into CSRGraphs instead of networkx graphs.
+    """
+    def __init__(self, cache_dir: Optional[str] = None, use_hash: bool = False, max_entries: int = 4,
+                 compact: bool = False):
+        """
+        Initializes the GraphCache instance.
+
+        Args:
+            cache_dir (str, optional): Directory for the on-disk .npz copies (default is None, in-memory only).
+            use_hash (bool, optional): Include a content hash of the GraphML file in the cache key (default is False,
+                modification time and size only).
+            max_entries (int, optional): Number of graphs kept in memory (least recently used graphs are dropped).
+            compact (bool, optional): Load the graphs as CSRGraphs with read_graphml_csr (default is False).
+        """
+        self.cache_dir = cache_dir
+        self.use_hash = use_hash
+        self.max_entries = max_entries
+        self.compact = compact
+        self._graphs: "OrderedDict[Tuple[str, str], nx.Graph]" = OrderedDict()
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        if self.cache_dir is not None:
+            os.makedirs(self.cache_dir, exist_ok=True)
+
+    def load(self, project_name: str, graphml_path: str) -> nx.Graph:
+        """
+        Returns the graph stored in a GraphML file, parsing the file only if needed.
+
+        Args:
+            project_name (str): Name of the project the graph belongs to.
+            graphml_path (str): Path of the GraphML file written by Arcan.
+
+        Returns:
+            nx.Graph | CSRGraph: The dependency graph. The same object is returned for repeated calls, so it should
+            not be modified.
+        """
+        key = (project_name, file_fingerprint(graphml_path, self.use_hash))
+
+        if key in self._graphs:
+            self.hits += 1
+            self._graphs.move_to_end(key)
+            return self._graphs[key]
+
+        npz_path = self._npz_path(key)
+        if npz_path is not None and os.path.exists(npz_path):
+            self.disk_hits += 1
+            graph = CSRGraph.load_npz(npz_path) if self.compact else load_graph_npz(npz_path)
+            logger.info(f"Loaded cached dependency graph of {project_name} from {npz_path}")
+        else:
+            self.misses += 1
+            if self.compact:
+                graph = read_graphml_csr(graphml_path)
+                if npz_path is not None:
+                    graph.save_npz(npz_path)
+            else:
+                graph = nx.read_graphml(graphml_path)
+                if npz_path is not None:
+                    save_graph_npz(graph, npz_path)
+
+        self._graphs[key] = graph
+        while len(self._graphs) > self.max_entries:
+            self._graphs.popitem(last=False)
+        return graph
+
+    def clear(self) -> None:
+        """
+        Drops all in-memory graphs (the on-disk copies are kept).
+        """
+        self._graphs.clear()
+
+    def _npz_path(self, key: Tuple[str, str]) -> Optional[str]:
+        if self.cache_dir is None:
+            return None
+        project_name, fingerprint = key
+        kind = "csr" if self.compact else "nx"
+        return os.path.join(self.cache_dir, f"{project_name}-{fingerprint}.{kind}.npz")
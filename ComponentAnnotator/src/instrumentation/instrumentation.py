@@ -0,0 +1,220 @@
+import json
+import os
+import resource
+import threading
+import time
+import traceback
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Callable, Dict, Iterable, List, Optional
+
+import pandas as pd
+from loguru import logger
+
+# Stages of the annotation pipeline, in pipeline order.
+STAGES = ("labels", "arcan", "graph_load", "communities", "aggregate", "write", "sinks", "project")
+
+
+def current_rss_mb() -> float:
+    """
+    Returns the current resident set size of this process in MiB (0 if it cannot be determined).
+    """
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except (OSError, ValueError, IndexError):
+        return 0.0
+
+
+def _max_rss_mb(who: int) -> float:
+    # ru_maxrss is in KiB on Linux.
+    return resource.getrusage(who).ru_maxrss / 1024
+
+
+class Instrumentation:
+    """
+    Records per project and stage the wall time, CPU time (of this process and of its child processes, i.e.
+    Arcan), the resident memory and stage specific counts (files, nodes, edges, communities, rows).
+    Records are kept in memory for the batch summary, appended to a JSONL file if one is given and passed
+    to the listeners.
+
+    NOTE: CPU time and peak RSS are process wide, so stages that run at the same time (pipelined mode) are
+    not separated. The peak RSS of Arcan (`children_max_rss_mb`) is added to the `arcan` and `project` records
+    by the ArcanSupervisor, which samples the memory of each run.
+    """
+    def __init__(self, metrics_path: Optional[str] = None, listeners: Optional[List[Callable[[Dict], None]]] = None):
+        """
+        Initializes the Instrumentation instance.
+
+        Args:
+            metrics_path (str, optional): JSONL file the records are appended to (default is None, memory only).
+            listeners (List[Callable], optional): Functions called with every record (e.g. progress reporting).
+        """
+        self.metrics_path = metrics_path
+        self.listeners = list(listeners) if listeners is not None else []
+        self.records: List[Dict] = []
+        self._lock = threading.Lock()
+
+        if self.metrics_path is not None and os.path.dirname(self.metrics_path):
+            os.makedirs(os.path.dirname(self.metrics_path), exist_ok=True)
+
+    @contextmanager
+    def stage(self, project_name: str, stage: str, **counts):
+        """
+        Measures a stage of a project. The yielded dictionary can be used to add counts to the record.
+
+        Args:
+            project_name (str): Name of the project.
+            stage (str): Name of the stage (see STAGES).
+            **counts: Counts that are known when the stage starts.
+
+        Yields:
+            Dict: The counts of the record.
+        """
+        counts = dict(counts)
+        started_at = datetime.now(timezone.utc).isoformat()
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        children_start = resource.getrusage(resource.RUSAGE_CHILDREN)
+        status, error = "ok", None
+        try:
+            yield counts
+        except BaseException as exc:
+            status, error = "failed", f"{type(exc).__name__}: {exc}"
+            raise
+        finally:
+            children_end = resource.getrusage(resource.RUSAGE_CHILDREN)
+            record = {
+                "project": project_name,
+                "stage": stage,
+                "started_at": started_at,
+                "wall_s": time.perf_counter() - wall_start,
+                "cpu_s": time.process_time() - cpu_start,
+                "children_cpu_s": (children_end.ru_utime + children_end.ru_stime
+                                   - children_start.ru_utime - children_start.ru_stime),
+                "rss_mb": current_rss_mb(),
+                "max_rss_mb": _max_rss_mb(resource.RUSAGE_SELF),
+                "status": status,
+                "error": error,
+                **counts,
+            }
+            self.record(record)
+
+    def record_stage(self, project_name: str, stage: str, wall_s: float, started_at: Optional[str] = None,
+                     **counts) -> None:
+        """
+        Records a stage that was timed elsewhere, e.g. the database write of a project in the background thread
+        of the ResultsWriter. The CPU time of such a stage cannot be separated from the other threads and is
+        not recorded.
+
+        Args:
+            project_name (str): Name of the project.
+            stage (str): Name of the stage (see STAGES).
+            wall_s (float): Wall time of the stage in seconds.
+            started_at (str, optional): ISO timestamp of the start of the stage (default is now).
+            **counts: Counts of the record.
+        """
+        self.record({
+            "project": project_name,
+            "stage": stage,
+            "started_at": started_at or datetime.now(timezone.utc).isoformat(),
+            "wall_s": wall_s,
+            "cpu_s": None,
+            "children_cpu_s": None,
+            "rss_mb": current_rss_mb(),
+            "max_rss_mb": _max_rss_mb(resource.RUSAGE_SELF),
+            "status": "ok",
+            "error": None,
+            **counts,
+        })
+
+    def record(self, record: Dict) -> None:
+        """
+        Adds a record (writes it to the JSONL file and passes it to the listeners).
+        """
+        with self._lock:
+            self.records.append(record)
+            if self.metrics_path is not None:
+                with open(self.metrics_path, "a") as file:
+                    file.write(json.dumps(record) + "\n")
+        for listener in self.listeners:
+            try:
+                listener(record)
+            except Exception:
+                logger.error(f"Instrumentation listener failed:\n{traceback.format_exc()}")
+
+    def extend(self, records: Iterable[Dict]) -> None:
+        """
+        Adds records that were already written elsewhere (e.g. by a worker process) to the in-memory records.
+        """
+        with self._lock:
+            self.records.extend(records)
+
+    def drain(self) -> List[Dict]:
+        """
+        Removes and returns the in-memory records.
+        """
+        with self._lock:
+            records, self.records = self.records, []
+        return records
+
+    def log_summary(self, records: Optional[List[Dict]] = None) -> pd.DataFrame:
+        """
+        Logs the per stage summary of the records (default is all in-memory records).
+
+        Returns:
+            pd.DataFrame: The summary (see summarize).
+        """
+        summary = summarize(self.records if records is None else records)
+        if not summary.empty:
+            logger.info(f"Stage summary:\n{summary.round(2).to_string()}")
+        return summary
+
+
+def load_records(metrics_path: str) -> List[Dict]:
+    """
+    Loads the records of a JSONL metrics file.
+    """
+    with open(metrics_path) as file:
+        return [json.loads(line) for line in file if line.strip()]
+
+
+def summarize(records: List[Dict]) -> pd.DataFrame:
+    """
+    Summarizes stage records per stage.
+
+    Args:
+        records (List[Dict]): Stage records (see Instrumentation.stage).
+
+    Returns:
+        pd.DataFrame: Per stage (in pipeline order): number of runs and failures, total/mean/p95/max wall time,
+        total CPU time of the process and of child processes, peak RSS and the share of the total stage time
+        (excluding the `project` stage, which spans the other stages).
+    """
+    if not records:
+        return pd.DataFrame()
+
+    df = pd.DataFrame(records)
+    # Only the stages that ran Arcan have a child peak RSS.
+    df["children_max_rss_mb"] = pd.to_numeric(df["children_max_rss_mb"], errors="coerce") \
+        if "children_max_rss_mb" in df.columns else float("nan")
+    grouped = df.groupby("stage")
+    summary = pd.DataFrame({
+        "runs": grouped.size(),
+        "failed": grouped["status"].apply(lambda status: int((status != "ok").sum())),
+        "wall_total_s": grouped["wall_s"].sum(),
+        "wall_mean_s": grouped["wall_s"].mean(),
+        "wall_p95_s": grouped["wall_s"].quantile(0.95),
+        "wall_max_s": grouped["wall_s"].max(),
+        "cpu_total_s": grouped["cpu_s"].sum(),
+        "children_cpu_total_s": grouped["children_cpu_s"].sum(),
+        "max_rss_mb": grouped["max_rss_mb"].max(),
+        "children_max_rss_mb": grouped["children_max_rss_mb"].max(),
+    })
+    stage_time = summary.loc[summary.index != "project", "wall_total_s"].sum()
+    summary["share"] = summary["wall_total_s"] / stage_time if stage_time > 0 else 0.0
+    summary.loc[summary.index == "project", "share"] = float("nan")
+
+    order = [stage for stage in STAGES if stage in summary.index]
+    order += sorted(stage for stage in summary.index if stage not in STAGES)
+    return summary.loc[order]
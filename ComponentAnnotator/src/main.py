@@ -1,94 +1,164 @@
-import pickle
-from typing import Set, Tuple, List
+import argparse
+import functools
+from typing import List, Optional, Tuple
 
-import pandas as pd
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.select import Select
+from annotationservice.annotationservice import SERVICE_PORT, serve
+from autoflclient.autoflclient import AUTO_FL_URL
 from componentannotator.componentannotator import ComponentAnnotator
+from componentextractor.arcansupervisor import DEFAULT_ARCAN_TIMEOUT
+from componentextractor.communitydetection import COMMUNITY_DETECTORS, DEFAULT_SEED
+from projectextractor.wasteservice import wasteservice_projects
+from projectregistry.projectregistry import ProjectRegistry
+from resultswriter.resultswriter import DEFAULT_DATABASE_URL
+from workqueue.workqueue import DEFAULT_LEASE_SECONDS, QueueWorker, WorkQueue
 from loguru import logger
 
-def waste_service_links():
-    """
-    This function visits the wasteservice webpage and extracts all the GitHub projects from it
-    as (name, url) pairs.
-    """
-    options = webdriver.ChromeOptions()
-    options.add_argument('--headless')
-    options.add_argument('--no-sandbox')
+def process(tuples_param: List[Tuple], num_workers: int = 1, registry: Optional[ProjectRegistry] = None,
+            **annotator_args):
+    annot = ComponentAnnotator("java", **annotator_args)
+    tuples_param = preflight(annot, tuples_param, registry)
+    if annot.schedule:
+        tuples_param = annot.schedule_projects([{"name": name, "html_url": url, "size": annot.project_sizes.get(name)}
+                                                for name, url in tuples_param], num_workers)
+
+    # Append every project as soon as it is finished instead of keeping all frames in memory.
+    header = True
+    for _, df_project in annot.iter_annotate_project_list(list(tuples_param), num_workers):
+        df_project.to_csv('output_wasteservice.csv', mode='w' if header else 'a', header=header, index=False)
+        header = False
+
+def preflight(annot: ComponentAnnotator, projects: List[Tuple], registry: Optional[ProjectRegistry] = None) \
+        -> List[Tuple]:
+    # Repositories that no longer exist are excluded in the registry, so later batches skip them without a check.
+    projects = annot.preflight_projects(projects)
+    if registry is not None:
+        for result in annot.ineligible_projects:
+            if result["reason"] == "not_found":
+                registry.exclude(result["name"], "preflight: not_found", replace=False)
+    return projects
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Component annotation pipeline for abandoned projects.")
+    parser.add_argument("--source", default="github", choices=["github", "wasteservice"],
+                        help="Annotate abandoned GitHub projects or the projects listed on wasteservice.")
+    parser.add_argument("--num-projects", type=int, default=10, help="Number of GitHub projects to annotate.")
+    parser.add_argument("--project", nargs=2, metavar=("NAME", "URL"), help="Annotate a single project.")
+    parser.add_argument("--commit", help="Commit of --project to analyse (with --snapshot, default is the newest).")
+    parser.add_argument("--registry", default="projects.db", help="Project registry (SQLite) of the wasteservice list.")
+    parser.add_argument("--refresh-projects", action="store_true",
+                        help="Fetch the wasteservice list again instead of using the list in the registry.")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Number of worker processes (with --serve: number of projects annotated at once).")
+    parser.add_argument("--serve", action="store_true",
+                        help="Run the annotation job service instead of a single batch.")
+    parser.add_argument("--host", default="0.0.0.0", help="Interface of the job service.")
+    parser.add_argument("--port", type=int, default=SERVICE_PORT, help="Port of the job service.")
+    parser.add_argument("--max-queued", type=int, default=1000, help="Maximum number of projects queued by the service.")
+    queue_mode = parser.add_mutually_exclusive_group()
+    queue_mode.add_argument("--enqueue", action="store_true",
+                            help="Add the projects of --source to the shared work queue (in the results database).")
+    queue_mode.add_argument("--work", action="store_true",
+                            help="Annotate the projects of the shared work queue until it is empty.")
+    parser.add_argument("--queue-name", default="default", help="Name of the shared work queue.")
+    parser.add_argument("--lease-seconds", type=float, default=DEFAULT_LEASE_SECONDS,
+                        help="Seconds a worker holds a project without a heartbeat.")
+    parser.add_argument("--idle-timeout", type=float, default=0.0,
+                        help="Seconds a worker waits for new projects once the queue is empty.")
+    parser.add_argument("--pipelined", action="store_true", help="Run auto-fl and Arcan of a project concurrently.")
+    parser.add_argument("--snapshot", action="store_true", help="Only analyse the newest commit with Arcan.")
+    parser.add_argument("--compact-graph", action="store_true", help="Load dependency graphs as compact CSR graphs.")
+    parser.add_argument("--graph-cache-dir", help="Directory for on-disk copies of the parsed dependency graphs.")
+    parser.add_argument("--repository-cache-dir", help="Directory of the local git mirror cache.")
+    parser.add_argument("--repository-filter",
+                        help="Partial clone filter of the cached git mirrors (e.g. blob:none).")
+    parser.add_argument("--manifest", help="Stage manifest (SQLite) used to resume interrupted batches.")
+    parser.add_argument("--force", action="store_true", help="Ignore the stages recorded in the manifest.")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Only annotate projects whose remote HEAD changed since they were annotated "
+                             "(needs --manifest).")
+    parser.add_argument("--auto-fl-url", default=AUTO_FL_URL, help="Base URL of the auto-fl annotator.")
+    parser.add_argument("--community-detection", default="infomap", choices=list(COMMUNITY_DETECTORS),
+                        help="Community detection backend.")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED,
+                        help="Seed of the community detection (ignored by the package backend).")
+    parser.add_argument("--community-cache-dir", help="Directory of the memoized community detection results.")
+    parser.add_argument("--metrics", help="JSONL file for the per stage timing and memory records.")
+    parser.add_argument("--parquet-dir", help="Directory of the Parquet dataset the results are appended to.")
+    parser.add_argument("--database-url", default=DEFAULT_DATABASE_URL,
+                        help="SQLAlchemy URL of the results database (e.g. sqlite:///results.db).")
+    parser.add_argument("--arcan-timeout", type=float, default=DEFAULT_ARCAN_TIMEOUT,
+                        help="Maximum seconds of an Arcan run.")
+    parser.add_argument("--arcan-max-rss-mb", type=float, help="Maximum resident memory of an Arcan run in MiB.")
+    parser.add_argument("--arcan-heap", help="Maximum heap of the Arcan JVM (e.g. 8G).")
+    parser.add_argument("--arcan-slots", type=int, help="Maximum number of concurrent Arcan runs.")
+    parser.add_argument("--github-cache-dir", help="Directory of the GitHub search response cache.")
+    parser.add_argument("--schedule", action="store_true",
+                        help="Annotate the projects with the largest estimated cost first.")
+    parser.add_argument("--time-budget", type=float,
+                        help="Seconds a batch may take, projects expected to exceed it are deferred "
+                             "(implies --schedule).")
+    parser.add_argument("--cost-history", nargs="+",
+                        help="Metrics files (JSONL) of earlier batches for the cost estimates (default is --metrics).")
+    parser.add_argument("--deferred",
+                        help="JSON file of the projects deferred by --time-budget, scheduled again by the next batch.")
+    parser.add_argument("--preflight", action="store_true",
+                        help="Skip projects that do not exist, are not Java or are too large before annotating them.")
+    parser.add_argument("--max-size-kb", type=int, help="Maximum repository size (KiB) of pre-flight checked projects.")
+    parser.add_argument("--preflight-cache", help="SQLite file of the pre-flight results (reused for a week).")
+    fixtures = parser.add_mutually_exclusive_group()
+    fixtures.add_argument("--record", help="Record GitHub, auto-fl and Arcan outputs into this fixtures directory.")
+    fixtures.add_argument("--replay", help="Replay the recorded inputs of this fixtures directory.")
+    args = parser.parse_args()
+    if args.commit and not args.project:
+        parser.error("--commit requires --project")
+    return args
+
+
+def annotator_args(args) -> dict:
+    return {"pipelined": args.pipelined, "analysis_mode": "snapshot" if args.snapshot else "history",
+            "compact_graph": args.compact_graph, "graph_cache_dir": args.graph_cache_dir,
+            "repository_cache_dir": args.repository_cache_dir, "repository_filter": args.repository_filter,
+            "manifest_path": args.manifest, "force": args.force,
+            "parquet_dir": args.parquet_dir, "auto_fl_url": args.auto_fl_url,
+            "community_detection": args.community_detection,
+            "community_parameters": {"seed": args.seed} if args.community_detection != "package" else None,
+            "community_cache_dir": args.community_cache_dir, "metrics_path": args.metrics,
+            "database_url": args.database_url, "record_dir": args.record, "replay_dir": args.replay,
+            "arcan_timeout": args.arcan_timeout, "arcan_max_rss_mb": args.arcan_max_rss_mb,
+            "arcan_heap": args.arcan_heap, "arcan_slots": args.arcan_slots,
+            "github_cache_dir": args.github_cache_dir, "incremental": args.incremental, "schedule": args.schedule,
+            "time_budget": args.time_budget, "cost_history": args.cost_history, "deferred_path": args.deferred,
+            "preflight": args.preflight,
+            "max_size_kb": args.max_size_kb, "preflight_cache": args.preflight_cache}
 
-    driver = webdriver.Chrome(options=options)
-    # Navigate to the webpage
-    driver.get('https://wasteservice.github.io/')
-
-    driver.implicitly_wait(2)
-
-    multi_select = driver.find_element(by=By.CSS_SELECTOR, value="select")
-
-    select = Select(multi_select)
-    select.select_by_value("-1")            # This is to get the webpage to display ALL projects.
-
-    table = driver.find_element(By.CSS_SELECTOR, 'table')
-
-    # Find the header row of the table
-    header_row = table.find_element(By.TAG_NAME, 'thead').find_element(By.TAG_NAME, 'tr')
-
-    # Find the index of the "Project" column
-    columns = header_row.find_elements(By.TAG_NAME, 'th')
-
-    project_column_index = None
-    for index, column in enumerate(columns):
-        if column.text == 'Project':
-            project_column_index = index
-            break
-
-    projects = set()
-
-    dead_projects = ["ase4j", "tohu-generator", "Usherb-IFT585-TP1-Link-layer", "sudo-ku",
-                     "redmineissuedumptool", "dwr-toplink", "Dessolation-Messenger-of-Disservice", "generator-example", "bits4j"]
-
-    # Get project name and project url pairs.
-    if project_column_index is not None:
-        # Find all rows in the table body
-        rows = table.find_element(By.TAG_NAME, 'tbody').find_elements(By.TAG_NAME, 'tr')
-
-        # Extract and print information from the "Project" column
-        for row in rows:
-            # Find all cells in the row
-            cells = row.find_elements(By.TAG_NAME, 'td')
-            link = row.find_elements(By.TAG_NAME, "a")
-            # Check if the index is within the range of the cells
-            if project_column_index < len(cells):
-                if cells[1].text not in dead_projects:
-                    projects.add( (cells[1].text, link[1].get_attribute("href")) )
-
-    projects_list = list(projects)
-    # Extract and print column names
-    with open('projects.pkl', 'wb') as file:
-        pickle.dump(projects_list, file)
-    # Close the browser
-    driver.quit()
-
-def load_projects():
-    # Load the projects dictionary from the pickle file
-    with open('./src/projects.pkl', 'rb') as pickle_file:
-        loaded_projects = pickle.load(pickle_file)
-
-    # Print or use the loaded projects dictionary
-    return loaded_projects
-
-def process(tuples_param: Set[Tuple]):
-    annot = ComponentAnnotator("java")
-
-    tuples = list(tuples_param)
-    frames = annot.annotate_project_list(tuples)
-    if len(frames) > 0:
-        pd.concat(frames).to_csv(f'output_wasteservice.csv', index=False)
 
 if __name__ == "__main__":
-    #waste_service_links()
-    #projects = load_projects()
-    #print(len(projects))
-    #process(projects)
-
-    ComponentAnnotator("java").annotate_projects(10)
\ No newline at end of file
+    args = parse_args()
+    if args.work:
+        work_queue = WorkQueue(args.database_url, args.queue_name, args.lease_seconds)
+        QueueWorker(work_queue, ComponentAnnotator("java", **annotator_args(args))).run(idle_timeout=args.idle_timeout)
+    elif args.enqueue:
+        annot = ComponentAnnotator("java", **annotator_args(args))
+        if args.source == "wasteservice":
+            registry = ProjectRegistry(args.registry)
+            projects = preflight(annot, wasteservice_projects(registry, args.refresh_projects), registry)
+        else:
+            found = annot.project_extractor.iter_abandoned_projects(args.num_projects)
+            if annot.preflight_checker is not None:
+                found = annot.preflight_search_results(found)
+            projects = [(project['name'], project['html_url']) for project in found]
+        WorkQueue(args.database_url, args.queue_name, args.lease_seconds).enqueue(projects)
+    elif args.project:
+        project_name, project_url = args.project
+        annot = ComponentAnnotator("java", **annotator_args(args))
+        annot.annotate_project_list([(project_name, project_url, args.commit)])
+    elif args.serve:
+        serve(functools.partial(ComponentAnnotator, "java", **annotator_args(args)), args.workers, args.host, args.port,
+              args.max_queued)
+    elif args.source == "wasteservice":
+        registry = ProjectRegistry(args.registry)
+        projects = wasteservice_projects(registry, args.refresh_projects)
+        logger.info(f"Annotating {len(projects)} wasteservice projects")
+        process(projects, args.workers, registry, **annotator_args(args))
+    else:
+        ComponentAnnotator("java", **annotator_args(args)).annotate_projects(args.num_projects, args.workers)
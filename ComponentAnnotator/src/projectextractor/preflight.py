@@ -0,0 +1,234 @@
+import asyncio
+import json
+import os
+import re
+import sqlite3
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import httpx
+from loguru import logger
+
+from repositorycache.repositorycache import RepositoryCache
+
+GITHUB_API_URL = "https://api.github.com"
+
+# Reason codes of a pre-flight check. "ok" and "renamed" projects are eligible, "unreachable" projects (network
+# errors, rate limits, server errors) are kept as well and checked again next time.
+ELIGIBLE_REASONS = ("ok", "renamed", "unreachable")
+INELIGIBLE_REASONS = ("not_found", "language", "too_large", "empty")
+
+# Default time a check result is reused.
+DEFAULT_PREFLIGHT_TTL = 7 * 24 * 3600.0
+
+GITHUB_REPOSITORY = re.compile(r"https?://(www\.)?github\.com/(?P<owner>[^/]+)/(?P<repo>[^/]+?)(\.git)?/?$")
+
+# git ls-remote errors of repositories that do not exist (other errors count as unreachable).
+MISSING_REPOSITORY = re.compile(r"not found|does not exist|does not appear to be a git repository", re.IGNORECASE)
+
+
+class PreflightCache:
+    """
+    What a check observed per project URL (the repository metadata, or that the repository does not exist), with
+    its time, in a SQLite file. Observations older than `ttl` are ignored. The eligibility is decided from the
+    observation with the settings of the current check, so a changed language or size limit applies at once.
+    """
+    def __init__(self, path: str, ttl: float = DEFAULT_PREFLIGHT_TTL):
+        """
+        Initializes the PreflightCache instance.
+
+        Args:
+            path (str): The SQLite file (created if it does not exist).
+            ttl (float): Seconds a result is reused.
+        """
+        self.path = path
+        self.ttl = ttl
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with self._connect() as connection:
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS observations (
+                    url TEXT PRIMARY KEY,
+                    observation TEXT NOT NULL,
+                    checked_at REAL NOT NULL
+                )""")
+
+    def get(self, url: str) -> Optional[Dict]:
+        with self._connect() as connection:
+            row = connection.execute("SELECT observation FROM observations WHERE url = ? AND checked_at >= ?",
+                                     (url, time.time() - self.ttl)).fetchone()
+        return json.loads(row[0]) if row is not None else None
+
+    def put(self, observations: Dict[str, Dict]) -> None:
+        now = time.time()
+        with self._connect() as connection:
+            connection.executemany("INSERT OR REPLACE INTO observations (url, observation, checked_at) "
+                                   "VALUES (?, ?, ?)",
+                                   [(url, json.dumps(observation), now) for url, observation in observations.items()])
+
+    @contextmanager
+    def _connect(self):
+        connection = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+        try:
+            yield connection
+        finally:
+            connection.close()
+
+
+class PreflightChecker:
+    """
+    Checks a project list before the heavy stages, concurrently: GitHub projects through the repository API
+    (existence, redirects of renamed repositories, primary language and size), other remotes with
+    git ls-remote (existence only). Every project gets a reason code (see ELIGIBLE_REASONS and
+    INELIGIBLE_REASONS) instead of failing later in auto-fl or Arcan.
+    """
+    def __init__(self, language: str, max_size_kb: Optional[int] = None, api_url: str = GITHUB_API_URL,
+                 token: Optional[str] = None, cache: Optional[PreflightCache] = None, concurrency: int = 16,
+                 timeout: float = 30.0):
+        """
+        Initializes the PreflightChecker instance.
+
+        Args:
+            language (str): Required primary language (see ComponentAnnotator.language, compared case-insensitively).
+            max_size_kb (int, optional): Maximum repository size in KiB (GitHub `size`, default is no limit).
+            api_url (str): Base URL of the GitHub API.
+            token (str, optional): GitHub token (default is the GITHUB_TOKEN environment variable).
+            cache (PreflightCache, optional): Cache of earlier results (default is None, every project is checked).
+            concurrency (int): Maximum number of checks at the same time.
+            timeout (float): Seconds per request.
+        """
+        self.language = language
+        self.max_size_kb = max_size_kb
+        self.api_url = api_url.rstrip("/")
+        self.token = token if token is not None else os.environ.get("GITHUB_TOKEN")
+        self.cache = cache
+        self.concurrency = concurrency
+        self.timeout = timeout
+
+    def check(self, projects: Iterable[Tuple[str, str]]) -> List[Dict]:
+        """
+        Checks projects (cached observations are reused, the eligibility is decided with the current settings).
+
+        Args:
+            projects (Iterable[Tuple[str, str]]): (name, url) of the projects.
+
+        Returns:
+            List[Dict]: Per project (in input order): name, url, eligible, reason, resolved_url (the URL to use,
+            differs from url for renamed repositories), language and size (None if unknown).
+        """
+        projects = list(projects)
+        observations = [self.cache.get(url) if self.cache is not None else None for _, url in projects]
+        unchecked = [index for index, observation in enumerate(observations) if observation is None]
+        if unchecked:
+            checked = asyncio.run(self._check_all([projects[index] for index in unchecked]))
+            for index, observation in zip(unchecked, checked):
+                observations[index] = observation
+            if self.cache is not None:
+                self.cache.put({projects[index][1]: observation for index, observation in zip(unchecked, checked)
+                                if observation["reason"] != "unreachable"})
+        return [self._decide(name, url, observation) for (name, url), observation in zip(projects, observations)]
+
+    def filter(self, projects: Iterable[Tuple[str, str]]) -> Tuple[List[Tuple[str, str]], List[Dict]]:
+        """
+        Checks projects and separates the eligible ones.
+
+        Returns:
+            Tuple[List[Tuple[str, str]], List[Dict]]: (name, resolved url) of the eligible projects and the
+            results of the ineligible projects.
+        """
+        return self.split(self.check(projects))
+
+    @staticmethod
+    def split(results: List[Dict]) -> Tuple[List[Tuple[str, str]], List[Dict]]:
+        """
+        Separates the eligible projects of check results (see filter).
+        """
+        eligible = [(result["name"], result["resolved_url"]) for result in results if result["eligible"]]
+        ineligible = [result for result in results if not result["eligible"]]
+        for result in ineligible:
+            logger.info(f"Pre-flight excluded `{result['name']}` ({result['reason']}): {result['url']}")
+        logger.info(f"Pre-flight: {len(eligible)} of {len(results)} projects are eligible")
+        return eligible, ineligible
+
+    def evaluate(self, name: str, url: str, repository: Dict) -> Dict:
+        """
+        Checks the metadata of an existing GitHub repository (a repository API response or a search result item).
+
+        Returns:
+            Dict: The check result (see check).
+        """
+        result = self._result(name, url, "ok", resolved_url=repository.get("html_url") or url,
+                              language=repository.get("language"), size=repository.get("size"))
+        match = GITHUB_REPOSITORY.match(url)
+        if match is not None and repository.get("full_name") and \
+                repository["full_name"].lower() != f"{match.group('owner')}/{match.group('repo')}".lower():
+            result["reason"] = "renamed"
+        # Empty repositories have no language either.
+        if result["size"] == 0:
+            result.update(eligible=False, reason="empty")
+        elif (result["language"] or "").lower() != self.language.lower():
+            result.update(eligible=False, reason="language")
+        elif self.max_size_kb is not None and result["size"] is not None and result["size"] > self.max_size_kb:
+            result.update(eligible=False, reason="too_large")
+        return result
+
+    async def _check_all(self, projects: List[Tuple[str, str]]) -> List[Dict]:
+        semaphore = asyncio.Semaphore(self.concurrency)
+        headers = {"Accept": "application/vnd.github+json"}
+        if self.token:
+            headers["Authorization"] = f"Bearer {self.token}"
+        async with httpx.AsyncClient(headers=headers, timeout=self.timeout, follow_redirects=True) as client:
+            async def check_one(name: str, url: str) -> Dict:
+                async with semaphore:
+                    return await self._check_one(client, name, url)
+            return await asyncio.gather(*(check_one(name, url) for name, url in projects))
+
+    def _decide(self, name: str, url: str, observation: Dict) -> Dict:
+        """
+        Turns an observation of _check_one into a check result with the current settings.
+        """
+        if observation.get("repository") is not None:
+            return self.evaluate(name, url, observation["repository"])
+        return self._result(name, url, observation["reason"], eligible=observation["reason"] in ELIGIBLE_REASONS)
+
+    async def _check_one(self, client: httpx.AsyncClient, name: str, url: str) -> Dict:
+        """
+        Returns what the check observed, independent of the settings: {"reason": ..., "repository": ...} with the
+        repository metadata of existing GitHub repositories.
+        """
+        match = GITHUB_REPOSITORY.match(url)
+        if match is None:
+            return {"reason": await self._check_remote(name, url), "repository": None}
+        try:
+            response = await client.get(f"{self.api_url}/repos/{match.group('owner')}/{match.group('repo')}")
+        except httpx.HTTPError as exc:
+            logger.warning(f"Pre-flight check of `{name}` failed: {exc}")
+            return {"reason": "unreachable", "repository": None}
+        if response.status_code in (404, 410, 451):
+            return {"reason": "not_found", "repository": None}
+        if response.status_code != 200:
+            # Rate limits (403, 429) and server errors say nothing about the repository.
+            logger.warning(f"Pre-flight check of `{name}` got status {response.status_code}")
+            return {"reason": "unreachable", "repository": None}
+        repository = response.json()
+        return {"reason": "ok", "repository": {key: repository.get(key)
+                                               for key in ("full_name", "html_url", "language", "size")}}
+
+    async def _check_remote(self, name: str, url: str) -> str:
+        try:
+            await asyncio.to_thread(RepositoryCache.remote_head, url)
+        except RuntimeError as exc:
+            if str(exc).endswith("has no HEAD"):
+                return "empty"
+            if MISSING_REPOSITORY.search(str(exc)):
+                return "not_found"
+            logger.warning(f"Pre-flight check of `{name}` failed: {exc}")
+            return "unreachable"
+        return "ok"
+
+    @staticmethod
+    def _result(name: str, url: str, reason: str, eligible: bool = True, resolved_url: Optional[str] = None,
+                language: Optional[str] = None, size: Optional[int] = None) -> Dict:
+        return {"name": name, "url": url, "eligible": eligible, "reason": reason,
+                "resolved_url": resolved_url if resolved_url is not None else url, "language": language, "size": size}
@@ -1,7 +1,22 @@
-from typing import List, Dict, Tuple
+import hashlib
+import json
+import os
+import time
+from datetime import date, timedelta
+from typing import List, Dict, Tuple, Iterator, Optional
 import requests
 from loguru import logger
 
+GITHUB_SEARCH_URL = "https://api.github.com/search/repositories"
+
+# The search API returns at most this many results per query (and at most 100 per page).
+SEARCH_RESULT_CAP = 1000
+MAX_PER_PAGE = 100
+
+# Responses that are retried with backoff.
+RETRY_STATUS_CODES = {403, 429, 500, 502, 503, 504}
+
+
 def print_structure(repo_url: str):
     """
     Print the structure of a GitHub repository.
@@ -24,12 +39,72 @@ def print_structure(repo_url: str):
         response.raise_for_status()
 
 
+def _header(response, name: str) -> Optional[str]:
+    """
+    Returns a response header (None if it is missing).
+    """
+    value = response.headers.get(name) if response.headers is not None else None
+    return value if isinstance(value, str) else None
+
+
+class SearchWindow(object):
+    """
+    Part of the search space (pushed date range and star range) that is small enough to be listed completely.
+    """
+    def __init__(self, pushed_from: date, pushed_to: date, min_stars: int, max_stars: Optional[int] = None):
+        """
+        Args:
+            pushed_from (date): First pushed date (inclusive).
+            pushed_to (date): Last pushed date (inclusive).
+            min_stars (int): Minimum number of stars (inclusive).
+            max_stars (int, optional): Maximum number of stars (inclusive, None for no maximum).
+        """
+        self.pushed_from = pushed_from
+        self.pushed_to = pushed_to
+        self.min_stars = min_stars
+        self.max_stars = max_stars
+
+    def qualifiers(self) -> str:
+        stars = f"stars:>={self.min_stars}" if self.max_stars is None else f"stars:{self.min_stars}..{self.max_stars}"
+        return f"{stars} pushed:{self.pushed_from.isoformat()}..{self.pushed_to.isoformat()}"
+
+    def split(self) -> Optional[List["SearchWindow"]]:
+        """
+        Splits the window in two: by pushed date while it spans more than one day, then by stars.
+
+        Returns:
+            Optional[List[SearchWindow]]: The two halves, or None if the window cannot be split anymore.
+        """
+        if self.pushed_from < self.pushed_to:
+            middle = self.pushed_from + (self.pushed_to - self.pushed_from) // 2
+            return [SearchWindow(self.pushed_from, middle, self.min_stars, self.max_stars),
+                    SearchWindow(middle + timedelta(days=1), self.pushed_to, self.min_stars, self.max_stars)]
+        if self.max_stars is None:
+            # Stars are unbounded, split off the (most populated) lower range first.
+            bound = max(2 * self.min_stars, self.min_stars + 1)
+            return [SearchWindow(self.pushed_from, self.pushed_to, self.min_stars, bound - 1),
+                    SearchWindow(self.pushed_from, self.pushed_to, bound, None)]
+        if self.min_stars < self.max_stars:
+            middle = (self.min_stars + self.max_stars) // 2
+            return [SearchWindow(self.pushed_from, self.pushed_to, self.min_stars, middle),
+                    SearchWindow(self.pushed_from, self.pushed_to, middle + 1, self.max_stars)]
+        return None
+
+    def __repr__(self) -> str:
+        return f"SearchWindow({self.qualifiers()})"
+
+
 class ProjectExtractor(object):
     """
     Uses GitHub REST API to get GitHub repositories deemed abandoned.
+    Results are paged, queries with more results than the search API returns (SEARCH_RESULT_CAP) are split into
+    pushed date and star ranges, rate limits are respected, and responses are revalidated with their ETag if a
+    response cache directory is given.
     """
     def __init__(self, min_stars: int, last_pushed_date: str, language: str = "java",
-                 only_archived: bool = True):
+                 only_archived: bool = True, base_url: str = GITHUB_SEARCH_URL, cache_dir: Optional[str] = None,
+                 token: Optional[str] = None, first_pushed_date: str = "2008-01-01", max_retries: int = 5,
+                 backoff: float = 2.0, max_backoff: float = 300.0):
         """
         Initializes the ProjectExtractor instance.
 
@@ -38,12 +113,33 @@ class ProjectExtractor(object):
             last_pushed_date (str): The date until which repositories are considered for abandonment.
             language (str, optional): The programming language of the repositories (default is "java").
             exclude_archived (bool, optional): Flag to exclude archived repositories (default is False).
+            base_url (str, optional): URL of the repository search endpoint (e.g. a local stand-in in tests).
+            cache_dir (str, optional): Directory of the response cache used for conditional requests (default is
+                None, no cache).
+            token (str, optional): GitHub token for a higher rate limit (default is the GITHUB_TOKEN environment
+                variable).
+            first_pushed_date (str, optional): Earliest pushed date of the split search windows.
+            max_retries (int, optional): Number of retries of a rate limited or failed request.
+            backoff (float, optional): Base delay in seconds between retries without a rate limit reset time.
+            max_backoff (float, optional): Maximum delay in seconds between retries.
         """
-        self.base_url = "https://api.github.com/search/repositories"
+        self.base_url = base_url
         self.min_stars = min_stars
         self.last_pushed_date = last_pushed_date
         self.language = language
         self.only_archived = only_archived
+        self.cache_dir = cache_dir
+        self.token = token if token is not None else os.environ.get("GITHUB_TOKEN")
+        self.first_pushed_date = first_pushed_date
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.stats = {"requests": 0, "not_modified": 0, "rate_limited": 0}
+
+        # Time (epoch seconds) until which the rate limit is exhausted.
+        self._rate_limit_reset = 0.0
+        if self.cache_dir is not None:
+            os.makedirs(self.cache_dir, exist_ok=True)
 
     def find_abandoned_projects(self, amount: int = 10) -> List[Dict]:
         """
@@ -55,39 +151,181 @@ class ProjectExtractor(object):
         Returns:
             List[Dict]: A list of dictionaries representing abandoned projects.
         """
-        params, headers = self._create_request(amount)
+        return list(self.iter_abandoned_projects(amount))
 
-        response = requests.get(self.base_url, params=params, headers=headers)
+    def iter_abandoned_projects(self, amount: Optional[int] = None) -> Iterator[Dict]:
+        """
+        Yields abandoned projects as they are retrieved, so that they can be processed while the search continues.
+        The first query is the whole search; if it has more results than the search API returns (and more projects
+        are wanted than one query can return), it is split into pushed date (then star) ranges until every range
+        can be listed completely.
 
-        if response.status_code == 200:
-            return response.json().get("items", [])
-        else:
-            response.raise_for_status()
+        Args:
+            amount (int, optional): Maximum number of projects (default is None, all projects).
+
+        Yields:
+            Dict: Repository items of the search API.
+
+        Raises:
+            requests.HTTPError: If a request failed after all retries.
+        """
+        seen = set()
+        windows = [None]
+        while windows:
+            window = windows.pop(0)
+            # The page size must stay the same for all pages of a query.
+            per_page = MAX_PER_PAGE if amount is None else min(MAX_PER_PAGE, amount - len(seen))
+            page = 1
+            while True:
+                result = self._search(per_page, page, window)
+                total_count = result.get("total_count")
+                # The first SEARCH_RESULT_CAP results of a query are enough for a small amount.
+                wanted = amount is None or amount - len(seen) > SEARCH_RESULT_CAP
+                if page == 1 and wanted and isinstance(total_count, int) and total_count > SEARCH_RESULT_CAP:
+                    halves = (window or self._full_window()).split()
+                    if halves is not None:
+                        logger.info(f"{total_count} results for {window or 'the search'}, splitting the query")
+                        windows = halves + windows
+                        break
+                    logger.warning(f"Only the first {SEARCH_RESULT_CAP} of {total_count} results of {window} "
+                                   f"can be retrieved")
+
+                items = result.get("items", [])
+                for item in items:
+                    key = item.get("id", item.get("full_name", item.get("name")))
+                    if key in seen:
+                        continue
+                    seen.add(key)
+                    yield item
+                    if amount is not None and len(seen) >= amount:
+                        return
+
+                if len(items) < per_page or page * per_page >= min(total_count or 0, SEARCH_RESULT_CAP):
+                    break
+                page += 1
+
+    def _full_window(self) -> SearchWindow:
+        last_pushed = date.fromisoformat(self.last_pushed_date) - timedelta(days=1)
+        return SearchWindow(date.fromisoformat(self.first_pushed_date), last_pushed, self.min_stars)
 
-    def _create_request(self, amount: int) -> Tuple[Dict, Dict]:
+    def _search(self, per_page: int, page: int, window: Optional[SearchWindow]) -> Dict:
+        params, headers = self._create_request(per_page, page, window)
+        return self._get(params, headers)
+
+    def _get(self, params: Dict, headers: Dict) -> Dict:
+        """
+        Sends a search request. Waits while the rate limit is exhausted, retries rate limited and failed requests
+        and revalidates cached responses with their ETag.
+
+        Returns:
+            Dict: The response body.
+
+        Raises:
+            requests.HTTPError: If the request failed after all retries.
+        """
+        headers = dict(headers)
+        if self.token:
+            headers["Authorization"] = f"Bearer {self.token}"
+        cached = self._cached(params)
+        if cached is not None:
+            headers["If-None-Match"] = cached["etag"]
+
+        for attempt in range(self.max_retries + 1):
+            self._wait_for_rate_limit()
+            self.stats["requests"] += 1
+            response = requests.get(self.base_url, params=params, headers=headers)
+            self._update_rate_limit(response)
+
+            if response.status_code == 304 and cached is not None:
+                self.stats["not_modified"] += 1
+                return cached["body"]
+            if response.status_code == 200:
+                body = response.json()
+                self._store(params, _header(response, "ETag"), body)
+                return body
+            if response.status_code not in RETRY_STATUS_CODES or attempt == self.max_retries:
+                break
+
+            delay = self._retry_delay(response, attempt)
+            if delay is None:
+                break
+            self.stats["rate_limited"] += 1
+            logger.warning(f"GitHub search responded with {response.status_code}, retrying in {delay:.0f}s")
+            if delay > 0:
+                time.sleep(delay)
+
+        response.raise_for_status()
+        raise requests.HTTPError(f"GitHub search responded with {response.status_code}", response=response)
+
+    def _retry_delay(self, response, attempt: int) -> Optional[float]:
+        """
+        Seconds to wait before retrying a request (None if it should not be retried, e.g. a 403 that is not
+        caused by a rate limit).
+        """
+        retry_after = _header(response, "Retry-After")
+        if retry_after is not None and retry_after.isdigit():
+            return min(float(retry_after), self.max_backoff)
+        if _header(response, "X-RateLimit-Remaining") == "0":
+            # Waits in _wait_for_rate_limit until the rate limit resets.
+            return 0.0
+        if response.status_code == 403:
+            return None
+        return min(self.backoff * 2 ** attempt, self.max_backoff)
+
+    def _update_rate_limit(self, response) -> None:
+        remaining = _header(response, "X-RateLimit-Remaining")
+        reset = _header(response, "X-RateLimit-Reset")
+        if remaining == "0" and reset is not None and reset.isdigit():
+            self._rate_limit_reset = float(reset)
+
+    def _wait_for_rate_limit(self) -> None:
+        delay = self._rate_limit_reset - time.time()
+        if delay > 0:
+            logger.info(f"GitHub rate limit exhausted, waiting {delay:.0f}s until it resets")
+            time.sleep(delay + 1.0)
+        self._rate_limit_reset = 0.0
+
+    def _cache_path(self, params: Dict) -> str:
+        key = json.dumps({"url": self.base_url, "params": params}, sort_keys=True)
+        return os.path.join(self.cache_dir, hashlib.sha256(key.encode()).hexdigest()[:32] + ".json")
+
+    def _cached(self, params: Dict) -> Optional[Dict]:
+        if self.cache_dir is None or not os.path.exists(self._cache_path(params)):
+            return None
+        with open(self._cache_path(params)) as file:
+            return json.load(file)
+
+    def _store(self, params: Dict, etag: Optional[str], body: Dict) -> None:
+        if self.cache_dir is None or etag is None:
+            return
+        tmp_path = self._cache_path(params) + ".tmp"
+        with open(tmp_path, "w") as file:
+            json.dump({"etag": etag, "body": body}, file)
+        os.replace(tmp_path, self._cache_path(params))
+
+    def _create_request(self, amount: int, page: int = 1,
+                        window: Optional[SearchWindow] = None) -> Tuple[Dict, Dict]:
         """
         Create request parameters and headers for GitHub repository search.
 
         Args:
-            amount (int): The number of results to retrieve.
+            amount (int): The number of results per page (at most MAX_PER_PAGE).
+            page (int): The page (starting at 1).
+            window (SearchWindow, optional): Pushed date and star range of the query (default is None, the
+                whole search).
 
         Returns:
             Tuple[Dict, Dict]: A tuple containing request parameters and headers.
         """
-        query = f"language:{self.language} stars:>={self.min_stars} pushed:<{self.last_pushed_date}"
+        if window is None:
+            query = f"language:{self.language} stars:>={self.min_stars} pushed:<{self.last_pushed_date}"
+        else:
+            query = f"language:{self.language} {window.qualifiers()}"
         if self.only_archived:
             query += " archived:true"
 
-        # If above max results per page, adjust page num.
-        page_num = 1
-        if amount > 100:
-            page_num = int(amount / 100)
-
-        params = {"q": query, "per_page" : amount, "page" : page_num}
+        params = {"q": query, "per_page": min(amount, MAX_PER_PAGE), "page": page}
         headers = {"Accept": "application/vnd.github+json",
                    "X-GitHub-Api-Version" : "2022-11-28"}
 
         return params, headers
-
-
-
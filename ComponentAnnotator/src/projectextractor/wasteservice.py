@@ -0,0 +1,86 @@
+from typing import List, Tuple
+
+import requests
+from bs4 import BeautifulSoup
+from loguru import logger
+
+from projectregistry.projectregistry import ProjectRegistry
+
+WASTESERVICE_URL = "https://wasteservice.github.io/"
+WASTESERVICE_SOURCE = "wasteservice"
+
+
+def parse_wasteservice(html: str) -> List[Tuple[str, str]]:
+    """
+    Extracts the GitHub projects from the project table of the wasteservice page. The table is part of the page
+    (it is only paginated in the browser), so it can be read without rendering the page.
+
+    Args:
+        html (str): The wasteservice page.
+
+    Returns:
+        List[Tuple[str, str]]: (project name, project html url) pairs in table order.
+
+    Raises:
+        ValueError: If the page has no table with a "Project" column.
+    """
+    soup = BeautifulSoup(html, "html.parser")
+    for table in soup.find_all("table"):
+        header = [cell.get_text(strip=True) for cell in table.select("thead tr th")]
+        if "Project" not in header:
+            continue
+        project_column = header.index("Project")
+
+        projects = []
+        rows = table.select("tbody tr") or table.find_all("tr")[1:]
+        for row in rows:
+            cells = row.find_all("td")
+            if project_column >= len(cells):
+                continue
+            name = cells[project_column].get_text(strip=True)
+            link = cells[project_column].find("a", href=True)
+            if link is None:
+                # The project cell has no link, use the repository link elsewhere in the row (if there is one).
+                link = row.find("a", href=lambda href: href is not None and href.rstrip("/").endswith(f"/{name}"))
+            if link is None:
+                # Same as the original Selenium scraper: the second link of the row (the first one is the owner).
+                row_links = row.find_all("a", href=True)
+                link = row_links[1] if len(row_links) > 1 else None
+            if name and link is not None:
+                projects.append((name, link["href"]))
+        return projects
+
+    raise ValueError("The wasteservice page has no project table")
+
+
+def fetch_wasteservice(url: str = WASTESERVICE_URL, timeout: float = 30.0) -> List[Tuple[str, str]]:
+    """
+    Downloads the wasteservice page and extracts its projects (see parse_wasteservice).
+
+    Raises:
+        requests.HTTPError: If the page could not be downloaded.
+    """
+    response = requests.get(url, timeout=timeout)
+    response.raise_for_status()
+    return parse_wasteservice(response.text)
+
+
+def wasteservice_projects(registry: ProjectRegistry, refresh: bool = False,
+                          url: str = WASTESERVICE_URL) -> List[Tuple[str, str]]:
+    """
+    Returns the wasteservice projects (without excluded projects). The list is fetched and stored as a new version
+    in the registry if `refresh` is set or the registry has no list yet, otherwise the stored list is used.
+
+    Args:
+        registry (ProjectRegistry): The project registry.
+        refresh (bool): Fetch the list even if the registry has one.
+        url (str): URL of the wasteservice page.
+
+    Returns:
+        List[Tuple[str, str]]: (project name, project html url) pairs.
+    """
+    if refresh or registry.latest_fetch(WASTESERVICE_SOURCE) is None:
+        diff = registry.save(WASTESERVICE_SOURCE, fetch_wasteservice(url))
+        for name, _ in diff["removed"]:
+            logger.info(f"Project `{name}` is no longer listed on wasteservice")
+    return registry.projects(WASTESERVICE_SOURCE)
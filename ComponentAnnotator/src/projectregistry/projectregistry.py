@@ -0,0 +1,159 @@
+import json
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+from loguru import logger
+
+# Projects that are known to fail (e.g. deleted repositories) and are never annotated, name -> reason.
+EXCLUDED_PROJECTS_FILE = os.path.join(os.path.dirname(__file__), "excluded_projects.json")
+
+
+class ProjectRegistry:
+    """
+    Local registry of project lists (SQLite). Every fetch of a source (e.g. the wasteservice list) is stored as a
+    new version with its fetch time, so that a batch can be run on a known list and changes between fetches can
+    be inspected. Excluded projects are kept in the registry as well and are left out of every list.
+    """
+    def __init__(self, path: str, excluded_projects_file: Optional[str] = EXCLUDED_PROJECTS_FILE):
+        """
+        Initializes the ProjectRegistry instance.
+
+        Args:
+            path (str): Path of the SQLite database of the registry.
+            excluded_projects_file (str, optional): JSON file (name -> reason) with projects that are excluded
+                (default is EXCLUDED_PROJECTS_FILE, None for none).
+        """
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        with self._connect() as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS fetches (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    source TEXT NOT NULL,
+                    fetched_at REAL NOT NULL,
+                    num_projects INTEGER NOT NULL
+                )""")
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS projects (
+                    fetch_id INTEGER NOT NULL REFERENCES fetches (id),
+                    name TEXT NOT NULL,
+                    url TEXT NOT NULL,
+                    PRIMARY KEY (fetch_id, name)
+                )""")
+            connection.execute("CREATE INDEX IF NOT EXISTS projects_name ON projects (name)")
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS excluded (
+                    name TEXT PRIMARY KEY,
+                    reason TEXT,
+                    added_at REAL NOT NULL
+                )""")
+
+        if excluded_projects_file is not None:
+            with open(excluded_projects_file) as file:
+                for name, reason in json.load(file).items():
+                    self.exclude(name, reason, replace=False)
+
+    def save(self, source: str, projects: List[Tuple[str, str]]) -> Dict[str, List[Tuple[str, str]]]:
+        """
+        Stores a newly fetched project list of a source as its latest version.
+
+        Args:
+            source (str): Name of the source (e.g. "wasteservice").
+            projects (List[Tuple[str, str]]): (project name, project html url) pairs.
+
+        Returns:
+            Dict[str, List[Tuple[str, str]]]: Projects that were `added` to and `removed` from the source since the
+            previous fetch (all projects are added on the first fetch).
+        """
+        previous = dict(self.projects(source, include_excluded=True))
+        current = dict(projects)
+        with self._connect() as connection:
+            connection.execute("BEGIN")
+            cursor = connection.execute("INSERT INTO fetches (source, fetched_at, num_projects) VALUES (?, ?, ?)",
+                                        (source, time.time(), len(current)))
+            connection.executemany("INSERT INTO projects (fetch_id, name, url) VALUES (?, ?, ?)",
+                                   [(cursor.lastrowid, name, url) for name, url in sorted(current.items())])
+            connection.execute("COMMIT")
+
+        diff = {"added": sorted((name, url) for name, url in current.items() if name not in previous),
+                "removed": sorted((name, url) for name, url in previous.items() if name not in current)}
+        logger.info(f"Stored {len(current)} projects of {source}: {len(diff['added'])} added, "
+                    f"{len(diff['removed'])} removed since the previous fetch")
+        return diff
+
+    def projects(self, source: str, fetch_id: Optional[int] = None,
+                 include_excluded: bool = False) -> List[Tuple[str, str]]:
+        """
+        Returns a version of the project list of a source.
+
+        Args:
+            source (str): Name of the source.
+            fetch_id (int, optional): Version of the list (default is the latest fetch).
+            include_excluded (bool): Also return excluded projects.
+
+        Returns:
+            List[Tuple[str, str]]: (project name, project html url) pairs ordered by name (empty if the source was
+            never fetched).
+        """
+        if fetch_id is None:
+            fetch = self.latest_fetch(source)
+            if fetch is None:
+                return []
+            fetch_id = fetch["id"]
+
+        query = "SELECT name, url FROM projects WHERE fetch_id = ?"
+        if not include_excluded:
+            query += " AND name NOT IN (SELECT name FROM excluded)"
+        with self._connect() as connection:
+            return [tuple(row) for row in connection.execute(query + " ORDER BY name", (fetch_id,)).fetchall()]
+
+    def latest_fetch(self, source: str) -> Optional[Dict]:
+        """
+        Returns the latest fetch of a source (id, fetched_at and num_projects) or None.
+        """
+        fetches = self.fetches(source)
+        return fetches[-1] if fetches else None
+
+    def fetches(self, source: str) -> List[Dict]:
+        """
+        Returns all fetches of a source, oldest first.
+        """
+        with self._connect() as connection:
+            rows = connection.execute("SELECT id, fetched_at, num_projects FROM fetches WHERE source = ? ORDER BY id",
+                                      (source,)).fetchall()
+        return [{"id": fetch_id, "fetched_at": fetched_at, "num_projects": num_projects}
+                for fetch_id, fetched_at, num_projects in rows]
+
+    def exclude(self, name: str, reason: Optional[str] = None, replace: bool = True) -> None:
+        """
+        Excludes a project from all project lists.
+
+        Args:
+            name (str): Name of the project.
+            reason (str, optional): Why the project is excluded.
+            replace (bool): Replace the reason of an already excluded project.
+        """
+        with self._connect() as connection:
+            connection.execute(f"INSERT OR {'REPLACE' if replace else 'IGNORE'} INTO excluded (name, reason, added_at) "
+                               f"VALUES (?, ?, ?)", (name, reason, time.time()))
+
+    def excluded(self) -> Dict[str, Optional[str]]:
+        """
+        Returns the excluded projects (name -> reason).
+        """
+        with self._connect() as connection:
+            return dict(connection.execute("SELECT name, reason FROM excluded ORDER BY name").fetchall())
+
+    @contextmanager
+    def _connect(self):
+        connection = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+        try:
+            yield connection
+        finally:
+            connection.close()
@@ -0,0 +1,79 @@
+import json
+import os
+import shutil
+from typing import Dict, List
+
+import httpx
+
+from autoflclient.autoflclient import AutoFLClient
+from autoflclient.stubserver import create_app, load_recorded_responses
+
+
+class Fixtures:
+    """
+    Recorded inputs of the pipeline, so that batches can be replayed (and benchmarked) without GitHub,
+    auto-fl and Arcan. A fixtures directory contains:
+
+        projects.json               GitHub search results (the `items` of the response)
+        autofl/<project>.json       auto-fl response bodies (see AutoFLClient `record_dir`)
+        graphs/<project>.graphml    Arcan dependency graphs (the graph the pipeline selected)
+    """
+    def __init__(self, fixtures_dir: str):
+        """
+        Initializes the Fixtures instance.
+
+        Args:
+            fixtures_dir (str): The fixtures directory (created if it does not exist).
+        """
+        self.fixtures_dir = fixtures_dir
+        self.projects_file = os.path.join(fixtures_dir, "projects.json")
+        self.autofl_dir = os.path.join(fixtures_dir, "autofl")
+        self.graphs_dir = os.path.join(fixtures_dir, "graphs")
+        os.makedirs(self.autofl_dir, exist_ok=True)
+        os.makedirs(self.graphs_dir, exist_ok=True)
+
+    def record_projects(self, projects: List[Dict]) -> None:
+        """
+        Stores GitHub search results.
+        """
+        with open(self.projects_file, "w") as file:
+            json.dump(projects, file, indent=1)
+
+    def load_projects(self) -> List[Dict]:
+        """
+        Returns the recorded GitHub search results (dictionaries with at least `name` and `html_url`). Without
+        recorded search results, the projects with a recorded auto-fl response are returned.
+        """
+        if os.path.exists(self.projects_file):
+            with open(self.projects_file) as file:
+                return json.load(file)
+        return [{"name": name, "html_url": f"https://github.com/replay/{name}"}
+                for name in sorted(load_recorded_responses(self.autofl_dir))]
+
+    def record_graph(self, project_name: str, graph_file: str) -> None:
+        """
+        Stores the dependency graph Arcan produced for a project.
+        """
+        shutil.copyfile(graph_file, self.graph_file(project_name, must_exist=False))
+
+    def graph_file(self, project_name: str, must_exist: bool = True) -> str:
+        """
+        Returns the path of the recorded dependency graph of a project.
+
+        Raises:
+            ValueError: If `must_exist` and no graph of the project was recorded.
+        """
+        path = os.path.join(self.graphs_dir, f"{project_name}.graphml")
+        if must_exist and not os.path.exists(path):
+            raise ValueError(f"No recorded dependency graph for {project_name} in {self.graphs_dir}")
+        return path
+
+    def auto_fl_client(self, latency: float = 0.0) -> AutoFLClient:
+        """
+        Returns an auto-fl client that is answered in-process by the stub server with the recorded responses.
+
+        Args:
+            latency (float): Seconds the stub waits before every response (simulated labelling time).
+        """
+        app = create_app(load_recorded_responses(self.autofl_dir), delay=latency)
+        return AutoFLClient("http://auto-fl-replay", retries=0, transport=httpx.ASGITransport(app=app))
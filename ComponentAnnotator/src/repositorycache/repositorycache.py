@@ -0,0 +1,256 @@
+import fcntl
+import hashlib
+import json
+import os
+import re
+import shutil
+import subprocess
+import time
+from contextlib import contextmanager
+from typing import Optional, Dict, List
+
+from loguru import logger
+
+
+def directory_size(path: str) -> int:
+    """
+    Returns the size in bytes of all files in a directory tree.
+
+    Args:
+        path (str): The directory.
+    """
+    total = 0
+    for root, _, files in os.walk(path):
+        for filename in files:
+            file_path = os.path.join(root, filename)
+            if not os.path.islink(file_path):
+                total += os.path.getsize(file_path)
+    return total
+
+
+def run_git(*args: str, cwd: Optional[str] = None) -> str:
+    """
+    Runs a git command.
+
+    Args:
+        *args (str): Arguments for git.
+        cwd (str, optional): Working directory.
+
+    Returns:
+        str: Standard output of the command.
+
+    Raises:
+        RuntimeError: If git exits with a non-zero status.
+    """
+    result = subprocess.run(["git", *args], cwd=cwd, capture_output=True, text=True,
+                            env=dict(os.environ, GIT_TERMINAL_PROMPT="0"))
+    if result.returncode != 0:
+        raise RuntimeError(f"git {' '.join(args)} failed: {result.stderr.strip()}")
+    return result.stdout
+
+
+@contextmanager
+def file_lock(path: str):
+    """
+    Exclusive inter-process lock on a lock file.
+
+    Args:
+        path (str): Path of the lock file.
+    """
+    with open(path, "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+class RepositoryCache:
+    """
+    Local cache of bare git mirrors of the analysed repositories. A repository is downloaded from the remote
+    once and updated with incremental fetches afterwards; Arcan gets a cheap local clone (sharing the objects
+    of the mirror) instead of cloning the remote itself. Mirrors are evicted least recently used first when
+    the cache exceeds its disk budget.
+    """
+    def __init__(self, cache_dir: str, max_bytes: int = 50 * 2 ** 30, shallow: bool = False,
+                 blob_filter: Optional[str] = None):
+        """
+        Initializes the RepositoryCache instance.
+
+        Args:
+            cache_dir (str): Directory of the mirrors.
+            max_bytes (int, optional): Disk budget of the cache in bytes (default is 50 GiB).
+            shallow (bool, optional): Only fetch the newest commit (enough for the snapshot analysis mode).
+            blob_filter (str, optional): Partial clone filter (e.g. "blob:none"). Blobs are then fetched on
+                demand when a version is checked out.
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.shallow = shallow
+        self.blob_filter = blob_filter
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        os.makedirs(os.path.join(self.cache_dir, "mirrors"), exist_ok=True)
+        self._index_path = os.path.join(self.cache_dir, "index.json")
+        self._index_lock = os.path.join(self.cache_dir, "index.lock")
+
+    def mirror_path(self, url: str) -> str:
+        """
+        Returns the path of the mirror of a repository (keyed by the URL).
+
+        Args:
+            url (str): URL of the remote repository.
+        """
+        normalized = url.rstrip("/")
+        if normalized.endswith(".git"):
+            normalized = normalized[:-len(".git")]
+        name = re.sub(r"[^A-Za-z0-9_.-]", "_", normalized.rsplit("/", 1)[-1])
+        digest = hashlib.sha1(normalized.encode()).hexdigest()[:12]
+        return os.path.join(self.cache_dir, "mirrors", f"{name}-{digest}.git")
+
+    def update(self, url: str) -> str:
+        """
+        Makes sure the mirror of a repository exists and is up to date.
+
+        Args:
+            url (str): URL of the remote repository.
+
+        Returns:
+            str: Path of the mirror.
+        """
+        mirror = self.mirror_path(url)
+        with file_lock(mirror + ".lock"):
+            if os.path.exists(os.path.join(mirror, "HEAD")):
+                self.hits += 1
+                logger.info(f"Repository cache hit for {url}, fetching updates")
+                fetch_args = ["fetch", "--prune", "--quiet", "origin"]
+                if self.shallow:
+                    fetch_args.insert(1, "--depth=1")
+                run_git(*fetch_args, cwd=mirror)
+            else:
+                self.misses += 1
+                logger.info(f"Repository cache miss for {url}, cloning mirror")
+                clone_args = ["clone", "--mirror", "--quiet"]
+                if self.shallow:
+                    clone_args.append("--depth=1")
+                if self.blob_filter is not None:
+                    clone_args.append(f"--filter={self.blob_filter}")
+                shutil.rmtree(mirror, ignore_errors=True)
+                run_git(*clone_args, url, mirror)
+
+        self._touch(url, mirror)
+        self.evict(keep=mirror)
+        return mirror
+
+    def checkout(self, url: str, destination: str, commit: Optional[str] = None) -> str:
+        """
+        Creates a working copy of a repository from its (updated) mirror. A local clone hard-links the objects
+        of the mirror, so this is fast, uses little extra disk space and keeps working if the mirror is evicted.
+
+        Args:
+            url (str): URL of the remote repository.
+            destination (str): Directory of the working copy (replaced if it exists).
+            commit (str, optional): Commit to check out (default is the HEAD of the remote).
+
+        Returns:
+            str: Path of the working copy.
+        """
+        mirror = self.update(url)
+        shutil.rmtree(destination, ignore_errors=True)
+        os.makedirs(os.path.dirname(os.path.abspath(destination)), exist_ok=True)
+        with file_lock(mirror + ".lock"):
+            if commit is not None and self.shallow:
+                # A shallow mirror only has the newest commit, fetch the pinned one into a ref of its own.
+                run_git("fetch", "--depth=1", "--quiet", "origin", f"+{commit}:refs/pinned/{commit}", cwd=mirror)
+            run_git("clone", "--local", "--quiet", mirror, destination)
+            if commit is not None and self.shallow:
+                run_git("fetch", "--depth=1", "--quiet", "origin", f"refs/pinned/{commit}", cwd=destination)
+        if commit is not None:
+            run_git("checkout", "--quiet", commit, cwd=destination)
+        return destination
+
+    @staticmethod
+    def remote_head(url: str) -> str:
+        """
+        Returns the commit the HEAD of the remote points to, without downloading objects.
+
+        Args:
+            url (str): URL of the remote repository.
+        """
+        output = run_git("ls-remote", url, "HEAD")
+        if not output.strip():
+            raise RuntimeError(f"Remote {url} has no HEAD")
+        return output.split()[0]
+
+    def evict(self, keep: Optional[str] = None) -> List[str]:
+        """
+        Removes least recently used mirrors until the cache fits in its disk budget.
+
+        Args:
+            keep (str, optional): Mirror that must not be evicted (the one in use).
+
+        Returns:
+            List[str]: URLs of the evicted repositories.
+        """
+        evicted = []
+        with file_lock(self._index_lock):
+            index = self._read_index()
+            for entry in index.values():
+                if os.path.exists(entry["path"]):
+                    entry["size"] = directory_size(entry["path"])
+            total = sum(entry["size"] for entry in index.values())
+
+            for url, entry in sorted(index.items(), key=lambda item: item[1]["last_used"]):
+                if total <= self.max_bytes:
+                    break
+                if entry["path"] == keep:
+                    continue
+                with file_lock(entry["path"] + ".lock"):
+                    shutil.rmtree(entry["path"], ignore_errors=True)
+                total -= entry["size"]
+                del index[url]
+                evicted.append(url)
+
+            self._write_index(index)
+
+        for url in evicted:
+            logger.info(f"Evicted {url} from the repository cache")
+        self.evictions += len(evicted)
+        return evicted
+
+    def metrics(self) -> Dict:
+        """
+        Returns the cache metrics (hits, misses, hit rate, evictions, size on disk and number of mirrors).
+        """
+        with file_lock(self._index_lock):
+            index = self._read_index()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "bytes": sum(entry["size"] for entry in index.values()),
+            "repositories": len(index),
+        }
+
+    def _touch(self, url: str, mirror: str) -> None:
+        with file_lock(self._index_lock):
+            index = self._read_index()
+            index[url] = {"path": mirror, "last_used": time.time(), "size": directory_size(mirror)}
+            self._write_index(index)
+
+    def _read_index(self) -> Dict:
+        if not os.path.exists(self._index_path):
+            return {}
+        with open(self._index_path) as file:
+            return json.load(file)
+
+    def _write_index(self, index: Dict) -> None:
+        tmp_path = self._index_path + ".tmp"
+        with open(tmp_path, "w") as file:
+            json.dump(index, file)
+        os.replace(tmp_path, self._index_path)
@@ -0,0 +1,100 @@
+import os
+import uuid
+from typing import Iterable, Optional
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from loguru import logger
+
+from resultswriter.resultswriter import result_rows
+
+# Arrow types of the result columns. The distribution is stored as a native list<float32> column.
+ARROW_SCHEMA = pa.schema([
+    ("projectname", pa.string()),
+    ("path", pa.string()),
+    ("package", pa.string()),
+    ("distribution", pa.list_(pa.float32())),
+    ("unannotated", pa.bool_()),
+    ("label", pa.string()),
+    ("component", pa.int32()),
+    ("componentlabel", pa.string()),
+    ("mismatch", pa.bool_()),
+    ("case", pa.string()),
+])
+
+
+def arrow_table(project_name: str, df_project: pd.DataFrame) -> pa.Table:
+    """
+    Converts the component annotations of a project into an Arrow table with ARROW_SCHEMA.
+
+    Args:
+        project_name (str): Name of the project.
+        df_project (pd.DataFrame): Component annotations of the project (see ComponentAggregator).
+
+    Returns:
+        pa.Table: The component annotations.
+    """
+    rows = result_rows(project_name, df_project)
+    columns = list(zip(*rows)) if rows else [[] for _ in ARROW_SCHEMA]
+    return pa.Table.from_arrays([pa.array(list(values), type=field.type)
+                                 for values, field in zip(columns, ARROW_SCHEMA)], schema=ARROW_SCHEMA)
+
+
+class ParquetSink:
+    """
+    Writes the component annotations into a Parquet dataset partitioned by project
+    (`<root>/projectname=<project>/part-<id>.parquet`). Every project is written as soon as it is finished,
+    so no results are kept in memory, and writing a project again replaces its partition.
+    """
+    def __init__(self, root_dir: str, compression: str = "zstd"):
+        """
+        Initializes the ParquetSink instance.
+
+        Args:
+            root_dir (str): Root directory of the dataset.
+            compression (str): Parquet compression codec.
+        """
+        self.root_dir = root_dir
+        self.compression = compression
+        os.makedirs(self.root_dir, exist_ok=True)
+
+    def write(self, project_name: str, df_project: pd.DataFrame) -> None:
+        """
+        Writes (replaces) the component annotations of a project.
+
+        Args:
+            project_name (str): Name of the project.
+            df_project (pd.DataFrame): Component annotations of the project.
+        """
+        table = arrow_table(project_name, df_project)
+        pq.write_to_dataset(table, self.root_dir, partition_cols=["projectname"],
+                            basename_template=f"part-{uuid.uuid4().hex}-{{i}}.parquet",
+                            existing_data_behavior="delete_matching", compression=self.compression)
+        logger.info(f"Wrote {table.num_rows} component annotations of {project_name} to {self.root_dir}.")
+
+    def flush(self) -> None:
+        """
+        Projects are written synchronously, so there is nothing to flush.
+        """
+
+    def close(self) -> None:
+        self.flush()
+
+
+def read_results(root_dir: str, projects: Optional[Iterable[str]] = None) -> pd.DataFrame:
+    """
+    Reads (a subset of) the component annotations of a Parquet dataset written by ParquetSink.
+
+    Args:
+        root_dir (str): Root directory of the dataset.
+        projects (Iterable[str], optional): Only read these projects (default is None, all projects).
+
+    Returns:
+        pd.DataFrame: The component annotations, the distribution as arrays of float32.
+    """
+    partitioning = ds.partitioning(pa.schema([ARROW_SCHEMA.field("projectname")]), flavor="hive")
+    dataset = ds.dataset(root_dir, format="parquet", partitioning=partitioning, schema=ARROW_SCHEMA)
+    expression = ds.field("projectname").isin(list(projects)) if projects is not None else None
+    return dataset.to_table(filter=expression).to_pandas()
@@ -0,0 +1,284 @@
+import json
+import math
+import queue
+import threading
+import time
+from multiprocessing.util import Finalize
+from typing import Callable, List, Tuple, Optional
+
+import numpy as np
+import pandas as pd
+from loguru import logger
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool
+
+# Hardcoded see docker-compose yaml file.
+DEFAULT_DATABASE_URL = "postgresql+psycopg://pipeline_user:pipeline_pw@db_pipeline/pipeline"
+
+# Columns of the results table and their Postgres types.
+RESULT_COLUMNS = [
+    ("projectname", "TEXT NOT NULL"),
+    ("path", "TEXT"),
+    ("package", "TEXT"),
+    ("distribution", "DOUBLE PRECISION[]"),
+    ("unannotated", "BOOLEAN"),
+    ("label", "TEXT"),
+    ("component", "INTEGER"),
+    ("componentlabel", "TEXT"),
+    ("mismatch", "BOOLEAN"),
+    ("case", "TEXT"),
+]
+
+NUM_PARTITIONS = 8
+
+
+def _value(value):
+    """
+    Converts a dataframe cell into a value that can be written to the database.
+    """
+    if value is None:
+        return None
+    if isinstance(value, (list, tuple, np.ndarray)):
+        return [float(item) for item in value]
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    return value
+
+
+def result_rows(project_name: str, df_project: pd.DataFrame) -> List[Tuple]:
+    """
+    Converts the component annotations of a project into rows of the results table.
+
+    Args:
+        project_name (str): Name of the project.
+        df_project (pd.DataFrame): Component annotations of the project (see ComponentAggregator).
+
+    Returns:
+        List[Tuple]: One tuple per file, in the column order of RESULT_COLUMNS.
+    """
+    names = [name for name, _ in RESULT_COLUMNS[1:]]
+    columns = [df_project[name].tolist() if name in df_project.columns else [None] * len(df_project)
+               for name in names]
+    return [(project_name, *(_value(value) for value in row)) for row in zip(*columns)]
+
+
+class _WriterState:
+    """
+    Engine, queue and background thread of a ResultsWriter. They are kept apart from the writer so that neither
+    the thread nor the exit finalizer references it: a writer that is no longer used is garbage collected, which
+    writes its queued projects, stops its thread and releases its connection.
+    """
+    def __init__(self, url: str, table: str, batch_rows: int):
+        self.table = table
+        self.batch_rows = batch_rows
+        engine_args = {"pool_pre_ping": True}
+        # In-memory SQLite uses a SingletonThreadPool, which has no pool size.
+        database_url = make_url(url)
+        if issubclass(database_url.get_dialect().get_pool_class(database_url), QueuePool):
+            engine_args.update(pool_size=1, max_overflow=0)
+        self.engine = create_engine(url, **engine_args)
+
+        self.rows_written = 0
+        self.errors: List[Exception] = []
+        self.queue: "queue.Queue" = queue.Queue()
+        self.thread: Optional[threading.Thread] = None
+        self._table_created = False
+        self._lock = threading.Lock()
+        self._thread_lock = threading.Lock()
+
+    def start(self) -> None:
+        """
+        Starts the background thread unless it is running.
+        """
+        with self._thread_lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self.run, name="results-writer", daemon=True)
+                self.thread.start()
+
+    def close(self) -> None:
+        """
+        Writes the queued projects, stops the background thread and closes the pooled connections.
+        """
+        with self._thread_lock:
+            thread, self.thread = self.thread, None
+        if thread is not None and thread.is_alive():
+            self.queue.put(None)
+            # The last reference to the writer may be dropped (and the writer finalized) in its own thread.
+            if thread is not threading.current_thread():
+                thread.join()
+        self.engine.dispose()
+
+    def run(self) -> None:
+        while True:
+            # Everything that queued up while the previous batch was written forms the next batch.
+            batch = [self.queue.get()]
+            num_rows = len(batch[0][1]) if batch[0] is not None else 0
+            while batch[-1] is not None and num_rows < self.batch_rows and not self.queue.empty():
+                batch.append(self.queue.get())
+                num_rows += len(batch[-1][1]) if batch[-1] is not None else 0
+
+            stop = batch[-1] is None
+            projects = [item for item in batch if item is not None]
+            if projects:
+                try:
+                    self.write_batch(projects)
+                except Exception as exc:
+                    logger.error(f"Failed to write results of {[name for name, _, _ in projects]}: {exc}")
+                    self.errors.append(exc)
+            num_items = len(batch)
+            # Release the callbacks (and the objects they reference) before waiting for the next batch.
+            batch = projects = None
+            for _ in range(num_items):
+                self.queue.task_done()
+
+            if stop:
+                return
+
+    def write_batch(self, batch: List[Tuple[str, List[Tuple], Optional[Callable[[float], None]]]]) -> None:
+        """
+        Writes the rows of a batch of projects in one transaction (earlier rows of the projects are replaced) and
+        calls their on_written callbacks with the share of the transaction time of their project (by rows).
+        """
+        start = time.perf_counter()
+        with self._lock, self.engine.begin() as connection:
+            self._create_table(connection)
+            project_names = [project_name for project_name, _, _ in batch]
+            connection.execute(text(f"DELETE FROM {self.table} WHERE projectname = :name"),
+                               [{"name": name} for name in project_names])
+            if self.engine.dialect.name == "postgresql":
+                self._copy(connection, batch)
+            else:
+                self._insert(connection, batch)
+
+        elapsed = time.perf_counter() - start
+        num_rows = sum(len(rows) for _, rows, _ in batch)
+        self.rows_written += num_rows
+        logger.info(f"Wrote {num_rows} component annotations of {', '.join(project_names)} to database "
+                    f"in {elapsed:.2f}s.")
+        for project_name, rows, on_written in batch:
+            if on_written is None:
+                continue
+            try:
+                on_written(elapsed * len(rows) / max(num_rows, 1))
+            except Exception as exc:
+                logger.error(f"Callback after writing the results of {project_name} failed: {exc}")
+
+    def _copy(self, connection, batch: List[Tuple]) -> None:
+        names = ", ".join(f'"{name}"' for name, _ in RESULT_COLUMNS)
+        cursor = connection.connection.driver_connection.cursor()
+        with cursor.copy(f"COPY {self.table} ({names}) FROM STDIN") as copy:
+            for _, rows, _ in batch:
+                for row in rows:
+                    copy.write_row(row)
+
+    def _insert(self, connection, batch: List[Tuple]) -> None:
+        names = [name for name, _ in RESULT_COLUMNS]
+        quoted_names = ", ".join(f'"{name}"' for name in names)
+        statement = text(f"INSERT INTO {self.table} ({quoted_names}) "
+                         f"VALUES ({', '.join(':' + name for name in names)})")
+        # Databases without array types store the distribution as JSON.
+        parameters = [{name: json.dumps(value) if isinstance(value, list) else value
+                       for name, value in zip(names, row)}
+                      for _, rows, _ in batch for row in rows]
+        if parameters:
+            connection.execute(statement, parameters)
+
+    def _create_table(self, connection) -> None:
+        if self._table_created:
+            return
+        postgres = self.engine.dialect.name == "postgresql"
+        columns = ", ".join(f'"{name}" {column_type if postgres else column_type.replace("DOUBLE PRECISION[]", "TEXT")}'
+                            for name, column_type in RESULT_COLUMNS)
+        if postgres:
+            connection.execute(text(f"CREATE TABLE IF NOT EXISTS {self.table} ({columns}) PARTITION BY HASH (projectname)"))
+            for remainder in range(NUM_PARTITIONS):
+                connection.execute(text(
+                    f"CREATE TABLE IF NOT EXISTS {self.table}_p{remainder} PARTITION OF {self.table} "
+                    f"FOR VALUES WITH (MODULUS {NUM_PARTITIONS}, REMAINDER {remainder})"))
+        else:
+            connection.execute(text(f"CREATE TABLE IF NOT EXISTS {self.table} ({columns})"))
+        connection.execute(text(f"CREATE INDEX IF NOT EXISTS {self.table}_projectname_idx "
+                                f"ON {self.table} (projectname)"))
+        self._table_created = True
+
+
+class ResultsWriter:
+    """
+    Writes the component annotations of all projects into a single `component_annotations` table (hash
+    partitioned and indexed by project name). Rows are bulk loaded with COPY over one long-lived pooled
+    connection; with `asynchronous=True` a background thread flushes batches of projects so that writing
+    does not block the annotation of the next project.
+    """
+    def __init__(self, url: str = DEFAULT_DATABASE_URL, table: str = "component_annotations",
+                 asynchronous: bool = True, batch_rows: int = 50000):
+        """
+        Initializes the ResultsWriter instance.
+
+        Args:
+            url (str): SQLAlchemy database URL (Postgres; other databases fall back to INSERTs).
+            table (str): Name of the results table.
+            asynchronous (bool): Write from a background thread, started by the first write (default is True).
+            batch_rows (int): Maximum number of rows the background thread writes in one transaction.
+        """
+        self.url = url
+        self.table = table
+        self.asynchronous = asynchronous
+        self.batch_rows = batch_rows
+        self._state = _WriterState(url, table, batch_rows)
+        # Also flushes in worker processes, which exit without running atexit handlers. The finalizer only
+        # references the state, so it runs as well when the writer is garbage collected.
+        Finalize(self, _WriterState.close, args=(self._state,), exitpriority=10)
+
+    @property
+    def engine(self):
+        return self._state.engine
+
+    @property
+    def rows_written(self) -> int:
+        return self._state.rows_written
+
+    @property
+    def errors(self) -> List[Exception]:
+        return self._state.errors
+
+    def write(self, project_name: str, df_project: pd.DataFrame,
+              on_written: Optional[Callable[[float], None]] = None) -> None:
+        """
+        Writes (replaces) the component annotations of a project.
+
+        Args:
+            project_name (str): Name of the project.
+            df_project (pd.DataFrame): Component annotations of the project.
+            on_written (Callable, optional): Called with the seconds spent writing the rows of the project once
+                they are in the database (from the background thread if asynchronous), not called if writing
+                failed.
+        """
+        rows = result_rows(project_name, df_project)
+        if self.asynchronous:
+            self._state.start()
+            self._state.queue.put((project_name, rows, on_written))
+        else:
+            self._state.write_batch([(project_name, rows, on_written)])
+
+    def flush(self) -> None:
+        """
+        Blocks until all queued projects are written.
+
+        Raises:
+            RuntimeError: If writing a batch failed.
+        """
+        if self.asynchronous:
+            self._state.queue.join()
+        if self._state.errors:
+            errors, self._state.errors = self._state.errors, []
+            raise RuntimeError(f"Failed to write results: {errors}")
+
+    def close(self) -> None:
+        """
+        Flushes the queued projects, stops the background thread and closes the pooled connections.
+        """
+        self._state.close()
+        self.flush()
@@ -0,0 +1,159 @@
+import heapq
+import json
+import os
+import tempfile
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from loguru import logger
+
+from instrumentation.instrumentation import load_records
+
+# Estimated seconds of a project without size or history (rough prior, replaced by the measured median).
+DEFAULT_PROJECT_SECONDS = 900.0
+
+# Estimated seconds per MiB of repository (GitHub `size`) until enough history exists to fit the model.
+DEFAULT_SECONDS_PER_MB = 30.0
+
+# Minimum number of measured projects with a known size before the size model is fitted.
+MIN_FIT_PROJECTS = 5
+
+# Keys of a project that are kept when it is deferred to a later batch (the estimate is made again).
+DEFERRED_KEYS = ("name", "html_url", "size")
+
+
+class CostModel:
+    """
+    Estimates the wall time of annotating a project. A project that was annotated before is expected to take
+    as long as its last successful run. Other projects are estimated from their repository size (GitHub
+    `size` in KiB) with a linear model fitted to the `project` stage records of earlier batches, or from the
+    median measured time if their size is unknown.
+    """
+    def __init__(self, records: Iterable[Dict] = ()):
+        """
+        Initializes the CostModel instance.
+
+        Args:
+            records (Iterable[Dict]): Stage records of earlier batches (see Instrumentation).
+        """
+        self.measured: Dict[str, float] = {}
+        sizes, times = [], []
+        for record in records:
+            if record.get("stage") != "project" or record.get("status") != "ok" or record.get("reused"):
+                continue
+            self.measured[record["project"]] = record["wall_s"]
+            if record.get("size_kb") is not None:
+                sizes.append(record["size_kb"] / 1024)
+                times.append(record["wall_s"])
+
+        self.default_seconds = float(np.median(list(self.measured.values()))) if self.measured \
+            else DEFAULT_PROJECT_SECONDS
+        self.intercept, self.seconds_per_mb = 0.0, DEFAULT_SECONDS_PER_MB
+        if len(sizes) >= MIN_FIT_PROJECTS and len(set(sizes)) > 1:
+            self.seconds_per_mb, self.intercept = np.polyfit(sizes, times, 1)
+            # A negative slope or intercept (noise, few projects) would make large projects look cheap.
+            self.seconds_per_mb = max(float(self.seconds_per_mb), 0.0)
+            self.intercept = max(float(self.intercept), 0.0)
+
+    @classmethod
+    def from_metrics(cls, metrics_paths: Iterable[str]) -> "CostModel":
+        """
+        Builds the model from JSONL metrics files (see Instrumentation `metrics_path`). Missing files are skipped.
+        """
+        records = []
+        for path in metrics_paths:
+            if path is not None and os.path.exists(path):
+                records.extend(load_records(path))
+        return cls(records)
+
+    def estimate(self, project: Dict) -> float:
+        """
+        Estimates the wall time of a project in seconds.
+
+        Args:
+            project (Dict): The project (`name` and, if known, the GitHub `size` in KiB).
+        """
+        if project["name"] in self.measured:
+            return self.measured[project["name"]]
+        if project.get("size") is not None:
+            return self.intercept + self.seconds_per_mb * project["size"] / 1024
+        return self.default_seconds
+
+
+def plan_batch(projects: List[Dict], cost_model: CostModel, num_workers: int = 1,
+               time_budget: Optional[float] = None) -> Tuple[List[Dict], List[Dict], float]:
+    """
+    Orders a batch longest (estimated) project first, so that the giant projects start early and the batch
+    does not end with one worker busy on a giant project while the others are idle (LPT scheduling). The
+    projects are assigned to the worker that is free first; with a time budget, projects that would end
+    after the budget are deferred to a later batch, the smaller projects after them still fill the workers.
+
+    Args:
+        projects (List[Dict]): Projects with `name`, `html_url` and optionally `size` (GitHub search items).
+        cost_model (CostModel): Estimates the wall time of the projects.
+        num_workers (int): Number of workers of the batch.
+        time_budget (float, optional): Seconds the batch may take (default is None, no projects are deferred).
+
+    Returns:
+        Tuple[List[Dict], List[Dict], float]: The projects in processing order and the deferred projects (both
+        with their estimate `estimated_s` and the deferred ones with a `reason`), and the estimated duration of
+        the batch.
+    """
+    estimated = sorted((dict(project, estimated_s=cost_model.estimate(project)) for project in projects),
+                       key=lambda project: project["estimated_s"], reverse=True)
+    loads = [0.0] * max(1, num_workers)
+    ordered, deferred = [], []
+    for project in estimated:
+        load = heapq.heappop(loads)
+        if time_budget is not None and load + project["estimated_s"] > time_budget:
+            heapq.heappush(loads, load)
+            reason = "too_large" if project["estimated_s"] > time_budget else "budget"
+            deferred.append(dict(project, reason=reason))
+            continue
+        heapq.heappush(loads, load + project["estimated_s"])
+        ordered.append(project)
+    return ordered, deferred, max(loads)
+
+
+def load_deferred(path: str) -> List[Dict]:
+    """
+    Loads the projects deferred by an earlier batch (see save_deferred), an empty list if there are none.
+    """
+    if not os.path.exists(path):
+        return []
+    with open(path) as file:
+        return json.load(file)
+
+
+def save_deferred(path: str, deferred: List[Dict]) -> None:
+    """
+    Stores the deferred projects of a batch (name, html_url and size), so that a later batch schedules them again.
+    """
+    projects = [{key: project.get(key) for key in DEFERRED_KEYS} for project in deferred]
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as file:
+            json.dump(projects, file, indent=2)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def merge_deferred(projects: List[Dict], deferred: List[Dict]) -> List[Dict]:
+    """
+    Adds the deferred projects of an earlier batch to a batch; a project of the batch wins over its deferred entry.
+    """
+    names = {project["name"] for project in projects}
+    return list(projects) + [project for project in deferred if project["name"] not in names]
+
+
+def log_plan(ordered: List[Dict], deferred: List[Dict], makespan: float) -> None:
+    """
+    Logs the outcome of plan_batch.
+    """
+    logger.info(f"Scheduled {len(ordered)} projects, estimated batch time {makespan / 3600:.2f}h")
+    for project in deferred:
+        logger.warning(f"Deferred {project['name']} ({project['reason']}, estimated "
+                       f"{project['estimated_s'] / 3600:.2f}h)")
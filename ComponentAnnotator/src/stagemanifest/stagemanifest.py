@@ -0,0 +1,186 @@
+import json
+import os
+import re
+import shutil
+import sqlite3
+import time
+from contextlib import contextmanager
+from typing import Optional, Set, List
+
+import pandas as pd
+from cdlib import NodeClustering
+from loguru import logger
+
+# Stages of ComponentAnnotator.annotate_project in the order in which they complete.
+STAGES = ("labels", "graph", "communities", "aggregate")
+
+
+class StageManifest:
+    """
+    Persistent checkpoint manifest of a batch run. For every project it records which stages of the pipeline
+    completed (auto-fl labels, Arcan graph, communities, aggregate written) and where the output of each stage
+    is stored on disk, so that an interrupted batch can skip finished projects and resume unfinished ones
+    from their last completed stage.
+    """
+    def __init__(self, path: str, output_dir: Optional[str] = None):
+        """
+        Initializes the StageManifest instance.
+
+        Args:
+            path (str): Path of the SQLite database of the manifest.
+            output_dir (str, optional): Directory for the stage outputs (default is a `stages` directory
+                next to the database).
+        """
+        self.path = path
+        self.output_dir = output_dir if output_dir is not None else os.path.join(
+            os.path.dirname(os.path.abspath(path)), "stages")
+        os.makedirs(self.output_dir, exist_ok=True)
+
+        with self._connect() as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS stages (
+                    project TEXT NOT NULL,
+                    stage TEXT NOT NULL,
+                    output TEXT,
+                    completed_at REAL NOT NULL,
+                    PRIMARY KEY (project, stage)
+                )""")
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS commits (
+                    project TEXT PRIMARY KEY,
+                    commit_sha TEXT NOT NULL,
+                    annotated_at REAL NOT NULL
+                )""")
+
+    def completed_stages(self, project_name: str) -> Set[str]:
+        """
+        Returns the completed stages of a project.
+
+        Args:
+            project_name (str): Name of the project.
+        """
+        with self._connect() as connection:
+            rows = connection.execute("SELECT stage FROM stages WHERE project = ?", (project_name,)).fetchall()
+        return {stage for stage, in rows}
+
+    def completed_projects(self, stage: str = "aggregate") -> List[str]:
+        """
+        Returns the projects that completed a stage (by default: fully annotated projects).
+
+        Args:
+            stage (str): Name of the stage.
+        """
+        with self._connect() as connection:
+            rows = connection.execute("SELECT project FROM stages WHERE stage = ? ORDER BY completed_at",
+                                      (stage,)).fetchall()
+        return [project for project, in rows]
+
+    def output(self, project_name: str, stage: str) -> Optional[str]:
+        """
+        Returns the recorded output path of a completed stage (None if the stage did not complete).
+
+        Args:
+            project_name (str): Name of the project.
+            stage (str): Name of the stage.
+        """
+        with self._connect() as connection:
+            row = connection.execute("SELECT output FROM stages WHERE project = ? AND stage = ?",
+                                     (project_name, stage)).fetchone()
+        return row[0] if row is not None else None
+
+    def mark(self, project_name: str, stage: str, output: Optional[str] = None) -> None:
+        """
+        Records that a stage of a project completed.
+
+        Args:
+            project_name (str): Name of the project.
+            stage (str): Name of the stage (see STAGES).
+            output (str, optional): Path of the output of the stage.
+        """
+        if stage not in STAGES:
+            raise ValueError(f"Unknown stage {stage}, expected one of {STAGES}")
+        with self._connect() as connection:
+            connection.execute("INSERT OR REPLACE INTO stages (project, stage, output, completed_at) VALUES (?, ?, ?, ?)",
+                               (project_name, stage, output, time.time()))
+
+    def reset(self, project_name: str) -> None:
+        """
+        Forgets all stages of a project (and removes their outputs), so that it is processed from scratch.
+
+        Args:
+            project_name (str): Name of the project.
+        """
+        with self._connect() as connection:
+            connection.execute("DELETE FROM stages WHERE project = ?", (project_name,))
+        shutil.rmtree(self._project_dir(project_name), ignore_errors=True)
+        logger.info(f"Reset the stages of {project_name}")
+
+    def commit(self, project_name: str) -> Optional[str]:
+        """
+        Returns the commit (SHA) at which the stored annotations of a project were made (None if unknown).
+
+        Args:
+            project_name (str): Name of the project.
+        """
+        with self._connect() as connection:
+            row = connection.execute("SELECT commit_sha FROM commits WHERE project = ?", (project_name,)).fetchone()
+        return row[0] if row is not None else None
+
+    def save_commit(self, project_name: str, commit: str) -> None:
+        """
+        Records the commit (SHA) at which a project was annotated.
+
+        Args:
+            project_name (str): Name of the project.
+            commit (str): The commit SHA.
+        """
+        with self._connect() as connection:
+            connection.execute("INSERT OR REPLACE INTO commits (project, commit_sha, annotated_at) VALUES (?, ?, ?)",
+                               (project_name, commit, time.time()))
+
+    def save_labels(self, project_name: str, file_annot: pd.DataFrame) -> None:
+        path = os.path.join(self._project_dir(project_name), "labels.pkl")
+        file_annot.to_pickle(path)
+        self.mark(project_name, "labels", path)
+
+    def load_labels(self, project_name: str) -> pd.DataFrame:
+        return pd.read_pickle(self.output(project_name, "labels"))
+
+    def save_graph(self, project_name: str, graph_path: str) -> None:
+        # The graph stays where Arcan wrote it, only its location is recorded.
+        self.mark(project_name, "graph", graph_path)
+
+    def save_communities(self, project_name: str, components) -> None:
+        path = os.path.join(self._project_dir(project_name), "communities.json")
+        with open(path, "w") as file:
+            json.dump({"method": components.method_name, "parameters": components.method_parameters,
+                       "communities": components.communities}, file)
+        self.mark(project_name, "communities", path)
+
+    def load_communities(self, project_name: str) -> NodeClustering:
+        with open(self.output(project_name, "communities")) as file:
+            data = json.load(file)
+        return NodeClustering(data["communities"], None, data["method"], method_parameters=data["parameters"])
+
+    def save_aggregate(self, project_name: str, df_components: pd.DataFrame) -> None:
+        path = os.path.join(self._project_dir(project_name), "aggregate.pkl")
+        df_components.to_pickle(path)
+        self.mark(project_name, "aggregate", path)
+
+    def load_aggregate(self, project_name: str) -> pd.DataFrame:
+        return pd.read_pickle(self.output(project_name, "aggregate"))
+
+    def _project_dir(self, project_name: str) -> str:
+        directory = os.path.join(self.output_dir, re.sub(r"[^A-Za-z0-9_.-]", "_", project_name))
+        os.makedirs(directory, exist_ok=True)
+        return directory
+
+    @contextmanager
+    def _connect(self):
+        # Worker processes share the manifest, wait for their writes instead of failing.
+        connection = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+        try:
+            yield connection
+        finally:
+            connection.close()
@@ -0,0 +1,318 @@
+import os
+import socket
+import threading
+import time
+import traceback
+import uuid
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from loguru import logger
+from sqlalchemy import create_engine, text
+
+from resultswriter.resultswriter import DEFAULT_DATABASE_URL
+
+# Seconds a leased project belongs to a worker without a heartbeat.
+DEFAULT_LEASE_SECONDS = 600.0
+
+# Number of leases of a project before it is given up.
+DEFAULT_MAX_ATTEMPTS = 3
+
+# Statuses of a work item.
+STATUSES = ("pending", "leased", "done", "failed")
+
+
+def default_worker_id() -> str:
+    """
+    Worker id made of the host name, the process id and a random suffix (unique across machines and restarts).
+    """
+    return f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+
+class WorkQueue:
+    """
+    Durable queue of projects in the `work_items` table, shared by the workers of several machines. A worker
+    leases projects for `lease_seconds` and extends the lease with heartbeats while it works on them; the
+    project of a worker that died is leased again once its lease expired, until `max_attempts` leases were
+    used up. On Postgres the projects are claimed with `SELECT ... FOR UPDATE SKIP LOCKED`, so workers never
+    wait for each other and never get the same project. SQLite (for local runs and tests) serializes the
+    claims instead.
+    """
+    def __init__(self, url: str = DEFAULT_DATABASE_URL, queue_name: str = "default",
+                 lease_seconds: float = DEFAULT_LEASE_SECONDS, max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+                 table: str = "work_items"):
+        """
+        Initializes the WorkQueue instance.
+
+        Args:
+            url (str): SQLAlchemy database URL (Postgres or SQLite).
+            queue_name (str): Name of the queue, several queues can share the table.
+            lease_seconds (float): Seconds a lease lasts without a heartbeat.
+            max_attempts (int): Number of leases (and failures) of a project before it is marked failed.
+            table (str): Name of the queue table.
+        """
+        self.url = url
+        self.queue_name = queue_name
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.table = table
+        connect_args = {"timeout": 60} if url.startswith("sqlite") else {}
+        self.engine = create_engine(url, pool_pre_ping=True, connect_args=connect_args)
+        self.postgres = self.engine.dialect.name == "postgresql"
+        self._create_table()
+
+    def enqueue(self, projects: Iterable[Tuple[str, str]]) -> int:
+        """
+        Adds projects to the queue. Projects that are already in the queue (in any status) are kept as they are.
+
+        Args:
+            projects (Iterable[Tuple[str, str]]): (name, url) of the projects.
+
+        Returns:
+            int: Number of added projects.
+        """
+        now = time.time()
+        parameters = [{"queue": self.queue_name, "project": name, "url": url, "now": now}
+                      for name, url in dict(projects).items()]
+        if not parameters:
+            return 0
+        with self.engine.begin() as connection:
+            before = self._count(connection)
+            connection.execute(text(f"""
+                INSERT INTO {self.table} (queue, project, url, status, attempts, enqueued_at)
+                VALUES (:queue, :project, :url, 'pending', 0, :now)
+                ON CONFLICT (queue, project) DO NOTHING"""), parameters)
+            added = self._count(connection) - before
+        logger.info(f"Queued {added} of {len(parameters)} projects in {self.queue_name}")
+        return added
+
+    def lease(self, worker_id: str, limit: int = 1) -> List[Dict]:
+        """
+        Leases the oldest pending projects and the projects whose lease expired.
+
+        Args:
+            worker_id (str): Id of the leasing worker.
+            limit (int): Maximum number of projects.
+
+        Returns:
+            List[Dict]: The leased projects (project, url, attempts), empty if nothing is left to do.
+        """
+        now = time.time()
+        with self.engine.begin() as connection:
+            expired = connection.execute(text(f"""
+                UPDATE {self.table} SET status = 'failed', lease_owner = NULL,
+                    last_error = 'lease expired ' || attempts || ' times', finished_at = :now
+                WHERE queue = :queue AND status = 'leased' AND lease_expires < :now AND attempts >= :max_attempts
+                RETURNING project"""), {"queue": self.queue_name, "now": now, "max_attempts": self.max_attempts})
+            for (project_name,) in expired:
+                logger.warning(f"Giving up {project_name}, its lease expired {self.max_attempts} times")
+
+            lock = "FOR UPDATE SKIP LOCKED" if self.postgres else ""
+            rows = connection.execute(text(f"""
+                UPDATE {self.table} SET status = 'leased', lease_owner = :worker, lease_expires = :expires,
+                    attempts = attempts + 1
+                WHERE queue = :queue AND project IN (
+                    SELECT project FROM {self.table}
+                    WHERE queue = :queue AND (status = 'pending' OR (status = 'leased' AND lease_expires < :now))
+                    ORDER BY enqueued_at, project LIMIT :limit {lock})
+                RETURNING project, url, attempts"""),
+                {"queue": self.queue_name, "worker": worker_id, "now": now, "expires": now + self.lease_seconds,
+                 "limit": limit}).fetchall()
+        return [{"project": project, "url": url, "attempts": attempts} for project, url, attempts in rows]
+
+    def heartbeat(self, worker_id: str, project_name: str) -> bool:
+        """
+        Extends the lease of a project.
+
+        Returns:
+            bool: False if the worker lost the lease (it expired and another worker leased the project).
+        """
+        return self._update_leased(worker_id, project_name, "lease_expires = :expires",
+                                   {"expires": time.time() + self.lease_seconds})
+
+    def complete(self, worker_id: str, project_name: str) -> bool:
+        """
+        Marks a leased project as done.
+
+        Returns:
+            bool: False if the worker no longer held the lease.
+        """
+        return self._update_leased(worker_id, project_name,
+                                   "status = 'done', lease_owner = NULL, last_error = NULL, finished_at = :now",
+                                   {"now": time.time()})
+
+    def fail(self, worker_id: str, project_name: str, error: str) -> bool:
+        """
+        Returns a leased project to the queue after a failure, or marks it failed once it used up its attempts.
+
+        Returns:
+            bool: False if the worker no longer held the lease.
+        """
+        return self._update_leased(worker_id, project_name, """
+            status = CASE WHEN attempts >= :max_attempts THEN 'failed' ELSE 'pending' END,
+            finished_at = CASE WHEN attempts >= :max_attempts THEN CAST(:now AS DOUBLE PRECISION) ELSE NULL END,
+            lease_owner = NULL, last_error = :error""",
+                                   {"max_attempts": self.max_attempts, "now": time.time(), "error": error})
+
+    def release(self, worker_id: str) -> int:
+        """
+        Returns all projects leased by a worker to the queue without counting the attempt (e.g. on shutdown).
+
+        Returns:
+            int: Number of released projects.
+        """
+        with self.engine.begin() as connection:
+            released = connection.execute(text(f"""
+                UPDATE {self.table} SET status = 'pending', lease_owner = NULL, attempts = attempts - 1
+                WHERE queue = :queue AND status = 'leased' AND lease_owner = :worker
+                RETURNING project"""), {"queue": self.queue_name, "worker": worker_id}).fetchall()
+        return len(released)
+
+    def counts(self) -> Dict[str, int]:
+        """
+        Returns the number of projects per status.
+        """
+        with self.engine.connect() as connection:
+            rows = connection.execute(text(f"SELECT status, COUNT(*) FROM {self.table} WHERE queue = :queue "
+                                           f"GROUP BY status"), {"queue": self.queue_name}).fetchall()
+        counts = {status: 0 for status in STATUSES}
+        counts.update({status: count for status, count in rows})
+        return counts
+
+    def items(self, status: Optional[str] = None) -> List[Dict]:
+        """
+        Returns the projects of the queue (optionally only those with the given status), oldest first.
+        """
+        condition = "AND status = :status" if status is not None else ""
+        with self.engine.connect() as connection:
+            rows = connection.execute(text(f"""
+                SELECT project, url, status, attempts, lease_owner, last_error FROM {self.table}
+                WHERE queue = :queue {condition} ORDER BY enqueued_at, project"""),
+                {"queue": self.queue_name, "status": status}).fetchall()
+        return [dict(row._mapping) for row in rows]
+
+    def _update_leased(self, worker_id: str, project_name: str, assignments: str, parameters: Dict) -> bool:
+        with self.engine.begin() as connection:
+            result = connection.execute(text(f"""
+                UPDATE {self.table} SET {assignments}
+                WHERE queue = :queue AND project = :project AND status = 'leased' AND lease_owner = :worker"""),
+                {"queue": self.queue_name, "project": project_name, "worker": worker_id, **parameters})
+        return result.rowcount == 1
+
+    def _count(self, connection) -> int:
+        return connection.execute(text(f"SELECT COUNT(*) FROM {self.table} WHERE queue = :queue"),
+                                  {"queue": self.queue_name}).scalar()
+
+    def _create_table(self) -> None:
+        with self.engine.begin() as connection:
+            connection.execute(text(f"""
+                CREATE TABLE IF NOT EXISTS {self.table} (
+                    queue TEXT NOT NULL,
+                    project TEXT NOT NULL,
+                    url TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    attempts INTEGER NOT NULL,
+                    lease_owner TEXT,
+                    lease_expires DOUBLE PRECISION,
+                    last_error TEXT,
+                    enqueued_at DOUBLE PRECISION NOT NULL,
+                    finished_at DOUBLE PRECISION,
+                    PRIMARY KEY (queue, project)
+                )"""))
+            connection.execute(text(f"CREATE INDEX IF NOT EXISTS {self.table}_status_idx "
+                                    f"ON {self.table} (queue, status, enqueued_at)"))
+
+
+class QueueWorker:
+    """
+    Annotates the projects of a WorkQueue with a ComponentAnnotator until the queue is empty. While a project
+    is annotated a background thread sends heartbeats, so long Arcan runs keep their lease while the
+    project of a crashed worker goes back to the queue.
+    """
+    def __init__(self, work_queue: WorkQueue, annotator, worker_id: Optional[str] = None,
+                 heartbeat_interval: Optional[float] = None):
+        """
+        Initializes the QueueWorker instance.
+
+        Args:
+            work_queue (WorkQueue): The shared queue.
+            annotator (ComponentAnnotator): Annotates the leased projects.
+            worker_id (str, optional): Id of the worker (default is default_worker_id).
+            heartbeat_interval (float, optional): Seconds between heartbeats (default is a third of the lease).
+        """
+        self.work_queue = work_queue
+        self.annotator = annotator
+        self.worker_id = worker_id if worker_id is not None else default_worker_id()
+        self.heartbeat_interval = (heartbeat_interval if heartbeat_interval is not None
+                                   else work_queue.lease_seconds / 3)
+        self.stats = {"done": 0, "failed": 0, "lost": 0}
+
+    def run(self, max_projects: Optional[int] = None, idle_timeout: float = 0.0, poll_interval: float = 10.0) -> Dict:
+        """
+        Leases and annotates projects one by one.
+
+        Args:
+            max_projects (int, optional): Stop after this many projects (default is no limit).
+            idle_timeout (float): Seconds to wait for new projects once the queue is empty (other workers may
+                still return projects to it) before stopping.
+            poll_interval (float): Seconds between two checks of an empty queue.
+
+        Returns:
+            Dict: Number of projects that were done, failed and whose lease was lost.
+        """
+        logger.info(f"Worker {self.worker_id} started on queue {self.work_queue.queue_name}")
+        idle_since = None
+        try:
+            while max_projects is None or sum(self.stats.values()) < max_projects:
+                items = self.work_queue.lease(self.worker_id)
+                if not items:
+                    idle_since = idle_since if idle_since is not None else time.monotonic()
+                    if time.monotonic() - idle_since >= idle_timeout:
+                        break
+                    time.sleep(poll_interval)
+                    continue
+                idle_since = None
+                self._process(items[0])
+        finally:
+            self.work_queue.release(self.worker_id)
+        logger.info(f"Worker {self.worker_id} finished: {self.stats}")
+        return self.stats
+
+    def _process(self, item: Dict) -> None:
+        project_name = item["project"]
+        stop_heartbeat = threading.Event()
+        heartbeat = threading.Thread(target=self._heartbeat, args=(project_name, stop_heartbeat),
+                                     name=f"heartbeat-{project_name}", daemon=True)
+        heartbeat.start()
+        try:
+            self.annotator.annotate_project(project_name, item["url"])
+            # Only completed once the results are in the database (a failed write is retried like a failed run).
+            self.annotator.component_aggregator.results_writer.flush()
+            error = None
+        except Exception as exc:
+            logger.error(f"Project {project_name} failed (attempt {item['attempts']}):\n{traceback.format_exc()}")
+            error = f"{type(exc).__name__}: {exc}"
+        finally:
+            stop_heartbeat.set()
+            heartbeat.join()
+
+        if error is None:
+            held = self.work_queue.complete(self.worker_id, project_name)
+        else:
+            held = self.work_queue.fail(self.worker_id, project_name, error)
+        if not held:
+            # The results are still written (writes replace earlier rows of the project), the other worker's run
+            # decides the status.
+            logger.warning(f"Worker {self.worker_id} lost the lease of {project_name}")
+            self.stats["lost"] += 1
+        else:
+            self.stats["done" if error is None else "failed"] += 1
+
+    def _heartbeat(self, project_name: str, stop: threading.Event) -> None:
+        while not stop.wait(self.heartbeat_interval):
+            try:
+                if not self.work_queue.heartbeat(self.worker_id, project_name):
+                    logger.warning(f"Heartbeat of {project_name} found the lease taken by another worker")
+                    return
+            except Exception as exc:
+                # A database hiccup must not stop the annotation, the next heartbeat may succeed.
+                logger.warning(f"Heartbeat of {project_name} failed: {exc}")
@@ -0,0 +1,134 @@
+import asyncio
+import functools
+import json
+import multiprocessing
+import os
+import tempfile
+import time
+import unittest
+
+import httpx
+
+from annotationservice.annotationservice import JobManager, ServiceBusy, create_app
+from testutils import FakeAnnotator, created_annotators, overlapping_projects
+
+
+class TestAnnotationService(unittest.TestCase):
+
+    def setUp(self):
+        self.state_dir = tempfile.TemporaryDirectory()
+        # The annotators run in worker processes.
+        self.release = multiprocessing.Event()
+        self.manager = JobManager(functools.partial(FakeAnnotator, self.release, state_dir=self.state_dir.name),
+                                  num_workers=2, max_queued=4)
+        self.app = create_app(self.manager)
+        # ASGITransport does not run the lifespan of the app.
+        self.manager.start()
+
+    def tearDown(self):
+        self.release.set()
+        self.manager.stop()
+        self.state_dir.cleanup()
+
+    def request(self, method, url, **kwargs) -> httpx.Response:
+        async def send():
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=self.app), base_url="http://service") \
+                    as client:
+                return await client.request(method, url, **kwargs)
+        return asyncio.run(send())
+
+    def get(self, url) -> httpx.Response:
+        return self.request("GET", url)
+
+    def submit(self, *names) -> httpx.Response:
+        return self.request("POST", "/jobs", json={"projects": [{"name": name, "url": f"https://github.com/u/{name}"}
+                                                                for name in names]})
+
+    def test_job_results_and_stage_status(self):
+        response = self.submit("p1", "broken", "p2", "p1")
+        self.assertEqual(response.status_code, 202)
+        job_id = response.json()["job_id"]
+
+        lines = [json.loads(line) for line in self.get(f"/jobs/{job_id}/results").text.splitlines() if line]
+
+        self.assertEqual(sorted(line["project"] for line in lines), ["broken", "p1", "p2"])
+        results = {line["project"]: line for line in lines}
+        # Only the number of rows is kept, the rows are in the results database.
+        self.assertEqual(results["p1"]["rows"], 1)
+        self.assertEqual(results["broken"]["status"], "failed")
+
+        job = self.get(f"/jobs/{job_id}").json()
+        self.assertEqual(job["status"], "finished")
+        self.assertEqual(job["counts"], {"succeeded": 2, "failed": 1})
+        self.assertEqual(job["projects"]["broken"]["stages"]["aggregate"]["status"], "failed")
+        self.assertEqual(job["projects"]["p2"]["stages"]["labels"]["status"], "ok")
+        self.assertEqual(job["projects"]["p2"]["rows"], 1)
+
+        # The worker processes keep their annotators between jobs.
+        self.submit("p3")
+        self.get(f"/jobs/{self.submit('p4').json()['job_id']}/results")
+        self.assertEqual(created_annotators(self.state_dir.name), 2)
+        self.assertNotIn(os.getpid(), [int(name.split("-")[1]) for name in os.listdir(self.state_dir.name)
+                                        if name.startswith("created-")])
+
+    def test_bounded_queue_and_cancel(self):
+        job_id = self.submit("blocked-1", "blocked-2", "q1", "q2").json()["job_id"]
+        for _ in range(100):
+            if self.get(f"/jobs/{job_id}").json()["counts"].get("running") == 2:
+                break
+            time.sleep(0.05)
+
+        # q1 and q2 wait for a worker, three more projects exceed the limit of four.
+        self.assertEqual(self.submit("q3", "q4", "q5").status_code, 503)
+        with self.assertRaises(ServiceBusy):
+            self.manager.submit([("q3", "u3"), ("q4", "u4"), ("q5", "u5")])
+
+        job = self.request("DELETE", f"/jobs/{job_id}").json()
+        self.release.set()
+        lines = [json.loads(line) for line in self.get(f"/jobs/{job_id}/results").text.splitlines() if line]
+
+        self.assertEqual(job["counts"], {"running": 2, "cancelled": 2})
+        self.assertEqual({line["project"]: line["status"] for line in lines},
+                         {"blocked-1": "succeeded", "blocked-2": "succeeded", "q1": "cancelled", "q2": "cancelled"})
+        self.assertEqual(self.get("/health").json()["queued"], 0)
+
+    def test_write_errors_fail_the_project(self):
+        job_id = self.submit("unwritten", "p1").json()["job_id"]
+        lines = [json.loads(line) for line in self.get(f"/jobs/{job_id}/results").text.splitlines() if line]
+
+        results = {line["project"]: line for line in lines}
+        self.assertEqual(results["unwritten"]["status"], "failed")
+        self.assertIn("Failed to write results", results["unwritten"]["error"])
+        self.assertEqual(results["p1"]["status"], "succeeded")
+
+    def test_project_of_several_jobs_runs_once_at_a_time(self):
+        first = self.submit("blocked-1").json()["job_id"]
+        second = self.submit("blocked-1").json()["job_id"]
+        time.sleep(0.3)
+
+        # The second worker is free, but the project is already running.
+        self.assertEqual(self.get(f"/jobs/{second}").json()["status"], "queued")
+        self.release.set()
+        for job_id in (first, second):
+            lines = [json.loads(line) for line in self.get(f"/jobs/{job_id}/results").text.splitlines() if line]
+            self.assertEqual([line["status"] for line in lines], ["succeeded"])
+        self.assertEqual(overlapping_projects(self.state_dir.name), [])
+        self.assertEqual(self.get("/health").json()["queued"], 0)
+
+    def test_dead_worker_fails_only_its_project(self):
+        job_id = self.submit("crash").json()["job_id"]
+        lines = [json.loads(line) for line in self.get(f"/jobs/{job_id}/results").text.splitlines() if line]
+        self.assertEqual([(line["project"], line["status"]) for line in lines], [("crash", "failed")])
+
+        # The worker processes are restarted for the following projects.
+        job_id = self.submit("p1", "p2").json()["job_id"]
+        lines = [json.loads(line) for line in self.get(f"/jobs/{job_id}/results").text.splitlines() if line]
+        self.assertEqual(sorted(line["status"] for line in lines), ["succeeded", "succeeded"])
+
+    def test_unknown_job_and_empty_job(self):
+        self.assertEqual(self.get("/jobs/unknown").status_code, 404)
+        self.assertEqual(self.submit().status_code, 422)
+
+
+if __name__ == '__main__':
+    unittest.main()
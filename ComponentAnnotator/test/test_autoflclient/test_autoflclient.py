@@ -0,0 +1,95 @@
+import asyncio
+import json
+import os
+import tempfile
+import unittest
+
+import httpx
+
+from autoflclient.autoflclient import AutoFLClient, AutoFLError
+from autoflclient.stubserver import create_app, load_recorded_responses
+
+
+def recorded_result(num_files=2):
+    files = {f"F{index}.java": {"path": f"F{index}.java", "package": "p",
+                                "annotation": {"distribution": [0.1, 0.9], "unannotated": False}}
+             for index in range(num_files)}
+    return {"taxonomy": {"0": "L0", "1": "L1"}, "versions": [{"files": files}]}
+
+
+def stub_client(app, **kwargs):
+    kwargs.setdefault("backoff", 0.0)
+    return AutoFLClient("http://auto-fl", transport=httpx.ASGITransport(app=app), **kwargs)
+
+
+class TestAutoFLClient(unittest.TestCase):
+    def setUp(self):
+        self.responses = {f"p{index}": recorded_result() for index in range(6)}
+
+    def test_label_files(self):
+        async def run():
+            async with stub_client(create_app(self.responses)) as client:
+                return await client.label_files("p1", "https://github.com/o/p1", ["java"])
+
+        self.assertEqual(asyncio.run(run()), recorded_result())
+
+    def test_bounded_concurrency(self):
+        app = create_app(self.responses, delay=0.05)
+
+        async def run():
+            async with stub_client(app, max_concurrency=2) as client:
+                return await client.label_many([(name, "") for name in self.responses], ["java"])
+
+        results = asyncio.run(run())
+        self.assertEqual(results, list(self.responses.values()))
+        self.assertEqual(app.state.stats["max_in_flight"], 2)
+
+    def test_retries_overloaded_server(self):
+        app = create_app(self.responses, failure_rate=0.5, seed=1)
+
+        async def run():
+            async with stub_client(app, retries=10) as client:
+                return await client.label_many([(name, "") for name in self.responses], ["java"])
+
+        results = asyncio.run(run())
+        self.assertEqual(results, list(self.responses.values()))
+        self.assertGreater(app.state.stats["failed"], 0)
+
+    def test_unknown_project_is_not_retried(self):
+        app = create_app(self.responses)
+
+        async def run():
+            async with stub_client(app) as client:
+                await client.label_files("unknown", "", ["java"])
+
+        with self.assertRaises(AutoFLError):
+            asyncio.run(run())
+        self.assertEqual(app.state.stats["requests"], 1)
+
+    def test_timeout(self):
+        app = create_app(self.responses, delay=1.0)
+
+        async def run():
+            async with stub_client(app, timeout=0.05, retries=1) as client:
+                await client.label_files("p1", "", ["java"])
+
+        with self.assertRaises(AutoFLError):
+            asyncio.run(run())
+
+    def test_blocking_record_and_replay(self):
+        with tempfile.TemporaryDirectory() as record_dir:
+            client = stub_client(create_app(self.responses), record_dir=record_dir)
+            try:
+                self.assertEqual(client.label_files_blocking("p1", "", ["java"]), recorded_result())
+                self.assertEqual(client.label_files_blocking("p2", "", ["java"]), recorded_result())
+            finally:
+                client.close()
+
+            self.assertEqual(sorted(os.listdir(record_dir)), ["p1.json", "p2.json"])
+            with open(os.path.join(record_dir, "p1.json")) as file:
+                self.assertEqual(json.load(file), {"result": recorded_result()})
+            self.assertEqual(load_recorded_responses(record_dir), {"p1": recorded_result(), "p2": recorded_result()})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+import io
+import json
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from autoflclient.responseparser import parse_label_response, parse_label_stream
+from componentannotator.componentannotator import get_label
+
+
+def random_result(num_files=50, num_labels=7, seed=0):
+    rng = np.random.default_rng(seed)
+    distributions = rng.dirichlet(np.ones(num_labels), size=num_files)
+    files = {f"src/p{index % 3}/F{index}.java": {
+        "path": f"src/p{index % 3}/F{index}.java",
+        "package": f"p{index % 3}",
+        "annotation": {"distribution": distributions[index].tolist(), "unannotated": bool(index % 5 == 0)},
+    } for index in range(num_files)}
+    taxonomy = {str(index): f"L{index}" for index in range(num_labels)}
+    return {"taxonomy": taxonomy, "versions": [{"files": files}, {"files": {}}]}
+
+
+def legacy_parse(result):
+    """
+    File annotations as built by the original per-file loop of ComponentAnnotator._annotate_file.
+    """
+    files = result['versions'][0]['files']
+    return pd.DataFrame([{
+        "path": file["path"],
+        "package": file["package"],
+        "distribution": file["annotation"]["distribution"],
+        "unannotated": file["annotation"]["unannotated"],
+        "label": get_label(file["annotation"]["distribution"], result['taxonomy'])
+    } for file in files.values()])
+
+
+def response_body(result):
+    return io.BytesIO(json.dumps({"result": result}).encode())
+
+
+class TestResponseParser(unittest.TestCase):
+    def assert_matches_legacy(self, df, result):
+        expected = legacy_parse(result)
+        self.assertEqual(list(df.columns), list(expected.columns))
+        self.assertEqual(df["path"].tolist(), expected["path"].tolist())
+        self.assertEqual(df["package"].tolist(), expected["package"].tolist())
+        self.assertEqual(df["unannotated"].tolist(), expected["unannotated"].tolist())
+        self.assertEqual(df["label"].tolist(), expected["label"].tolist())
+        np.testing.assert_allclose(np.stack(df["distribution"]), np.array(expected["distribution"].tolist()),
+                                   rtol=1e-6)
+
+    def test_parse_response(self):
+        result = random_result()
+        df = parse_label_response(result)
+
+        self.assert_matches_legacy(df, result)
+        self.assertIsInstance(df["label"].dtype, pd.CategoricalDtype)
+        self.assertIsInstance(df["package"].dtype, pd.CategoricalDtype)
+        self.assertEqual(df["distribution"][0].dtype, np.float32)
+
+    def test_parse_stream(self):
+        result = random_result()
+        df = parse_label_stream(response_body(result))
+
+        self.assert_matches_legacy(df, result)
+        pd.testing.assert_frame_equal(df.drop(columns="distribution"),
+                                      parse_label_response(result).drop(columns="distribution"))
+
+    def test_taxonomy_after_versions(self):
+        result = random_result(num_files=10)
+        body = io.BytesIO(json.dumps({"result": {"versions": result["versions"],
+                                                 "taxonomy": result["taxonomy"]}}).encode())
+        self.assert_matches_legacy(parse_label_stream(body), result)
+
+    def test_no_files(self):
+        result = {"taxonomy": {"0": "L0"}, "versions": [{"files": {}}]}
+        self.assertTrue(parse_label_response(result).empty)
+        self.assertTrue(parse_label_stream(response_body(result)).empty)
+
+    def test_invalid_stream(self):
+        with self.assertRaises(ValueError):
+            parse_label_stream(io.BytesIO(b'{"result": {"versions": ['))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,9 @@
 import unittest
+from types import SimpleNamespace
 from unittest.mock import patch, Mock
+import networkx as nx
 import pandas as pd
+from benchmark.benchmark import synthetic_project, legacy_aggregate
 from componentaggregator.componentaggregator import ComponentAggregator
 
 def dummy_component_annot_df():
@@ -44,5 +47,48 @@ class TestComponentAggregator(unittest.TestCase):
         self.assertTrue(df_dummy2_retr.equals(df_dummy2))
 
 
+
+class TestComponentAggregatorAggregate(unittest.TestCase):
+
+    def setUp(self):
+        self.component_aggregator = ComponentAggregator()
+
+    def test_matches_legacy_aggregate(self):
+        # Many labels give components with tied majority labels.
+        for seed, num_labels in [(seed, num_labels) for seed in range(10) for num_labels in (3, 20)]:
+            dep_graph, file_annot, components = synthetic_project(300, num_labels=num_labels, seed=seed)
+            self.component_aggregator.set_state(components, file_annot, dep_graph, "synthetic")
+
+            df_project = self.component_aggregator.build_aggregate()
+
+            pd.testing.assert_frame_equal(df_project, legacy_aggregate(components, file_annot, dep_graph))
+
+    def test_majority_label_tie_and_duplicates(self):
+        dep_graph = nx.DiGraph()
+        for node_id, path in [("c", "y/C.java"), ("a", "x/A.java"), ("b", "x/B.java"), ("d", "missing")]:
+            dep_graph.add_node(node_id, filePathRelative=path)
+        file_annot = pd.DataFrame({"path": ["x/A.java", "x/B.java", "y/C.java", "x/A.java"],
+                                   "label": ["L1", "L2", "L2", "L1"]}, index=[10, 11, 12, 13])
+        components = SimpleNamespace(communities=[["c", "a", "b", "d"], ["d"]])
+        self.component_aggregator.set_state(components, file_annot, dep_graph, "ties")
+
+        df_project = self.component_aggregator.build_aggregate()
+
+        self.assertEqual(list(df_project.index), [12, 10, 13, 11])
+        self.assertEqual(set(df_project['componentlabel']), {"L2"})
+        self.assertEqual(list(df_project['mismatch']), [False, True, True, False])
+
+    def test_no_file_matches(self):
+        dep_graph = nx.DiGraph()
+        dep_graph.add_node("a", filePathRelative="x/A.java")
+        file_annot = pd.DataFrame({"path": ["y/B.java"], "label": ["L1"]})
+        self.component_aggregator.set_state(SimpleNamespace(communities=[["a"]]), file_annot, dep_graph, "empty")
+
+        df_project = self.component_aggregator.build_aggregate()
+
+        self.assertTrue(df_project.empty)
+        self.assertIn("componentlabel", df_project.columns)
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,71 @@
+import unittest
+from types import SimpleNamespace
+
+import networkx as nx
+import pandas as pd
+
+from componentaggregator.componentaggregator import ComponentAggregator
+from componentaggregator.pathindex import PathIndex, normalize_path
+
+
+class TestPathIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.index = PathIndex(["src/main/java/com/x/A.java", "/src/main/java/com/x/B.java",
+                                "core/src/main/java/com/y/Util.java", "web/src/main/java/com/z/Util.java",
+                                "Main.java", "src/main/java/com/x/A.java", None])
+
+    def test_normalize_path(self):
+        self.assertEqual(normalize_path("./src\\main//A.java"), "src/main/A.java")
+        self.assertEqual(normalize_path("/A.java"), "A.java")
+        self.assertIsNone(normalize_path(""))
+        self.assertIsNone(normalize_path(float("nan")))
+
+    def test_row_keys(self):
+        self.assertEqual(self.index.row_keys.tolist(), [0, 1, 2, 3, 4, 0, -1])
+
+    def test_resolve(self):
+        cases = {
+            "src/main/java/com/x/A.java": (0, "exact"),
+            "src/main/java/com/x/B.java": (1, "exact"),
+            # Module prefix on the graph side.
+            "module/src/main/java/com/x/A.java": (0, "suffix"),
+            # Package path on the graph side.
+            "com/y/Util.java": (2, "suffix"),
+            "Util.java": (-1, "ambiguous"),
+            "app/Main.java": (4, "suffix"),
+            "com/q/A.java": (-1, "unmatched"),
+            None: (-1, "unmatched"),
+        }
+        for path, expected in cases.items():
+            with self.subTest(path=path):
+                self.assertEqual(self.index.resolve(path), expected)
+
+    def test_reconcile_rejects_contested_suffix_matches(self):
+        keys, stats = self.index.reconcile(["src/main/java/com/x/A.java", "com/x/A.java", "a/Main.java",
+                                            "b/Main.java", "com/z/Util.java", "missing.java"])
+
+        self.assertEqual(keys.tolist(), [0, -1, -1, -1, 3, -1])
+        self.assertEqual(stats, {"exact": 1, "suffix": 1, "ambiguous": 3, "unmatched": 1, "nodes": 6,
+                                 "match_rate": 2 / 6})
+
+    def test_aggregate_matches_differently_rooted_paths(self):
+        dep_graph = nx.DiGraph()
+        for node_id, path in [("a", "com/x/A.java"), ("b", "com/x/B.java"), ("c", "com/y/C.java")]:
+            dep_graph.add_node(node_id, filePathRelative=path)
+        file_annot = pd.DataFrame({"path": ["app/src/main/java/com/x/A.java", "app/src/main/java/com/x/B.java",
+                                            "app/src/main/java/com/y/C.java"],
+                                   "label": ["L1", "L1", "L2"]})
+        aggregator = ComponentAggregator(results_writer=SimpleNamespace(engine=None))
+        aggregator.set_state(SimpleNamespace(communities=[["a", "b", "c"]]), file_annot, dep_graph, "rooted")
+
+        df_project = aggregator.build_aggregate()
+
+        self.assertEqual(list(df_project["path"]), list(file_annot["path"]))
+        self.assertEqual(set(df_project["componentlabel"]), {"L1"})
+        self.assertEqual(aggregator.match_stats["suffix"], 3)
+        self.assertEqual(aggregator.match_stats["match_rate"], 1.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,31 @@
+import asyncio
+import os
+import tempfile
+import threading
+import time
 import unittest
+from unittest.mock import patch
 
-from componentannotator.componentannotator import ComponentAnnotator
+import pandas as pd
+
+from benchmark.benchmark import synthetic_fixtures
+from componentannotator.componentannotator import ComponentAnnotator, projects_per_hour
+from repositorycache.repositorycache import RepositoryCache
+
+
+def fake_annotate_project(project_name, project_url, commit=None):
+    if project_name == "broken":
+        raise RuntimeError("Auto-fl failed to annotate project.")
+    if project_name == "corrupt":
+        raise KeyError("aggregate")
+    return pd.DataFrame({"path": [f"{project_name}/A.java"], "projectname": [project_name]})
+
+
+def crashing_annotate_project(project_name, project_url, commit=None):
+    if project_name == "crash":
+        # A worker killed by the OOM killer or a segfault.
+        os._exit(1)
+    return fake_annotate_project(project_name, project_url)
 
 
 class TestComponentAnnotator(unittest.TestCase):
@@ -18,5 +43,140 @@ class TestComponentAnnotator(unittest.TestCase):
             self.assertIn(column, df_res.columns)
 
 
+    @patch.object(ComponentAnnotator, "annotate_project", side_effect=fake_annotate_project)
+    def test_annotate_project_list_isolates_errors(self, mock_annotate):
+        projects = [("p1", "https://github.com/u/p1"), ("broken", "https://github.com/u/broken"),
+                    ("corrupt", "https://github.com/u/corrupt"), ("p2", "https://github.com/u/p2")]
+
+        frames = self.component_annotator.annotate_project_list(projects)
+
+        self.assertEqual([df["projectname"][0] for df in frames], ["p1", "p2"])
+        self.assertEqual(self.component_annotator.batch_stats["succeeded"], 2)
+        self.assertEqual(self.component_annotator.batch_stats["failed"], 2)
+
+    @patch.object(ComponentAnnotator, "annotate_project", side_effect=fake_annotate_project)
+    def test_annotate_project_list_passes_pinned_commits(self, mock_annotate):
+        projects = [("p1", "https://github.com/u/p1", "c0ffee"), ("p2", "https://github.com/u/p2")]
+
+        self.component_annotator.annotate_project_list(projects)
+
+        self.assertEqual([call.args for call in mock_annotate.call_args_list],
+                         [("p1", "https://github.com/u/p1", "c0ffee"), ("p2", "https://github.com/u/p2", None)])
+
+    @patch.object(ComponentAnnotator, "annotate_project", side_effect=fake_annotate_project)
+    def test_iter_annotate_project_list_parallel(self, mock_annotate):
+        projects = [(f"p{i}", f"https://github.com/u/p{i}") for i in range(6)]
+        projects.append(("broken", "https://github.com/u/broken"))
+
+        results = dict(self.component_annotator.iter_annotate_project_list(iter(projects), num_workers=2))
+
+        self.assertEqual(set(results), {f"p{i}" for i in range(6)})
+        self.assertEqual(results["p3"]["path"][0], "p3/A.java")
+        self.assertEqual(self.component_annotator.batch_stats["failed"], 1)
+        self.assertGreater(self.component_annotator.batch_stats["projects_per_hour"], 0)
+
+    @patch.object(ComponentAnnotator, "annotate_project", side_effect=crashing_annotate_project)
+    def test_parallel_survives_dead_worker(self, mock_annotate):
+        projects = [("crash", "https://github.com/u/crash")] + [(f"p{i}", f"https://github.com/u/p{i}")
+                                                                for i in range(9)]
+
+        results = dict(self.component_annotator.iter_annotate_project_list(iter(projects), num_workers=2))
+
+        stats = self.component_annotator.batch_stats
+        self.assertNotIn("crash", results)
+        self.assertEqual(stats["succeeded"] + stats["failed"], 10)
+        # Only the projects in flight with the dead worker (at most 2 per worker) fail.
+        self.assertGreaterEqual(stats["succeeded"], 10 - 4)
+        self.assertEqual(len(results), stats["succeeded"])
+
+    def test_pipelined_cancels_extraction_on_empty_labels(self):
+        annotator = ComponentAnnotator("java", pipelined=True)
+        extraction_started = threading.Event()
+
+        def slow_extraction():
+            extraction_started.set()
+            while annotator.component_extractor.valid:
+                threading.Event().wait(0.05)
+            raise RuntimeError("cancelled")
+
+        def empty_labels(project_name, remote):
+            extraction_started.wait(5)
+            return pd.DataFrame()
+
+        with patch.object(annotator, "_annotate_file", side_effect=empty_labels), \
+                patch.object(annotator.component_extractor, "detect_components", side_effect=slow_extraction):
+            with self.assertRaisesRegex(RuntimeError, "Auto-fl failed"):
+                annotator.annotate_project("p1", "https://github.com/u/p1")
+
+        self.assertTrue(annotator.component_extractor.cancelled)
+
+    def test_pipelined_cancels_labels_on_failed_extraction(self):
+        annotator = ComponentAnnotator("java", pipelined=True)
+        labels_started = threading.Event()
+
+        def slow_labels(project_name, remote):
+            labels_started.set()
+            annotator.auto_fl_client.run_blocking(asyncio.sleep(60))
+            return pd.DataFrame({"path": ["A.java"]})
+
+        def failed_extraction():
+            labels_started.wait(5)
+            raise RuntimeError("Arcan failed")
+
+        start = time.perf_counter()
+        with patch.object(annotator, "_annotate_file", side_effect=slow_labels), \
+                patch.object(annotator.component_extractor, "detect_components", side_effect=failed_extraction):
+            with self.assertRaisesRegex(RuntimeError, "Arcan failed"):
+                annotator.annotate_project("p1", "https://github.com/u/p1")
+
+        self.assertLess(time.perf_counter() - start, 10)
+        # The labels stage ended (cancelled) before annotate_project returned.
+        self.assertEqual([(record["stage"], record["status"]) for record in annotator.instrumentation.records],
+                         [("labels", "failed"), ("project", "failed")])
+        annotator.auto_fl_client.close()
+
+    def test_incremental_reannotates_changed_projects(self):
+        cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            os.chdir(tmp_dir)
+            try:
+                fixtures = synthetic_fixtures(os.path.join(tmp_dir, "fixtures"), num_projects=1, num_nodes=30)
+                project = fixtures.load_projects()[0]
+                annotator = ComponentAnnotator("java", replay_dir=fixtures.fixtures_dir, incremental=True,
+                                               manifest_path=os.path.join(tmp_dir, "manifest.db"),
+                                               database_url=f"sqlite:///{os.path.join(tmp_dir, 'results.db')}")
+
+                with patch.object(RepositoryCache, "remote_head", side_effect=["a" * 40, "a" * 40, "b" * 40]):
+                    runs = []
+                    for _ in range(3):
+                        annotator.instrumentation.drain()
+                        annotator.annotate_project(project["name"], project["html_url"])
+                        # The aggregate stage is recorded once the results are written.
+                        annotator.component_aggregator.results_writer.flush()
+                        runs.append(annotator.instrumentation.drain())
+                head = annotator.manifest.commit(project["name"])
+                # The snapshot is pinned to the checked HEAD.
+                pinned = annotator.component_extractor.commit
+            finally:
+                os.chdir(cwd)
+
+        stages = [[record["stage"] for record in records] for records in runs]
+        reused = [next(record["reused"] for record in records if record["stage"] == "project") for records in runs]
+        self.assertIn("labels", stages[0])
+        self.assertNotIn("labels", stages[1])
+        self.assertIn("labels", stages[2])
+        self.assertEqual(reused, [False, True, False])
+        self.assertEqual(head, "b" * 40)
+        self.assertEqual(pinned, "b" * 40)
+
+    def test_incremental_needs_manifest(self):
+        with self.assertRaises(ValueError):
+            ComponentAnnotator("java", incremental=True)
+
+    def test_projects_per_hour(self):
+        self.assertEqual(projects_per_hour(10, 1800), 20.0)
+        self.assertEqual(projects_per_hour(10, 0), 0.0)
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,169 @@
+import os
+import stat
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from concurrent.futures import ProcessPoolExecutor
+
+from componentextractor.arcansupervisor import ArcanFailure, ArcanSupervisor, default_slots, parse_memory
+from componentextractor.componentextractor import ComponentExtractor
+
+
+def raise_arcan_failure():
+    failure = ArcanFailure("p", "timeout", "did not finish", 137, ["killed"])
+    failure.stage_records = [{"stage": "arcan"}]
+    raise failure
+
+
+class TestArcanSupervisor(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.output_dir = os.path.join(self.tmp_dir.name, "arcanOutput", "project")
+        self.supervisor = ArcanSupervisor(timeout=10, slots=2, slot_dir=os.path.join(self.tmp_dir.name, "slots"),
+                                          poll_interval=0.05, kill_grace=1)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def script(self, body: str) -> str:
+        """
+        Writes a fake run-arcan.sh (the output directory is the first argument).
+        """
+        path = os.path.join(self.tmp_dir.name, f"fake-arcan-{len(os.listdir(self.tmp_dir.name))}.sh")
+        with open(path, "w") as file:
+            file.write(f"#!/bin/bash\nOUT=$1\n{body}\n")
+        os.chmod(path, os.stat(path).st_mode | stat.S_IEXEC)
+        return path
+
+    def run_script(self, body: str, supervisor: ArcanSupervisor = None) -> None:
+        supervisor = supervisor if supervisor is not None else self.supervisor
+        supervisor.run("project", [self.script(body), self.output_dir], output_dir=self.output_dir)
+
+    def test_success(self):
+        self.run_script('mkdir -p $OUT && echo "<graphml/>" > $OUT/dependency-graph-1_abc.graphml')
+        self.assertTrue(os.path.exists(os.path.join(self.output_dir, "dependency-graph-1_abc.graphml")))
+
+    def test_jvm_heap_is_passed(self):
+        supervisor = ArcanSupervisor(jvm_heap="3G", slots=1, slot_dir=self.supervisor.slot_dir, poll_interval=0.05)
+        self.run_script('mkdir -p $OUT && echo $ARCAN_JAVA_MEMORY > $OUT/dependency-graph-1_$ARCAN_JAVA_MEMORY.graphml',
+                        supervisor)
+        self.assertEqual(os.listdir(self.output_dir), ["dependency-graph-1_3G.graphml"])
+
+    def test_failures(self):
+        cases = [
+            ('mkdir -p $OUT && touch $OUT/partial.json\necho "Exception in thread "main" '
+             'java.lang.OutOfMemoryError: Java heap space"\nexit 1', "out_of_memory"),
+            ('echo "fatal: Authentication failed for https://github.com/u/p"\nexit 128', "clone"),
+            ('exit 3', "exit"),
+            ('mkdir -p $OUT && touch $OUT/partial.json\nexit 0', "no_output"),
+        ]
+        for body, reason in cases:
+            with self.subTest(reason=reason):
+                with self.assertRaises(ArcanFailure) as context:
+                    self.run_script(body)
+                self.assertEqual(context.exception.reason, reason)
+                self.assertFalse(os.path.exists(self.output_dir))
+                if reason == "exit":
+                    self.assertEqual(context.exception.exit_code, 3)
+
+    def test_timeout(self):
+        self.supervisor.timeout = 0.3
+        start = time.perf_counter()
+        with self.assertRaises(ArcanFailure) as context:
+            self.run_script("mkdir -p $OUT\nsleep 30")
+        self.assertEqual(context.exception.reason, "timeout")
+        self.assertLess(time.perf_counter() - start, 10)
+        self.assertFalse(os.path.exists(self.output_dir))
+
+    def test_memory_limit(self):
+        self.supervisor.max_rss_mb = 100
+        with self.assertRaises(ArcanFailure) as context:
+            self.run_script(f'"{sys.executable}" -c "import time; x = bytearray(300 * 2 ** 20); time.sleep(30)"')
+        self.assertEqual(context.exception.reason, "memory")
+
+    def test_peak_rss_per_run(self):
+        allocate = f'"{sys.executable}" -c "import time; x = bytearray({{}} * 2 ** 20); time.sleep(0.5)"'
+        body = 'mkdir -p $OUT && touch $OUT/dependency-graph-1_a.graphml\n' + allocate
+
+        self.run_script(body.format(200))
+        large = self.supervisor.peak_rss_mb
+        self.run_script(body.format(10))
+
+        self.assertGreater(large, 200)
+        self.assertLess(self.supervisor.peak_rss_mb, large - 150)
+        self.supervisor.reset()
+        self.assertIsNone(self.supervisor.peak_rss_mb)
+
+    def test_failure_crosses_process_pool(self):
+        with ProcessPoolExecutor(max_workers=1) as pool:
+            with self.assertRaises(ArcanFailure) as context:
+                pool.submit(raise_arcan_failure).result()
+            # The pool is not broken by the failure.
+            self.assertEqual(pool.submit(int, "3").result(), 3)
+
+        failure = context.exception
+        self.assertEqual((failure.project_name, failure.reason, failure.exit_code, failure.log_tail),
+                         ("p", "timeout", 137, ["killed"]))
+        self.assertEqual(str(failure), "Arcan failed for p (timeout): did not finish")
+        self.assertEqual(failure.stage_records, [{"stage": "arcan"}])
+
+    def test_slots_limit_concurrent_runs(self):
+        log_file = os.path.join(self.tmp_dir.name, "runs.log")
+        body = (f'mkdir -p $OUT && touch $OUT/dependency-graph-1_a.graphml\n'
+                f'echo start >> {log_file}\nsleep 0.3\necho end >> {log_file}')
+        supervisor = ArcanSupervisor(slots=1, slot_dir=self.supervisor.slot_dir, poll_interval=0.05)
+        threads = [threading.Thread(target=self.run_script, args=(body, supervisor)) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        with open(log_file) as file:
+            self.assertEqual(file.read().split(), ["start", "end"] * 3)
+
+    def test_cancel(self):
+        threading.Timer(0.3, self.supervisor.cancel).start()
+        with self.assertRaises(ArcanFailure) as context:
+            self.run_script("sleep 30")
+        self.assertEqual(context.exception.reason, "cancelled")
+
+        with self.assertRaises(ArcanFailure):
+            self.run_script("exit 0")
+        self.supervisor.reset()
+        self.run_script('mkdir -p $OUT && touch $OUT/dependency-graph-1_a.graphml')
+
+    def test_parse_memory_and_default_slots(self):
+        self.assertEqual(parse_memory("28G"), 28 * 1024)
+        self.assertEqual(parse_memory("512m"), 512)
+        with self.assertRaises(ValueError):
+            parse_memory("lots")
+        self.assertGreaterEqual(default_slots("1G"), 1)
+        self.assertLessEqual(default_slots("1G"), os.cpu_count())
+
+
+class TestComponentExtractorArcanFailure(unittest.TestCase):
+    def test_failure_invalidates_extractor(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            fake_script = os.path.join(tmp_dir, "run-arcan.sh")
+            with open(fake_script, "w") as file:
+                file.write('#!/bin/bash\necho "java.lang.IllegalStateException: no sources"\nexit 1\n')
+            os.chmod(fake_script, os.stat(fake_script).st_mode | stat.S_IEXEC)
+
+            supervisor = ArcanSupervisor(slots=1, slot_dir=os.path.join(tmp_dir, "slots"), poll_interval=0.05)
+            extractor = ComponentExtractor(language="java", arcan_supervisor=supervisor)
+            extractor.arcan_script = fake_script
+            extractor.arcan_out = os.path.join(tmp_dir, "out") + "/"
+            extractor.repository_path = os.path.join(tmp_dir, "repository")
+            extractor.set_project("BrokenProject", "https://github.com/testuser/brokenproject")
+
+            with self.assertRaises(ArcanFailure) as context:
+                extractor.dependency_graph()
+            self.assertEqual(context.exception.reason, "java")
+            self.assertIn("IllegalStateException", str(context.exception))
+            self.assertFalse(extractor.valid)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import networkx as nx
+
+from benchmark.benchmark import planted_graph
+from componentextractor.communitycache import CommunityCache, MemoizedDetector, graph_content_hash
+from componentextractor.communitydetection import InfomapDetector, LeidenDetector, canonical_communities
+from componentextractor.csrgraph import read_graphml_csr
+
+
+class TestCommunityCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cache_dir = os.path.join(self.tmp_dir.name, "communities")
+        self.dep_graph = planted_graph(200, num_communities=5, seed=2)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_graph_content_hash(self):
+        shuffled = nx.DiGraph()
+        shuffled.add_nodes_from(reversed(list(self.dep_graph.nodes(data=True))))
+        shuffled.add_edges_from(reversed(list(self.dep_graph.edges())))
+        self.assertEqual(graph_content_hash(shuffled), graph_content_hash(self.dep_graph))
+
+        graphml_path = os.path.join(self.tmp_dir.name, "graph.graphml")
+        nx.write_graphml(self.dep_graph, graphml_path)
+        self.assertEqual(graph_content_hash(read_graphml_csr(graphml_path)), graph_content_hash(self.dep_graph))
+
+        changed = self.dep_graph.copy()
+        changed.remove_edge(*next(iter(changed.edges())))
+        self.assertNotEqual(graph_content_hash(changed), graph_content_hash(self.dep_graph))
+
+    def test_graph_content_hash_includes_weights(self):
+        weighted = self.dep_graph.copy()
+        nx.set_edge_attributes(weighted, {edge: float(index % 3 + 1) for index, edge in enumerate(weighted.edges())},
+                               "weight")
+        reweighted = weighted.copy()
+        reweighted.edges[next(iter(reweighted.edges()))]["weight"] += 1
+
+        self.assertNotEqual(graph_content_hash(weighted), graph_content_hash(self.dep_graph))
+        self.assertNotEqual(graph_content_hash(reweighted), graph_content_hash(weighted))
+        graphml_path = os.path.join(self.tmp_dir.name, "weighted.graphml")
+        nx.write_graphml(weighted, graphml_path)
+        self.assertEqual(graph_content_hash(read_graphml_csr(graphml_path)), graph_content_hash(weighted))
+
+    def test_put_leaves_no_temporary_files(self):
+        cache = CommunityCache(self.cache_dir)
+        cache.put("key", "infomap", {}, [["a", "b"]])
+        cache.put("key", "infomap", {}, [["a"], ["b"]])
+
+        self.assertEqual(os.listdir(self.cache_dir), ["key.json"])
+        self.assertEqual(cache.get("key")["communities"], [["a"], ["b"]])
+
+    def test_memoized_across_runs(self):
+        first = MemoizedDetector(InfomapDetector(), CommunityCache(self.cache_dir)).detect(self.dep_graph)
+
+        detector = MemoizedDetector(InfomapDetector(), CommunityCache(self.cache_dir))
+        with patch.object(InfomapDetector, "_detect", side_effect=AssertionError("Infomap was run")):
+            second = detector.detect(self.dep_graph.copy())
+
+        self.assertEqual(second.communities, first.communities)
+        self.assertEqual(second.method_name, first.method_name)
+        self.assertEqual(detector.cache.hits, 1)
+
+    def test_key_includes_backend_and_parameters(self):
+        cache = CommunityCache(self.cache_dir)
+        MemoizedDetector(InfomapDetector(seed=1), cache).detect(self.dep_graph)
+        MemoizedDetector(InfomapDetector(seed=2), cache).detect(self.dep_graph)
+        MemoizedDetector(LeidenDetector(seed=1), cache).detect(self.dep_graph)
+
+        self.assertEqual(cache.misses, 3)
+        self.assertEqual(len(os.listdir(self.cache_dir)), 3)
+
+    def test_seeded_component_ids_are_stable(self):
+        first = InfomapDetector(seed=3).detect(self.dep_graph).communities
+        second = InfomapDetector(seed=3).detect(self.dep_graph).communities
+        self.assertEqual(first, second)
+        self.assertEqual(first, canonical_communities(first))
+
+    def test_canonical_communities(self):
+        self.assertEqual(canonical_communities([["b"], ["d", "c"], [], ["a"]]), [["c", "d"], ["a"], ["b"]])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+import os
+import tempfile
+import unittest
+
+import networkx as nx
+
+from benchmark.benchmark import planted_graph, normalized_mutual_information, bench_communities
+from componentextractor.communitydetection import COMMUNITY_DETECTORS, create_detector, PackageDetector
+from componentextractor.componentextractor import ComponentExtractor
+from componentextractor.csrgraph import read_graphml_csr
+
+
+class TestCommunityDetection(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.dep_graph = planted_graph(300, num_communities=6, seed=5)
+        self.graphml_path = os.path.join(self.tmp_dir.name, "dependency-graph-1_abc.graphml")
+        nx.write_graphml(self.dep_graph, self.graphml_path)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_backends_partition_graph(self):
+        nodes = set(self.dep_graph.nodes)
+        for name in COMMUNITY_DETECTORS:
+            with self.subTest(backend=name):
+                communities = create_detector(name).detect(self.dep_graph).communities
+                members = [node_id for community in communities for node_id in community]
+                self.assertEqual(len(members), len(set(members)))
+                self.assertEqual(set(members), nodes)
+
+    def test_seeded_backends_are_reproducible(self):
+        for name in ("infomap", "leiden", "louvain", "label_propagation"):
+            with self.subTest(backend=name):
+                first = create_detector(name, seed=7).detect(self.dep_graph).communities
+                second = create_detector(name, seed=7).detect(self.dep_graph).communities
+                self.assertEqual(sorted(map(sorted, first)), sorted(map(sorted, second)))
+
+    def test_csr_graph(self):
+        csr_graph = read_graphml_csr(self.graphml_path)
+        nx_graph = nx.read_graphml(self.graphml_path)
+        for name in ("leiden", "package"):
+            with self.subTest(backend=name):
+                csr_components = create_detector(name).detect(csr_graph)
+                nx_components = create_detector(name).detect(nx_graph)
+                self.assertIs(csr_components.graph, csr_graph)
+                self.assertEqual(sorted(map(sorted, csr_components.communities)),
+                                 sorted(map(sorted, nx_components.communities)))
+
+    def test_planted_structure_is_recovered(self):
+        nodes = list(self.dep_graph.nodes)
+        planted = PackageDetector().detect(self.dep_graph).communities
+        for name in ("infomap", "leiden"):
+            with self.subTest(backend=name):
+                communities = create_detector(name, seed=1).detect(self.dep_graph).communities
+                self.assertGreater(normalized_mutual_information(planted, communities, nodes), 0.6)
+
+    def test_package_depth(self):
+        graph = nx.DiGraph()
+        graph.add_nodes_from([("a", {"filePathRelative": "src/x/A.java"}), ("b", {"filePathRelative": "src/y/B.java"}),
+                              ("c", {"filePathRelative": "src/y/C.java"}), ("p", {})])
+        self.assertEqual(sorted(map(sorted, PackageDetector().detect(graph).communities)), [["a"], ["b", "c"]])
+        self.assertEqual(PackageDetector(depth=1).detect(graph).communities, [["a", "b", "c"]])
+
+    def test_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            create_detector("girvan_newman")
+
+    def test_extractor_uses_detector(self):
+        extractor = ComponentExtractor("java", community_detector=PackageDetector())
+        extractor.set_project("project", "https://github.com/owner/project").resume(self.graphml_path)
+        self.assertEqual(extractor.detect_components().method_name, "Package")
+
+    def test_benchmark(self):
+        results = bench_communities([200], [self.graphml_path], ["package", "leiden"])
+        self.assertEqual([backend for _, backend, *_ in results], ["infomap", "package", "leiden"] * 2)
+        self.assertEqual(results[0][-1], 1.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,8 +1,13 @@
 import os
+import stat
+import tempfile
+import threading
+import time
 import unittest
 import cdlib
 import networkx as nx
-from componentextractor.componentextractor import ComponentExtractor
+from componentextractor.componentextractor import ComponentExtractor, select_dependency_graph
+from repositorycache.repositorycache import RepositoryCache, run_git
 
 def test_graph():
     # Create a simple graph
@@ -45,5 +50,122 @@ class TestComponentExtractor(unittest.TestCase):
         self.assertEqual(components.communities, exp_communities)
 
 
+
+class TestComponentExtractorCancel(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        fake_script = os.path.join(self.tmp_dir.name, "run-arcan.sh")
+        with open(fake_script, "w") as file:
+            file.write("#!/bin/bash\nsleep 30\n")
+        os.chmod(fake_script, os.stat(fake_script).st_mode | stat.S_IEXEC)
+
+        self.component_extractor = ComponentExtractor(language="java")
+        self.component_extractor.arcan_script = fake_script
+        self.component_extractor.set_project(project="SlowProject",
+                                             project_url="https://github.com/testuser/slowproject")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_cancel_terminates_arcan(self):
+        threading.Timer(0.5, self.component_extractor.cancel).start()
+        start = time.perf_counter()
+        with self.assertRaises((RuntimeError, ValueError)):
+            self.component_extractor.dependency_graph()
+        self.assertLess(time.perf_counter() - start, 10)
+
+    def test_cancel_before_run(self):
+        self.component_extractor.cancel()
+        with self.assertRaises(ValueError):
+            self.component_extractor.infomap_components()
+
+
+
+FAKE_ARCAN = """#!/bin/bash
+echo "$@" > $6/args.txt
+echo "$ARCAN_LOCAL_INPUT" > $6/local-input.txt
+mkdir -p $6/arcanOutput/$2
+COMMIT=${9:-cafe42}
+cat > $6/arcanOutput/$2/dependency-graph-3_$COMMIT.graphml <<EOF
+<?xml version="1.0" encoding="UTF-8"?>
+<graphml xmlns="http://graphml.graphdrawing.org/xmlns">
+  <key id="d0" for="node" attr.name="filePathRelative" attr.type="string"/>
+  <graph edgedefault="directed">
+    <node id="1"><data key="d0">A.java</data></node>
+    <node id="2"><data key="d0">B.java</data></node>
+    <edge source="1" target="2"/>
+  </graph>
+</graphml>
+EOF
+"""
+
+
+class TestComponentExtractorSnapshot(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.out_dir = self.tmp_dir.name + "/"
+        fake_script = os.path.join(self.tmp_dir.name, "run-arcan.sh")
+        with open(fake_script, "w") as file:
+            file.write(FAKE_ARCAN)
+        os.chmod(fake_script, os.stat(fake_script).st_mode | stat.S_IEXEC)
+
+        self.component_extractor = ComponentExtractor(language="java", analysis_mode="snapshot")
+        self.component_extractor.arcan_script = fake_script
+        self.component_extractor.arcan_out = self.out_dir
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def touch_graphs(self, *filenames):
+        directory = os.path.join(self.out_dir, "arcanOutput", "Snap")
+        os.makedirs(directory, exist_ok=True)
+        for filename in filenames:
+            open(os.path.join(directory, filename), "w").close()
+        return directory
+
+    def test_select_dependency_graph(self):
+        directory = self.touch_graphs("temporal-graph.graphml", "dependency-graph-2_aaa111.graphml",
+                                      "dependency-graph-10_bbb222.graphml", "dependency-graph-9_ccc333.graphml")
+
+        self.assertEqual(select_dependency_graph(directory), "dependency-graph-10_bbb222.graphml")
+        self.assertEqual(select_dependency_graph(directory, "aaa111ffff"), "dependency-graph-2_aaa111.graphml")
+        with self.assertRaises(ValueError):
+            select_dependency_graph(directory, "ddd444")
+
+    def test_snapshot_run_with_pinned_commit(self):
+        self.touch_graphs("dependency-graph-99_old999.graphml")
+        self.component_extractor.set_project("Snap", "https://github.com/u/snap", commit="beef01")
+
+        dep_graph = self.component_extractor.dependency_graph()
+
+        with open(os.path.join(self.out_dir, "args.txt")) as file:
+            args = file.read().split()
+        self.assertEqual(args[7:], ["snapshot", "beef01"])
+        self.assertEqual(sorted(dep_graph.nodes), ["1", "2"])
+        self.assertFalse(os.path.exists(os.path.join(self.out_dir, "arcanOutput", "Snap",
+                                                     "dependency-graph-99_old999.graphml")))
+
+    def test_repository_cache_checkout(self):
+        remote = os.path.join(self.tmp_dir.name, "remote")
+        os.makedirs(remote)
+        run_git("init", "--quiet", cwd=remote)
+        run_git("-c", "user.name=test", "-c", "user.email=test@example.com",
+                "commit", "--quiet", "--allow-empty", "-m", "init", cwd=remote)
+        self.component_extractor.repository_cache = RepositoryCache(os.path.join(self.tmp_dir.name, "cache"))
+        self.component_extractor.repository_path = os.path.join(self.tmp_dir.name, "repository")
+        self.component_extractor.set_project("Snap", remote)
+
+        self.component_extractor.dependency_graph()
+
+        with open(os.path.join(self.out_dir, "local-input.txt")) as file:
+            self.assertEqual(file.read().strip(), "1")
+        self.assertTrue(os.path.exists(os.path.join(self.tmp_dir.name, "repository", "Snap", ".git")))
+        self.assertEqual(self.component_extractor.repository_cache.metrics()["misses"], 1)
+
+    def test_unknown_analysis_mode(self):
+        with self.assertRaises(ValueError):
+            ComponentExtractor(language="java", analysis_mode="weekly")
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,77 @@
+import os
+import tempfile
+import unittest
+
+import networkx as nx
+import pandas as pd
+from cdlib import algorithms
+
+from benchmark.benchmark import synthetic_project
+from componentaggregator.componentaggregator import ComponentAggregator
+from componentextractor.csrgraph import CSRGraph, read_graphml_csr, infomap_csr
+from componentextractor.graphcache import GraphCache
+
+
+class TestCSRGraph(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.dep_graph, self.file_annot, self.components = synthetic_project(200, seed=3)
+        self.graphml_path = os.path.join(self.tmp_dir.name, "dependency-graph-1_abc.graphml")
+        nx.write_graphml(self.dep_graph, self.graphml_path)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_read_graphml_csr_matches_networkx(self):
+        expected = nx.read_graphml(self.graphml_path)
+        graph = read_graphml_csr(self.graphml_path)
+
+        self.assertEqual(graph.node_ids, list(expected.nodes))
+        self.assertEqual(graph.number_of_edges(), expected.number_of_edges())
+        self.assertTrue(graph.is_directed())
+        edges = [(graph.node_ids[u], graph.node_ids[v]) for u, v in graph.edges()]
+        self.assertEqual(sorted(edges), sorted(expected.edges()))
+        self.assertEqual(graph.node_attributes("filePathRelative"),
+                         nx.get_node_attributes(expected, "filePathRelative"))
+        self.assertLess(len(graph.strings), 2 * graph.number_of_nodes())
+
+    def test_npz_roundtrip(self):
+        graph = read_graphml_csr(self.graphml_path)
+        path = os.path.join(self.tmp_dir.name, "graph.npz")
+
+        graph.save_npz(path)
+        loaded = CSRGraph.load_npz(path)
+
+        self.assertEqual(loaded.node_ids, graph.node_ids)
+        self.assertEqual(list(loaded.edges()), list(graph.edges()))
+        self.assertEqual(loaded.node_attribute("filePathRelative"), graph.node_attribute("filePathRelative"))
+
+    def test_infomap_csr_matches_cdlib(self):
+        flags = "--seed 7 --num-trials 2"
+        expected = algorithms.infomap(nx.read_graphml(self.graphml_path), flags=flags)
+        components = infomap_csr(read_graphml_csr(self.graphml_path), flags=flags)
+
+        self.assertEqual(sorted(map(sorted, components.communities)), sorted(map(sorted, expected.communities)))
+
+    def test_aggregator_accepts_csr_graph(self):
+        aggregator = ComponentAggregator()
+        aggregator.set_state(self.components, self.file_annot, self.dep_graph, "nx")
+        expected = aggregator.build_aggregate()
+
+        aggregator.set_state(self.components, self.file_annot, read_graphml_csr(self.graphml_path), "csr")
+
+        pd.testing.assert_frame_equal(aggregator.build_aggregate(), expected)
+
+    def test_compact_graph_cache(self):
+        cache_dir = os.path.join(self.tmp_dir.name, "cache")
+        GraphCache(cache_dir, compact=True).load("Synthetic", self.graphml_path)
+
+        cache = GraphCache(cache_dir, compact=True)
+        graph = cache.load("Synthetic", self.graphml_path)
+
+        self.assertIsInstance(graph, CSRGraph)
+        self.assertEqual(cache.disk_hits, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
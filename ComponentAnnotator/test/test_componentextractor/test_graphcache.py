@@ -0,0 +1,95 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import networkx as nx
+
+from componentextractor.graphcache import GraphCache, save_graph_npz, load_graph_npz
+
+
+def arcan_like_graph():
+    graph = nx.DiGraph()
+    graph.add_node("1", filePathRelative="src/A.java", name="A", constructType="FILE", linesOfCode=10)
+    graph.add_node("2", filePathRelative="src/B.java", name="B", constructType="FILE", linesOfCode=25)
+    graph.add_node("3", name="src", constructType="PACKAGE", isExternal=False)
+    graph.add_edge("1", "2", labelV="dependsOn", weight=2.5)
+    graph.add_edge("3", "1", labelV="isChildOf")
+    graph.graph["version"] = "abc123"
+    return graph
+
+
+class TestGraphCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.graphml_path = os.path.join(self.tmp_dir.name, "dependency-graph-1_abc123.graphml")
+        nx.write_graphml(arcan_like_graph(), self.graphml_path)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def assertSameGraph(self, expected, actual):
+        self.assertEqual(type(expected), type(actual))
+        self.assertEqual(dict(expected.nodes(data=True)), dict(actual.nodes(data=True)))
+        self.assertEqual(list(expected.edges(data=True)), list(actual.edges(data=True)))
+        self.assertEqual(expected.graph, actual.graph)
+
+    def test_parses_once_per_process(self):
+        cache = GraphCache()
+        with patch("componentextractor.graphcache.nx.read_graphml", wraps=nx.read_graphml) as read_graphml:
+            first = cache.load("TestProject", self.graphml_path)
+            second = cache.load("TestProject", self.graphml_path)
+
+        self.assertIs(first, second)
+        self.assertEqual(read_graphml.call_count, 1)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_reparses_when_file_changes(self):
+        cache = GraphCache()
+        cache.load("TestProject", self.graphml_path)
+        graph = arcan_like_graph()
+        graph.add_node("4", filePathRelative="src/C.java")
+        nx.write_graphml(graph, self.graphml_path)
+        os.utime(self.graphml_path, ns=(0, 1))
+
+        self.assertIn("4", cache.load("TestProject", self.graphml_path).nodes)
+        self.assertEqual(cache.misses, 2)
+
+    def test_disk_cache_skips_xml_parsing(self):
+        cache_dir = os.path.join(self.tmp_dir.name, "graph-cache")
+        expected = GraphCache(cache_dir).load("TestProject", self.graphml_path)
+
+        cache = GraphCache(cache_dir)
+        with patch("componentextractor.graphcache.nx.read_graphml") as read_graphml:
+            graph = cache.load("TestProject", self.graphml_path)
+
+        read_graphml.assert_not_called()
+        self.assertEqual(cache.disk_hits, 1)
+        self.assertSameGraph(expected, graph)
+
+    def test_npz_roundtrip_multigraph(self):
+        graph = nx.MultiDiGraph()
+        graph.add_node("a", filePathRelative="A.java")
+        graph.add_node("b")
+        graph.add_edge("a", "b", key="e0", weight=1.0)
+        graph.add_edge("a", "b", key="e1", weight=3.0)
+        path = os.path.join(self.tmp_dir.name, "multi.npz")
+
+        save_graph_npz(graph, path)
+
+        self.assertSameGraph(graph, load_graph_npz(path))
+
+    def test_npz_writes_leave_no_temporary_files(self):
+        path = os.path.join(self.tmp_dir.name, "graph.npz")
+
+        save_graph_npz(arcan_like_graph(), path)
+        with patch("componentextractor.csrgraph.np.savez_compressed", side_effect=OSError("disk full")):
+            with self.assertRaises(OSError):
+                save_graph_npz(arcan_like_graph(), path)
+
+        self.assertEqual(sorted(os.listdir(self.tmp_dir.name)), ["dependency-graph-1_abc123.graphml", "graph.npz"])
+        self.assertSameGraph(arcan_like_graph(), load_graph_npz(path))
+
+
+if __name__ == '__main__':
+    unittest.main()
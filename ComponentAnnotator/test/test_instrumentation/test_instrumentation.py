@@ -0,0 +1,93 @@
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from types import SimpleNamespace
+
+from benchmark.benchmark import synthetic_project
+from componentaggregator.componentaggregator import ComponentAggregator
+from instrumentation.instrumentation import Instrumentation, load_records, summarize
+from resultswriter.resultswriter import ResultsWriter
+
+
+class TestInstrumentation(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.metrics_path = os.path.join(self.tmp_dir.name, "metrics", "stages.jsonl")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_stage_record(self):
+        instrumentation = Instrumentation(self.metrics_path)
+        with instrumentation.stage("p1", "labels", backend="auto-fl") as counts:
+            counts["files"] = 3
+        with self.assertRaises(RuntimeError):
+            with instrumentation.stage("p1", "arcan"):
+                raise RuntimeError("arcan failed")
+
+        records = load_records(self.metrics_path)
+        self.assertEqual(records, instrumentation.records)
+        self.assertEqual([(record["stage"], record["status"]) for record in records],
+                         [("labels", "ok"), ("arcan", "failed")])
+        self.assertEqual(records[0]["files"], 3)
+        self.assertEqual(records[0]["backend"], "auto-fl")
+        self.assertEqual(records[1]["error"], "RuntimeError: arcan failed")
+        self.assertGreater(records[0]["max_rss_mb"], 0)
+
+    def test_child_process_resources(self):
+        instrumentation = Instrumentation()
+        with instrumentation.stage("p1", "arcan"):
+            subprocess.run([sys.executable, "-c", "x = bytearray(64 * 2 ** 20); sum(range(3 * 10 ** 6))"], check=True)
+
+        record = instrumentation.records[0]
+        self.assertGreater(record["children_cpu_s"], 0)
+        # The lifetime peak of all children says nothing about this stage.
+        self.assertNotIn("children_max_rss_mb", record)
+
+    def test_listener_errors_are_isolated(self):
+        seen = []
+        instrumentation = Instrumentation(listeners=[lambda record: 1 / 0, seen.append])
+        with instrumentation.stage("p1", "labels"):
+            pass
+        self.assertEqual([record["stage"] for record in seen], ["labels"])
+
+    def test_summary(self):
+        records = [{"project": project, "stage": stage, "wall_s": wall, "cpu_s": wall, "children_cpu_s": 0.0,
+                    "max_rss_mb": 100.0, "children_max_rss_mb": 0.0, "status": "ok"}
+                   for project in ("p1", "p2")
+                   for stage, wall in (("project", 10.0), ("labels", 6.0), ("communities", 2.0), ("arcan", 2.0))]
+        records[-1]["status"] = "failed"
+        del records[1]["children_max_rss_mb"]
+
+        summary = summarize(records)
+        self.assertEqual(list(summary.index), ["labels", "arcan", "communities", "project"])
+        self.assertEqual(summary.loc["labels", "wall_total_s"], 12.0)
+        self.assertAlmostEqual(summary.loc["labels", "share"], 0.6)
+        self.assertEqual(summary.loc["arcan", "failed"], 1)
+        self.assertTrue(summarize([]).empty)
+
+    def test_aggregator_stages(self):
+        dep_graph, file_annot, components = synthetic_project(100)
+        instrumentation = Instrumentation()
+        writer = ResultsWriter(f"sqlite:///{os.path.join(self.tmp_dir.name, 'results.db')}", asynchronous=False)
+        aggregator = ComponentAggregator(writer, instrumentation=instrumentation)
+        aggregator.set_state(SimpleNamespace(communities=components.communities), file_annot, dep_graph, "p1")
+
+        cwd = os.getcwd()
+        os.chdir(self.tmp_dir.name)
+        try:
+            df_project = aggregator.create_aggregate()
+        finally:
+            os.chdir(cwd)
+
+        # The synchronous writer records the database write before the Parquet/CSV sinks finish.
+        self.assertEqual([record["stage"] for record in instrumentation.records], ["aggregate", "write", "sinks"])
+        self.assertEqual(instrumentation.records[0]["rows"], len(df_project))
+        self.assertEqual(instrumentation.records[1]["rows"], len(df_project))
+        self.assertGreater(instrumentation.records[1]["wall_s"], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
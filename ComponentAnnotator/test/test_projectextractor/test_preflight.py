@@ -0,0 +1,168 @@
+import json
+import os
+import subprocess
+import tempfile
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+
+from componentannotator.componentannotator import ComponentAnnotator
+from projectextractor.preflight import PreflightCache, PreflightChecker
+
+
+def repository(full_name, language="Java", size=2048):
+    return {"full_name": full_name, "html_url": f"https://github.com/{full_name}", "language": language, "size": size}
+
+
+class RepositoryAPI(BaseHTTPRequestHandler):
+    """
+    Stand-in for the GitHub repository API: moved repositories redirect, a rate limited repository gets a 403.
+    """
+    repositories = {
+        "/repos/u/alive": repository("u/alive"),
+        "/repositories/42": repository("u/new-name"),
+        "/repos/u/python": repository("u/python", language="Python"),
+        "/repos/u/giant": repository("u/giant", size=10 ** 7),
+        "/repos/u/empty": repository("u/empty", language=None, size=0),
+    }
+    requests = []
+
+    def do_GET(self):
+        RepositoryAPI.requests.append(self.path)
+        if self.path == "/repos/u/old-name":
+            self.send_response(301)
+            self.send_header("Location", "/repositories/42")
+            self.end_headers()
+            return
+        if self.path == "/repos/u/limited":
+            self._send(403, {"message": "API rate limit exceeded"})
+        elif self.path in self.repositories:
+            self._send(200, self.repositories[self.path])
+        else:
+            self._send(404, {"message": "Not Found"})
+
+    def _send(self, status, body):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestPreflightChecker(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), RepositoryAPI)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.api_url = f"http://127.0.0.1:{cls.server.server_port}"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        RepositoryAPI.requests = []
+        self.tmp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def checker(self, cache=None, language="java", max_size_kb=100_000):
+        return PreflightChecker(language, max_size_kb=max_size_kb, api_url=self.api_url, token="", cache=cache)
+
+    def test_reason_codes(self):
+        names = ["alive", "old-name", "python", "giant", "empty", "deleted", "limited"]
+
+        results = self.checker().check([(name, f"https://github.com/u/{name}") for name in names])
+
+        self.assertEqual({result["name"]: result["reason"] for result in results},
+                         {"alive": "ok", "old-name": "renamed", "python": "language", "giant": "too_large",
+                          "empty": "empty", "deleted": "not_found", "limited": "unreachable"})
+        self.assertEqual([result["name"] for result in results if result["eligible"]], ["alive", "old-name", "limited"])
+        self.assertEqual(results[1]["resolved_url"], "https://github.com/u/new-name")
+
+    def test_filter_uses_resolved_urls(self):
+        eligible, ineligible = self.checker().filter([("old-name", "https://github.com/u/old-name.git"),
+                                                      ("deleted", "https://github.com/u/deleted")])
+
+        self.assertEqual(eligible, [("old-name", "https://github.com/u/new-name")])
+        self.assertEqual([(result["name"], result["reason"]) for result in ineligible], [("deleted", "not_found")])
+
+    def test_cache_reuses_results_until_ttl(self):
+        cache = PreflightCache(os.path.join(self.tmp_dir.name, "preflight.db"), ttl=60)
+        projects = [("alive", "https://github.com/u/alive"), ("limited", "https://github.com/u/limited")]
+
+        self.checker(cache).check(projects)
+        results = self.checker(cache).check([("renamed-locally", "https://github.com/u/alive")] + projects[1:])
+
+        # Unreachable projects are not cached, the name of a cached result is the current one.
+        self.assertEqual(RepositoryAPI.requests, ["/repos/u/alive", "/repos/u/limited", "/repos/u/limited"])
+        self.assertEqual(results[0]["name"], "renamed-locally")
+        with patch("projectextractor.preflight.time.time", return_value=time.time() + 120):
+            self.checker(cache).check(projects[:1])
+        self.assertEqual(RepositoryAPI.requests[-1], "/repos/u/alive")
+        self.assertEqual(len(RepositoryAPI.requests), 4)
+
+    def test_cached_results_follow_current_settings(self):
+        cache = PreflightCache(os.path.join(self.tmp_dir.name, "preflight.db"))
+        projects = [("alive", "https://github.com/u/alive"), ("deleted", "https://github.com/u/deleted")]
+
+        strict = self.checker(cache, max_size_kb=1000).check(projects)
+        unlimited = self.checker(cache, max_size_kb=None).check(projects)
+        python = self.checker(cache, language="python").check(projects)
+
+        self.assertEqual([result["reason"] for result in strict], ["too_large", "not_found"])
+        self.assertEqual([result["reason"] for result in unlimited], ["ok", "not_found"])
+        self.assertEqual([result["reason"] for result in python], ["language", "not_found"])
+        self.assertEqual(len(RepositoryAPI.requests), 2)
+
+    def test_other_remotes_use_ls_remote(self):
+        def git(*args):
+            subprocess.run(["git", *args], check=True, capture_output=True)
+
+        remote, empty = os.path.join(self.tmp_dir.name, "remote"), os.path.join(self.tmp_dir.name, "empty.git")
+        git("init", "-q", remote)
+        git("-C", remote, "-c", "user.name=test", "-c", "user.email=test@example.com", "commit", "-q",
+            "--allow-empty", "-m", "initial")
+        git("init", "-q", "--bare", empty)
+
+        results = self.checker().check([("remote", remote), ("empty", empty),
+                                        ("missing", os.path.join(self.tmp_dir.name, "missing"))])
+
+        self.assertEqual([result["reason"] for result in results], ["ok", "empty", "not_found"])
+        self.assertEqual(RepositoryAPI.requests, [])
+
+    def test_search_items_are_evaluated_without_requests(self):
+        item = dict(repository("u/python", language="Python"), name="python")
+
+        result = self.checker().evaluate("python", item["html_url"], item)
+
+        self.assertEqual((result["eligible"], result["reason"]), (False, "language"))
+        self.assertEqual(RepositoryAPI.requests, [])
+
+    def test_annotator_skips_ineligible_projects(self):
+        annotator = ComponentAnnotator("java", preflight=True, max_size_kb=100_000)
+        annotator.preflight_checker.api_url = self.api_url
+        search_items = [dict(repository(f"u/{name}", **metadata), name=name) for name, metadata in
+                        [("alive", {}), ("python", {"language": "Python"}), ("giant", {"size": 10 ** 7})]]
+
+        projects = annotator.preflight_projects([("old-name", "https://github.com/u/old-name"),
+                                                 ("deleted", "https://github.com/u/deleted")])
+        self.assertEqual(projects, [("old-name", "https://github.com/u/new-name")])
+        self.assertEqual([result["name"] for result in annotator.ineligible_projects], ["deleted"])
+        self.assertEqual(annotator.project_sizes, {"old-name": 2048})
+
+        items = list(annotator.preflight_search_results(iter(search_items)))
+        self.assertEqual([item["name"] for item in items], ["alive"])
+        self.assertEqual([result["reason"] for result in annotator.ineligible_projects], ["language", "too_large"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,165 @@
+import hashlib
+import json
+import random
+import re
+import tempfile
+import threading
+import time
+import unittest
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+from urllib.parse import parse_qs, urlparse
+
+from projectextractor.projectextractor import ProjectExtractor, SearchWindow
+
+
+def fake_repositories(num_repositories: int, seed: int = 7):
+    rng = random.Random(seed)
+    first = date(2012, 1, 1)
+    return [{"id": index, "name": f"repo{index}", "html_url": f"https://github.com/u/repo{index}",
+             "stargazers_count": int(100 * rng.paretovariate(1.5)),
+             "pushed_at": (first + timedelta(days=rng.randrange(3000))).isoformat()}
+            for index in range(num_repositories)]
+
+
+def matches(repository, query: str) -> bool:
+    pushed, stars = repository["pushed_at"], repository["stargazers_count"]
+    for qualifier in query.split():
+        name, value = qualifier.split(":", 1)
+        if name == "pushed":
+            if value.startswith("<"):
+                if not pushed < value[1:]:
+                    return False
+            else:
+                start, end = value.split("..")
+                if not start <= pushed <= end:
+                    return False
+        elif name == "stars":
+            if value.startswith(">="):
+                if stars < int(value[2:]):
+                    return False
+            else:
+                low, high = map(int, value.split(".."))
+                if not low <= stars <= high:
+                    return False
+    return True
+
+
+class SearchAPI(BaseHTTPRequestHandler):
+    """
+    Stand-in for the GitHub repository search: caps results at 1000, supports ETags and an exhausted rate limit.
+    """
+    repositories = []
+    requests = []
+    rate_limited_requests = set()
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        SearchAPI.requests.append(params)
+        if len(SearchAPI.requests) in SearchAPI.rate_limited_requests:
+            return self.respond(403, {"message": "API rate limit exceeded"},
+                                {"X-RateLimit-Remaining": "0", "X-RateLimit-Reset": str(int(time.time()) + 30)})
+
+        per_page, page = int(params["per_page"]), int(params["page"])
+        if per_page * page > 1000:
+            return self.respond(422, {"message": "Only the first 1000 search results are available"})
+        found = [repository for repository in SearchAPI.repositories if matches(repository, params["q"])]
+        body = {"total_count": len(found), "items": found[(page - 1) * per_page:page * per_page]}
+        etag = '"' + hashlib.sha256(json.dumps(body).encode()).hexdigest() + '"'
+        if self.headers.get("If-None-Match") == etag:
+            return self.respond(304, None, {"ETag": etag})
+        self.respond(200, body, {"ETag": etag, "X-RateLimit-Remaining": "29"})
+
+    def respond(self, status, body, headers=None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        data = json.dumps(body).encode() if body is not None else b""
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestSearchAPI(unittest.TestCase):
+    def setUp(self):
+        SearchAPI.repositories = fake_repositories(2500)
+        SearchAPI.requests = []
+        SearchAPI.rate_limited_requests = set()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), SearchAPI)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.cache_dir = tempfile.TemporaryDirectory()
+        self.base_url = f"http://127.0.0.1:{self.server.server_port}/search/repositories"
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.cache_dir.cleanup()
+
+    def extractor(self) -> ProjectExtractor:
+        return ProjectExtractor(min_stars=100, last_pushed_date="2022-01-01", base_url=self.base_url,
+                                cache_dir=self.cache_dir.name, token="")
+
+    def test_pages_past_the_search_cap(self):
+        projects = list(self.extractor().iter_abandoned_projects())
+
+        self.assertEqual(sorted(project["id"] for project in projects), list(range(2500)))
+        self.assertTrue(all(int(params["per_page"]) == 100 for params in SearchAPI.requests))
+
+    def test_amount_and_paging(self):
+        projects = self.extractor().find_abandoned_projects(150)
+
+        self.assertEqual(len(projects), 150)
+        self.assertEqual(len({project["id"] for project in projects}), 150)
+        # 150 projects fit into the results of the whole search, the query is not split.
+        self.assertEqual([(params["per_page"], params["page"]) for params in SearchAPI.requests],
+                         [("100", "1"), ("100", "2")])
+        self.assertFalse(any(re.search(r"pushed:\S+\.\.", params["q"]) for params in SearchAPI.requests))
+
+    def test_splits_for_amounts_past_the_search_cap(self):
+        projects = self.extractor().find_abandoned_projects(1200)
+
+        self.assertEqual(len({project["id"] for project in projects}), 1200)
+        self.assertTrue(any(re.search(r"pushed:\S+\.\.", params["q"]) for params in SearchAPI.requests))
+
+    def test_streams_before_discovery_finishes(self):
+        projects = self.extractor().iter_abandoned_projects()
+        next(projects)
+        self.assertLess(len(SearchAPI.requests), 10)
+
+    def test_conditional_requests(self):
+        first = self.extractor().find_abandoned_projects(300)
+        extractor = self.extractor()
+        second = extractor.find_abandoned_projects(300)
+
+        self.assertEqual(first, second)
+        self.assertEqual(extractor.stats["not_modified"], extractor.stats["requests"])
+
+    def test_rate_limit(self):
+        SearchAPI.rate_limited_requests = {2}
+        extractor = self.extractor()
+        with patch("time.sleep") as sleep:
+            projects = extractor.find_abandoned_projects(250)
+
+        self.assertEqual(len(projects), 250)
+        self.assertEqual(extractor.stats["rate_limited"], 1)
+        self.assertGreater(sleep.call_args[0][0], 20)
+
+    def test_window_split(self):
+        window = SearchWindow(date(2020, 1, 1), date(2020, 1, 4), 100)
+        first, second = window.split()
+        self.assertEqual((first.pushed_to, second.pushed_from), (date(2020, 1, 2), date(2020, 1, 3)))
+
+        day = SearchWindow(date(2020, 1, 1), date(2020, 1, 1), 100)
+        low, high = day.split()
+        self.assertEqual(low.qualifiers(), "stars:100..199 pushed:2020-01-01..2020-01-01")
+        self.assertEqual(high.qualifiers(), "stars:>=200 pushed:2020-01-01..2020-01-01")
+        self.assertIsNone(SearchWindow(date(2020, 1, 1), date(2020, 1, 1), 5, 5).split())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import Mock, patch
+
+from projectextractor.wasteservice import parse_wasteservice, wasteservice_projects
+from projectregistry.projectregistry import ProjectRegistry
+
+FIXTURE = os.path.join(os.path.dirname(__file__), "fixtures", "wasteservice.html")
+
+
+def fixture_html() -> str:
+    with open(FIXTURE) as file:
+        return file.read()
+
+
+class TestWasteService(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.registry = ProjectRegistry(os.path.join(self.tmp_dir.name, "projects.db"))
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_parse_fixture(self):
+        projects = parse_wasteservice(fixture_html())
+
+        self.assertEqual(projects, [("jsonkit", "https://github.com/alice/jsonkit"),
+                                    ("bits4j", "https://github.com/bob/bits4j"),
+                                    ("tiny-orm", "https://github.com/carol/tiny-orm"),
+                                    ("Plain Cell", "https://github.com/erin/plain-cell")])
+
+    def test_parse_without_table(self):
+        with self.assertRaises(ValueError):
+            parse_wasteservice("<html><body><p>Maintenance</p></body></html>")
+
+    @patch("requests.get")
+    def test_projects_are_fetched_once_and_excluded(self, mock_get):
+        mock_get.return_value = Mock(status_code=200, text=fixture_html())
+
+        projects = wasteservice_projects(self.registry)
+        cached = wasteservice_projects(self.registry)
+
+        # bits4j is one of the excluded (dead) projects.
+        self.assertEqual([name for name, _ in projects], ["Plain Cell", "jsonkit", "tiny-orm"])
+        self.assertEqual(cached, projects)
+        self.assertEqual(mock_get.call_count, 1)
+
+        wasteservice_projects(self.registry, refresh=True)
+        self.assertEqual(mock_get.call_count, 2)
+        self.assertEqual(len(self.registry.fetches("wasteservice")), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,44 @@
+import os
+import tempfile
+import unittest
+
+from projectregistry.projectregistry import ProjectRegistry
+
+
+class TestProjectRegistry(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, "registry", "projects.db")
+        self.registry = ProjectRegistry(self.path)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_versions_and_diff(self):
+        first = self.registry.save("wasteservice", [("a", "https://github.com/u/a"), ("b", "https://github.com/u/b")])
+        second = self.registry.save("wasteservice", [("b", "https://github.com/u/b"), ("c", "https://github.com/u/c")])
+
+        self.assertEqual([name for name, _ in first["added"]], ["a", "b"])
+        self.assertEqual(second, {"added": [("c", "https://github.com/u/c")],
+                                  "removed": [("a", "https://github.com/u/a")]})
+        fetches = self.registry.fetches("wasteservice")
+        self.assertEqual([fetch["num_projects"] for fetch in fetches], [2, 2])
+        self.assertEqual([name for name, _ in self.registry.projects("wasteservice")], ["b", "c"])
+        self.assertEqual([name for name, _ in self.registry.projects("wasteservice", fetches[0]["id"])], ["a", "b"])
+        self.assertEqual(self.registry.projects("github"), [])
+
+    def test_exclusions(self):
+        self.assertIn("bits4j", self.registry.excluded())
+        self.registry.save("wasteservice", [("a", "https://github.com/u/a"), ("bits4j", "https://github.com/u/bits4j")])
+        self.registry.exclude("a", "Arcan runs out of memory")
+
+        self.assertEqual(self.registry.projects("wasteservice"), [])
+        self.assertEqual(len(self.registry.projects("wasteservice", include_excluded=True)), 2)
+
+        # Reopening keeps exclusions added later, the shipped list does not overwrite them.
+        self.registry.exclude("bits4j", "custom reason")
+        self.assertEqual(ProjectRegistry(self.path).excluded()["bits4j"], "custom reason")
+
+
+if __name__ == '__main__':
+    unittest.main()
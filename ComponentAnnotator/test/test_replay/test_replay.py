@@ -0,0 +1,96 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import pandas as pd
+from sqlalchemy import create_engine
+
+from benchmark.benchmark import compare_to_baseline, synthetic_fixtures
+from componentannotator.componentannotator import ComponentAnnotator
+from replay.replay import Fixtures
+
+
+class TestReplay(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.cwd = os.getcwd()
+        # The aggregator writes a CSV per project into the working directory.
+        os.chdir(self.tmp_dir)
+        self.fixtures = synthetic_fixtures(os.path.join(self.tmp_dir, "fixtures"), num_projects=2, num_nodes=200)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.tmp_dir)
+
+    def annotator(self, name: str, **kwargs) -> ComponentAnnotator:
+        database_url = f"sqlite:///{os.path.join(self.tmp_dir, name + '.db')}"
+        return ComponentAnnotator("java", database_url=database_url, **kwargs)
+
+    def test_replay_project_list(self):
+        annotator = self.annotator("replay", replay_dir=self.fixtures.fixtures_dir)
+
+        frames = annotator.annotate_projects(10)
+
+        self.assertEqual(len(frames), 2)
+        self.assertEqual(annotator.batch_stats["failed"], 0)
+        stages = [record["stage"] for record in annotator.instrumentation.records]
+        self.assertEqual(stages.count("graph_load"), 2)
+        self.assertNotIn("arcan", stages)
+        with create_engine(annotator.config["database_url"]).connect() as connection:
+            stored = pd.read_sql("SELECT projectname, COUNT(*) AS files FROM component_annotations "
+                                 "GROUP BY projectname ORDER BY projectname", connection)
+        self.assertEqual(stored["files"].tolist(), [len(frame) for frame in sorted(
+            frames, key=lambda frame: frame["projectname"].iloc[0])])
+
+    def test_replay_missing_graph_fails_project(self):
+        os.remove(self.fixtures.graph_file("synthetic-200-1"))
+        annotator = self.annotator("replay", replay_dir=self.fixtures.fixtures_dir)
+
+        frames = annotator.annotate_projects(10)
+
+        self.assertEqual(len(frames), 1)
+        self.assertEqual(annotator.batch_stats["failed"], 1)
+
+    def test_record_then_replay(self):
+        project = self.fixtures.load_projects()[0]
+        record_dir = os.path.join(self.tmp_dir, "recorded")
+        annotator = self.annotator("record", record_dir=record_dir)
+        # auto-fl is answered by the synthetic fixtures, Arcan "writes" the synthetic graph.
+        annotator.auto_fl_client = self.fixtures.auto_fl_client()
+        annotator.auto_fl_client.record_dir = annotator.fixtures.autofl_dir
+        extractor = annotator.component_extractor
+        extractor.arcan_out = os.path.join(self.tmp_dir, "arcan") + "/"
+
+        def fake_arcan():
+            os.makedirs(extractor._output_directory(), exist_ok=True)
+            shutil.copyfile(self.fixtures.graph_file(project["name"]),
+                            os.path.join(extractor._output_directory(), "dependency-graph-1_abc123.graphml"))
+
+        with patch.object(extractor, "_run_arcan", side_effect=fake_arcan), \
+                patch.object(annotator.project_extractor, "iter_abandoned_projects", return_value=iter([project])):
+            recorded = annotator.annotate_projects(1)
+
+        replayed = self.annotator("replay", replay_dir=record_dir).annotate_projects(1)
+
+        self.assertEqual(Fixtures(record_dir).load_projects(), [project])
+        pd.testing.assert_frame_equal(recorded[0].reset_index(drop=True), replayed[0].reset_index(drop=True))
+
+    def test_record_and_replay_are_exclusive(self):
+        with self.assertRaises(ValueError):
+            ComponentAnnotator("java", record_dir=self.tmp_dir, replay_dir=self.tmp_dir)
+
+    def test_compare_to_baseline(self):
+        baseline = {"projects_per_hour": 100.0, "stages": {"labels": 1.0, "communities": 2.0}}
+        result = {"projects_per_hour": 90.0, "stages": {"labels": 1.1, "communities": 3.0, "arcan": 5.0}}
+
+        regressions = compare_to_baseline(result, baseline, tolerance=0.2)
+
+        self.assertEqual(len(regressions), 1)
+        self.assertIn("communities", regressions[0])
+        self.assertEqual(len(compare_to_baseline({**result, "projects_per_hour": 50.0}, baseline)), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+import os
+import tempfile
+import unittest
+
+from componentannotator.componentannotator import ComponentAnnotator
+from repositorycache.repositorycache import RepositoryCache, run_git
+
+
+def make_remote(path: str, name: str, num_commits: int = 2) -> str:
+    repository = os.path.join(path, name)
+    os.makedirs(repository)
+    run_git("init", "--quiet", "-b", "main", cwd=repository)
+    for index in range(num_commits):
+        with open(os.path.join(repository, f"File{index}.java"), "w") as file:
+            file.write(f"class File{index} {{}}\n" + "x" * 2000)
+        run_git("add", ".", cwd=repository)
+        run_git("-c", "user.name=test", "-c", "user.email=test@example.com",
+                "commit", "--quiet", "-m", f"commit {index}", cwd=repository)
+    return repository
+
+
+class TestRepositoryCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.remote = make_remote(self.tmp_dir.name, "project")
+        self.cache = RepositoryCache(os.path.join(self.tmp_dir.name, "cache"))
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_update_hits_after_first_clone(self):
+        mirror = self.cache.update(self.remote)
+        self.assertEqual(self.cache.update(self.remote), mirror)
+
+        metrics = self.cache.metrics()
+        self.assertEqual((metrics["hits"], metrics["misses"]), (1, 1))
+        self.assertEqual(metrics["repositories"], 1)
+        self.assertGreater(metrics["bytes"], 0)
+
+    def test_checkout_and_pinned_commit(self):
+        destination = os.path.join(self.tmp_dir.name, "repository", "project")
+        first_commit = run_git("rev-list", "--max-parents=0", "HEAD", cwd=self.remote).strip()
+
+        self.cache.checkout(self.remote, destination)
+        self.assertTrue(os.path.exists(os.path.join(destination, "File1.java")))
+
+        self.cache.checkout(self.remote, destination, commit=first_commit)
+        self.assertFalse(os.path.exists(os.path.join(destination, "File1.java")))
+        self.assertEqual(run_git("rev-parse", "HEAD", cwd=destination).strip(), first_commit)
+
+    def test_fetches_new_commits(self):
+        self.cache.update(self.remote)
+        run_git("-c", "user.name=test", "-c", "user.email=test@example.com",
+                "commit", "--quiet", "--allow-empty", "-m", "new", cwd=self.remote)
+
+        mirror = self.cache.update(self.remote)
+
+        self.assertEqual(run_git("rev-parse", "main", cwd=mirror), run_git("rev-parse", "HEAD", cwd=self.remote))
+        self.assertEqual(self.cache.remote_head(self.remote), run_git("rev-parse", "HEAD", cwd=self.remote).strip())
+
+    def test_lru_eviction(self):
+        other = make_remote(self.tmp_dir.name, "other")
+        self.cache.update(self.remote)
+        self.cache.max_bytes = 1
+
+        self.cache.update(other)
+
+        self.assertFalse(os.path.exists(self.cache.mirror_path(self.remote)))
+        self.assertTrue(os.path.exists(self.cache.mirror_path(other)))
+        self.assertEqual(self.cache.metrics()["evictions"], 1)
+
+    def test_shallow_mirror(self):
+        cache = RepositoryCache(os.path.join(self.tmp_dir.name, "shallow-cache"), shallow=True)
+        mirror = cache.update("file://" + self.remote)
+
+        self.assertEqual(run_git("rev-list", "--count", "--all", cwd=mirror).strip(), "1")
+
+    def test_shallow_checkout_of_pinned_commit(self):
+        cache = RepositoryCache(os.path.join(self.tmp_dir.name, "shallow-cache"), shallow=True)
+        run_git("config", "uploadpack.allowAnySHA1InWant", "true", cwd=self.remote)
+        first_commit = run_git("rev-list", "--max-parents=0", "HEAD", cwd=self.remote).strip()
+        destination = os.path.join(self.tmp_dir.name, "repository", "project")
+
+        cache.checkout("file://" + self.remote, destination, commit=first_commit)
+
+        self.assertEqual(run_git("rev-parse", "HEAD", cwd=destination).strip(), first_commit)
+
+    def test_annotator_passes_partial_clone_filter(self):
+        run_git("config", "uploadpack.allowFilter", "true", cwd=self.remote)
+        annotator = ComponentAnnotator("java", repository_cache_dir=os.path.join(self.tmp_dir.name, "filtered-cache"),
+                                       repository_filter="blob:none")
+
+        mirror = annotator.component_extractor.repository_cache.update("file://" + self.remote)
+
+        self.assertEqual(run_git("config", "remote.origin.partialclonefilter", cwd=mirror).strip(), "blob:none")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from resultswriter.parquetsink import ParquetSink, read_results
+from testutils import dummy_component_annot_df
+
+
+class TestParquetSink(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.sink = ParquetSink(os.path.join(self.tmp_dir.name, "results"))
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_partitioned_by_project(self):
+        self.sink.write("p1", dummy_component_annot_df(3))
+        self.sink.write("p2", dummy_component_annot_df(2))
+
+        self.assertEqual(sorted(os.listdir(self.sink.root_dir)), ["projectname=p1", "projectname=p2"])
+        df = read_results(self.sink.root_dir)
+        self.assertEqual(len(df), 5)
+        self.assertEqual(len(read_results(self.sink.root_dir, ["p2"])), 2)
+
+    def test_distribution_is_list_column(self):
+        self.sink.write("p1", dummy_component_annot_df(1))
+
+        partition = os.path.join(self.sink.root_dir, "projectname=p1")
+        schema = pq.read_schema(os.path.join(partition, os.listdir(partition)[0]))
+        distribution_type = schema.field("distribution").type
+        self.assertTrue(pa.types.is_list(distribution_type))
+        self.assertEqual(distribution_type.value_type, pa.float32())
+        distribution = read_results(self.sink.root_dir)["distribution"][0]
+        np.testing.assert_array_equal(distribution, np.array([0.25, 0.75], dtype=np.float32))
+
+    def test_write_replaces_project(self):
+        self.sink.write("p1", dummy_component_annot_df(3))
+        self.sink.write("p1", dummy_component_annot_df(1))
+
+        self.assertEqual(len(read_results(self.sink.root_dir)), 1)
+
+    def test_missing_values(self):
+        df = dummy_component_annot_df(1)
+        df.loc[0, ["distribution", "component", "mismatch"]] = [None, None, None]
+        df["case"] = np.nan
+        self.sink.write("p1", df)
+
+        row = read_results(self.sink.root_dir).iloc[0]
+        self.assertIsNone(row["distribution"])
+        self.assertIsNone(row["case"])
+
+
+if __name__ == '__main__':
+    unittest.main()
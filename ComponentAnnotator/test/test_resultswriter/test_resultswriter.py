@@ -0,0 +1,119 @@
+import gc
+import json
+import os
+import tempfile
+import unittest
+import weakref
+
+import numpy as np
+from sqlalchemy import text
+
+from componentaggregator.componentaggregator import ComponentAggregator
+from resultswriter.resultswriter import ResultsWriter, result_rows
+from testutils import dummy_component_annot_df
+
+
+class TestResultsWriter(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.url = f"sqlite:///{os.path.join(self.tmp_dir.name, 'results.db')}"
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def read_results(self, writer):
+        with writer.engine.connect() as connection:
+            return connection.execute(text(
+                "SELECT projectname, path, distribution, component FROM component_annotations "
+                "ORDER BY projectname, path")).fetchall()
+
+    def test_result_rows(self):
+        df = dummy_component_annot_df(1)
+        df["case"] = np.nan
+        rows = result_rows("p1", df)
+        self.assertEqual(rows, [("p1", "F0.java", "p", [0.25, 0.75], False, "L1", 0, "L1", False, None)])
+
+    def test_write_replaces_project(self):
+        writer = ResultsWriter(self.url, asynchronous=False)
+        writer.write("p1", dummy_component_annot_df(3))
+        writer.write("p2", dummy_component_annot_df(2))
+        writer.write("p1", dummy_component_annot_df(1))
+
+        rows = self.read_results(writer)
+        self.assertEqual([(name, path) for name, path, _, _ in rows], [("p1", "F0.java"), ("p2", "F0.java"),
+                                                                       ("p2", "F1.java")])
+        self.assertEqual(json.loads(rows[0][2]), [0.25, 0.75])
+        self.assertEqual(writer.rows_written, 6)
+
+    def test_asynchronous_batches(self):
+        writer = ResultsWriter(self.url, batch_rows=4)
+        for index in range(5):
+            writer.write(f"p{index}", dummy_component_annot_df(2))
+        writer.flush()
+
+        self.assertEqual(len(self.read_results(writer)), 10)
+        self.assertEqual(writer.rows_written, 10)
+        thread = writer._state.thread
+        writer.close()
+        self.assertFalse(thread.is_alive())
+
+    def test_unused_writer_is_collected(self):
+        writer = ResultsWriter(self.url)
+        self.assertIsNone(writer._state.thread)
+        writer.write("p1", dummy_component_annot_df(2))
+        thread, reference = writer._state.thread, weakref.ref(writer)
+
+        del writer
+        gc.collect()
+
+        # The finalizer wrote the queued project and stopped the thread.
+        self.assertIsNone(reference())
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(len(self.read_results(ResultsWriter(self.url, asynchronous=False))), 2)
+
+    def test_flush_raises_write_errors(self):
+        writer = ResultsWriter(self.url, table="invalid table name")
+        written = []
+        writer.write("p1", dummy_component_annot_df(1), on_written=lambda write_s: written.append("p1"))
+        with self.assertRaises(RuntimeError):
+            writer.flush()
+        writer.close()
+        self.assertEqual(written, [])
+
+    def test_on_written_after_write(self):
+        writer = ResultsWriter(self.url)
+        written = []
+        for index in range(3):
+            writer.write(f"p{index}", dummy_component_annot_df(index + 1),
+                         on_written=lambda write_s, index=index: written.append((index, write_s,
+                                                                                 len(self.read_results(writer)))))
+        writer.close()
+
+        self.assertEqual([index for index, _, _ in written], [0, 1, 2])
+        self.assertTrue(all(num_rows > index for index, _, num_rows in written))
+        self.assertTrue(all(write_s > 0 for _, write_s, _ in written))
+
+    def test_in_memory_sqlite(self):
+        writer = ResultsWriter("sqlite://", asynchronous=False)
+        writer.write("p1", dummy_component_annot_df(2))
+
+        self.assertEqual(len(self.read_results(writer)), 2)
+
+    def test_aggregator_writes_single_table(self):
+        writer = ResultsWriter(self.url, asynchronous=False)
+        aggregator = ComponentAggregator(writer)
+        aggregator.project_name = "p1"
+
+        cwd = os.getcwd()
+        os.chdir(self.tmp_dir.name)
+        try:
+            aggregator._save_to_database(dummy_component_annot_df(2))
+        finally:
+            os.chdir(cwd)
+
+        self.assertEqual(len(self.read_results(writer)), 2)
+        self.assertTrue(os.path.exists(os.path.join(self.tmp_dir.name, "output_p1.csv")))
+
+
+if __name__ == '__main__':
+    unittest.main()
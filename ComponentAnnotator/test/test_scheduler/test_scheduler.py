@@ -0,0 +1,110 @@
+import json
+import os
+import tempfile
+import unittest
+
+from componentannotator.componentannotator import ComponentAnnotator
+from scheduler.scheduler import DEFAULT_PROJECT_SECONDS, CostModel, load_deferred, plan_batch, save_deferred
+
+
+def project_record(name, wall_s, size_kb=None, status="ok"):
+    return {"project": name, "stage": "project", "wall_s": wall_s, "status": status, "size_kb": size_kb}
+
+
+def project(name, size=None):
+    return {"name": name, "html_url": f"https://github.com/u/{name}", "size": size}
+
+
+class TestCostModel(unittest.TestCase):
+
+    def test_fit_to_history(self):
+        # 100s plus 10s per MiB.
+        records = [project_record(f"p{index}", 100 + 10 * index, size_kb=1024 * index) for index in range(1, 7)]
+        records.append(project_record("failed", 5, size_kb=1024 * 100, status="failed"))
+        records.append({"project": "p1", "stage": "labels", "wall_s": 1.0, "status": "ok"})
+        model = CostModel(records)
+
+        self.assertAlmostEqual(model.seconds_per_mb, 10.0)
+        self.assertAlmostEqual(model.intercept, 100.0)
+        self.assertAlmostEqual(model.estimate(project("new", size=1024 * 50)), 600.0)
+        # Known projects take as long as last time, projects without size the median.
+        self.assertEqual(model.estimate(project("p2", size=1024 * 50)), 120.0)
+        self.assertEqual(model.estimate(project("unknown")), 135.0)
+
+    def test_defaults_without_history(self):
+        model = CostModel()
+
+        self.assertEqual(model.estimate(project("unknown")), DEFAULT_PROJECT_SECONDS)
+        self.assertLess(model.estimate(project("small", size=1024)), model.estimate(project("large", size=10240)))
+
+    def test_from_metrics_skips_missing_files(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "metrics.jsonl")
+            with open(path, "w") as file:
+                file.write(json.dumps(project_record("p1", 42.0)) + "\n")
+
+            model = CostModel.from_metrics([path, os.path.join(tmp_dir, "missing.jsonl"), None])
+
+        self.assertEqual(model.measured, {"p1": 42.0})
+
+
+class TestPlanBatch(unittest.TestCase):
+
+    def setUp(self):
+        self.model = CostModel([project_record(name, wall_s) for name, wall_s in
+                                [("a", 10), ("b", 80), ("c", 30), ("d", 40), ("e", 20), ("giant", 500)]])
+
+    def test_longest_first(self):
+        ordered, deferred, makespan = plan_batch([project(name) for name in "abcde"], self.model, num_workers=2)
+
+        self.assertEqual([item["name"] for item in ordered], ["b", "d", "c", "e", "a"])
+        self.assertEqual(deferred, [])
+        # Worker loads: b, a = 90 and d, c, e = 90.
+        self.assertEqual(makespan, 90)
+
+    def test_time_budget_defers_projects(self):
+        projects = [project(name) for name in ["a", "giant", "b", "c", "d"]]
+
+        ordered, deferred, makespan = plan_batch(projects, self.model, num_workers=2, time_budget=90)
+
+        self.assertEqual([item["name"] for item in ordered], ["b", "d", "c", "a"])
+        self.assertEqual([(item["name"], item["reason"]) for item in deferred], [("giant", "too_large")])
+        self.assertLessEqual(makespan, 90)
+
+        ordered, deferred, _ = plan_batch(projects, self.model, num_workers=1, time_budget=90)
+        self.assertEqual([item["name"] for item in ordered], ["b", "a"])
+        self.assertEqual({item["name"]: item["reason"] for item in deferred},
+                         {"giant": "too_large", "d": "budget", "c": "budget"})
+
+    def test_annotator_schedules_and_records_sizes(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            history = os.path.join(tmp_dir, "metrics.jsonl")
+            with open(history, "w") as file:
+                file.write(json.dumps(project_record("giant", 5000.0)) + "\n")
+            annotator = ComponentAnnotator("java", time_budget=3600, cost_history=[history])
+
+            projects = annotator.schedule_projects([project("small", size=1024), project("giant", size=10),
+                                                    project("large", size=1024 * 100)])
+
+        self.assertEqual([name for name, _ in projects], ["large", "small"])
+        self.assertEqual([item["name"] for item in annotator.deferred_projects], ["giant"])
+        self.assertEqual(annotator.project_sizes, {"small": 1024, "giant": 10, "large": 1024 * 100})
+
+    def test_deferred_projects_reach_the_next_batch(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            deferred_path = os.path.join(tmp_dir, "deferred.json")
+            self.assertEqual(load_deferred(deferred_path), [])
+            save_deferred(deferred_path, [dict(project("late", size=2048), estimated_s=100.0, reason="budget")])
+            self.assertEqual(load_deferred(deferred_path), [project("late", size=2048)])
+
+            annotator = ComponentAnnotator("java", time_budget=3600, cost_history=[], deferred_path=deferred_path)
+            projects = annotator.schedule_projects([project("small", size=1024), project("giant", size=1024 * 1000)])
+
+            self.assertEqual([name for name, _ in projects], ["late", "small"])
+            self.assertEqual(annotator.project_sizes["late"], 2048)
+            self.assertEqual(load_deferred(deferred_path), [project("giant", size=1024 * 1000)])
+            self.assertEqual(os.listdir(tmp_dir), ["deferred.json"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+import os
+import tempfile
+import unittest
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import networkx as nx
+import pandas as pd
+
+from componentannotator.componentannotator import ComponentAnnotator
+from stagemanifest.stagemanifest import StageManifest
+
+
+def dummy_file_annot():
+    return pd.DataFrame({"path": ["A.java", "B.java"], "package": ["p", "p"], "distribution": [[0.2, 0.8]] * 2,
+                         "unannotated": [False, False], "label": ["L1", "L1"]})
+
+
+class TestStageManifest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.manifest_path = os.path.join(self.tmp_dir.name, "manifest.db")
+        self.manifest = StageManifest(self.manifest_path)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_stage_outputs_roundtrip(self):
+        self.manifest.save_labels("p1", dummy_file_annot())
+        self.manifest.save_communities("p1", SimpleNamespace(communities=[["1", "2"], ["3"]],
+                                                             method_name="Infomap", method_parameters={"flags": ""}))
+
+        reopened = StageManifest(self.manifest_path)
+        self.assertEqual(reopened.completed_stages("p1"), {"labels", "communities"})
+        pd.testing.assert_frame_equal(reopened.load_labels("p1"), dummy_file_annot())
+        self.assertEqual(reopened.load_communities("p1").communities, [["1", "2"], ["3"]])
+
+    def test_reset(self):
+        self.manifest.save_aggregate("p1", dummy_file_annot())
+        self.assertEqual(self.manifest.completed_projects(), ["p1"])
+
+        self.manifest.reset("p1")
+
+        self.assertEqual(self.manifest.completed_stages("p1"), set())
+        with self.assertRaises(ValueError):
+            self.manifest.mark("p1", "unknown-stage")
+
+
+class TestResumableAnnotation(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.manifest_path = os.path.join(self.tmp_dir.name, "manifest.db")
+        self.graph_file = os.path.join(self.tmp_dir.name, "dependency-graph-1_abc.graphml")
+        graph = nx.DiGraph()
+        graph.add_node("1", filePathRelative="A.java")
+        graph.add_node("2", filePathRelative="B.java")
+        graph.add_edge("1", "2")
+        nx.write_graphml(graph, self.graph_file)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def annotator(self, **kwargs):
+        annotator = ComponentAnnotator("java", manifest_path=self.manifest_path, **kwargs)
+        # Writing succeeds without a database.
+        annotator.component_aggregator._save_to_database = lambda df_project, on_written=None: on_written(0.0)
+        return annotator
+
+    def test_resumes_from_last_completed_stage(self):
+        annotator = self.annotator()
+        annotator.manifest.save_labels("p1", dummy_file_annot())
+        annotator.manifest.save_graph("p1", self.graph_file)
+
+        with patch.object(annotator, "_annotate_file") as annotate_file, \
+                patch.object(annotator.component_extractor, "_run_arcan") as run_arcan:
+            df_components = annotator.annotate_project("p1", "https://github.com/u/p1")
+
+        annotate_file.assert_not_called()
+        run_arcan.assert_not_called()
+        self.assertEqual(list(df_components["componentlabel"]), ["L1", "L1"])
+        self.assertEqual(annotator.manifest.completed_stages("p1"), {"labels", "graph", "communities", "aggregate"})
+
+        # A finished project is skipped entirely.
+        with patch.object(annotator.component_aggregator, "create_aggregate") as create_aggregate:
+            pd.testing.assert_frame_equal(annotator.annotate_project("p1", "https://github.com/u/p1"), df_components)
+        create_aggregate.assert_not_called()
+
+    def test_force_reruns_stages(self):
+        annotator = self.annotator(force=True)
+        annotator.manifest.save_labels("p1", dummy_file_annot())
+
+        with patch.object(annotator, "_annotate_file", return_value=pd.DataFrame()) as annotate_file:
+            with self.assertRaises(RuntimeError):
+                annotator.annotate_project("p1", "https://github.com/u/p1")
+
+        annotate_file.assert_called_once()
+        self.assertEqual(annotator.manifest.completed_stages("p1"), set())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+from testutils import FakeAnnotator
+from workqueue.workqueue import QueueWorker, WorkQueue
+
+
+class TestWorkQueue(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.url = f"sqlite:///{os.path.join(self.tmp_dir.name, 'queue.db')}"
+        self.queue = WorkQueue(self.url, lease_seconds=60, max_attempts=2)
+        self.projects = [(f"p{index}", f"https://github.com/u/p{index}") for index in range(4)]
+
+    def tearDown(self):
+        self.queue.engine.dispose()
+        self.tmp_dir.cleanup()
+
+    def test_enqueue_and_lease(self):
+        self.assertEqual(self.queue.enqueue(self.projects), 4)
+        self.assertEqual(self.queue.enqueue(self.projects[:2] + [("p9", "https://github.com/u/p9")]), 1)
+
+        first = self.queue.lease("w1", limit=2)
+        second = self.queue.lease("w2", limit=2)
+
+        self.assertEqual([item["project"] for item in first], ["p0", "p1"])
+        self.assertEqual([item["project"] for item in second], ["p2", "p3"])
+        self.assertTrue(self.queue.complete("w1", "p0"))
+        self.assertFalse(self.queue.complete("w2", "p1"))
+        self.assertEqual(self.queue.counts(), {"pending": 1, "leased": 3, "done": 1, "failed": 0})
+        # Another queue in the same table is independent.
+        self.assertEqual(WorkQueue(self.url, queue_name="other").counts()["pending"], 0)
+
+    def test_expired_lease_is_retried_and_given_up(self):
+        self.queue.enqueue(self.projects[:1])
+        self.queue.lease("w1")
+
+        with patch("workqueue.workqueue.time.time", return_value=time.time() + 120):
+            self.assertEqual(self.queue.lease("w2")[0]["attempts"], 2)
+        # w1 died (or stalled) and lost the project to w2.
+        self.assertFalse(self.queue.heartbeat("w1", "p0"))
+        self.assertTrue(self.queue.heartbeat("w2", "p0"))
+
+        with patch("workqueue.workqueue.time.time", return_value=time.time() + 240):
+            self.assertEqual(self.queue.lease("w3"), [])
+        self.assertEqual(self.queue.items("failed")[0]["last_error"], "lease expired 2 times")
+
+    def test_fail_retries_until_max_attempts(self):
+        self.queue.enqueue(self.projects[:1])
+
+        self.queue.lease("w1")
+        self.assertTrue(self.queue.fail("w1", "p0", "RuntimeError: boom"))
+        self.assertEqual(self.queue.items()[0]["status"], "pending")
+        self.queue.lease("w1")
+        self.queue.fail("w1", "p0", "RuntimeError: boom")
+
+        item = self.queue.items()[0]
+        self.assertEqual((item["status"], item["attempts"], item["last_error"]), ("failed", 2, "RuntimeError: boom"))
+
+    def test_release_does_not_count_attempt(self):
+        self.queue.enqueue(self.projects[:2])
+        self.queue.lease("w1", limit=2)
+
+        self.assertEqual(self.queue.release("w1"), 2)
+        self.assertEqual([item["attempts"] for item in self.queue.items("pending")], [0, 0])
+
+    def test_workers_share_queue(self):
+        projects = [(f"p{index}", f"https://github.com/u/p{index}") for index in range(20)]
+        self.queue.enqueue(projects + [("broken", "https://github.com/u/broken")])
+        annotator = FakeAnnotator(delay=0.01)
+        workers = [QueueWorker(WorkQueue(self.url, lease_seconds=60, max_attempts=2), annotator, f"w{index}")
+                   for index in range(3)]
+
+        threads = [threading.Thread(target=worker.run) for worker in workers]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual({name: count for name, count in annotator.calls.items() if name != "broken"},
+                         {name: 1 for name, _ in projects})
+        self.assertEqual(annotator.calls["broken"], 2)
+        self.assertEqual(self.queue.counts(), {"pending": 0, "leased": 0, "done": 20, "failed": 1})
+        self.assertEqual(sum(worker.stats["done"] for worker in workers), 20)
+
+    def test_write_errors_fail_the_project(self):
+        self.queue.enqueue([("unwritten", "https://github.com/u/unwritten")] + self.projects[:1])
+
+        stats = QueueWorker(self.queue, FakeAnnotator(), "w1").run()
+
+        # Both attempts of `unwritten` failed.
+        self.assertEqual(stats, {"done": 1, "failed": 2, "lost": 0})
+        item = self.queue.items("failed")[0]
+        self.assertEqual((item["project"], item["attempts"]), ("unwritten", 2))
+        self.assertIn("Failed to write results", item["last_error"])
+
+    def test_heartbeat_keeps_lease(self):
+        queue = WorkQueue(self.url, lease_seconds=0.3, max_attempts=2)
+        queue.enqueue(self.projects[:1])
+        worker = QueueWorker(queue, FakeAnnotator(delay=1.0), "w1", heartbeat_interval=0.05)
+
+        thread = threading.Thread(target=worker.run)
+        thread.start()
+        time.sleep(0.6)
+        stolen = queue.lease("w2")
+        thread.join()
+
+        self.assertEqual(stolen, [])
+        self.assertEqual(worker.stats, {"done": 1, "failed": 0, "lost": 0})
+
+
+if __name__ == '__main__':
+    unittest.main()
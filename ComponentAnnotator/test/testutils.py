@@ -0,0 +1,99 @@
+import collections
+import os
+import threading
+import time
+from types import SimpleNamespace
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from instrumentation.instrumentation import Instrumentation
+
+
+def dummy_component_annot_df(num_files=3):
+    return pd.DataFrame({
+        "path": [f"F{index}.java" for index in range(num_files)],
+        "package": ["p"] * num_files,
+        "distribution": [np.array([0.25, 0.75])] * num_files,
+        "unannotated": [False] * num_files,
+        "label": ["L1"] * num_files,
+        "component": [0] * num_files,
+        "componentlabel": ["L1"] * num_files,
+        "mismatch": [False] * num_files,
+        "case": ["success"] * num_files,
+    }, dtype=object)
+
+
+class FakeWriter:
+    """
+    Results writer whose flush fails if the results of `unwritten` are pending.
+    """
+    def __init__(self):
+        self.pending = []
+
+    def flush(self):
+        pending, self.pending = self.pending, []
+        if "unwritten" in pending:
+            raise RuntimeError("Failed to write results: [OperationalError()]")
+
+
+class FakeAnnotator:
+    """
+    Runs the labels and aggregate stages of a project without auto-fl or Arcan. Projects named `blocked-*`
+    wait until `release` is set, `broken` fails, `crash` kills the process and the results of `unwritten` cannot be
+    written. With a `state_dir` the created annotators and the projects that ran twice at the same time are recorded as
+    files, so that they can be checked across worker processes (see created_annotators and overlapping_projects).
+    """
+    def __init__(self, release: Optional[threading.Event] = None, delay: float = 0.0,
+                 state_dir: Optional[str] = None):
+        self.release = release
+        self.delay = delay
+        self.state_dir = state_dir
+        self.calls = collections.Counter()
+        self.lock = threading.Lock()
+        self.instrumentation = Instrumentation()
+        self.component_aggregator = SimpleNamespace(results_writer=FakeWriter())
+        if state_dir is not None:
+            open(os.path.join(state_dir, f"created-{os.getpid()}-{id(self)}"), "w").close()
+
+    def annotate_project(self, project_name, project_url, commit=None):
+        with self.lock:
+            self.calls[project_name] += 1
+        marker = self._mark_running(project_name)
+        try:
+            if project_name.startswith("blocked") and self.release is not None:
+                self.release.wait(10)
+            if project_name == "crash":
+                # A worker killed by the OOM killer or a segfault.
+                os._exit(1)
+            time.sleep(self.delay)
+            with self.instrumentation.stage(project_name, "labels"):
+                pass
+            with self.instrumentation.stage(project_name, "aggregate"):
+                if project_name == "broken":
+                    raise RuntimeError("no communities")
+            self.component_aggregator.results_writer.pending.append(project_name)
+            return pd.DataFrame({"path": [f"{project_name}/A.java"], "component": [0]})
+        finally:
+            if marker is not None:
+                os.remove(marker)
+
+    def _mark_running(self, project_name: str) -> Optional[str]:
+        if self.state_dir is None:
+            return None
+        marker = os.path.join(self.state_dir, f"running-{project_name}")
+        try:
+            os.close(os.open(marker, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+        except FileExistsError:
+            open(os.path.join(self.state_dir, f"overlap-{project_name}"), "w").close()
+            return None
+        return marker
+
+
+def created_annotators(state_dir: str) -> int:
+    return sum(1 for name in os.listdir(state_dir) if name.startswith("created-"))
+
+
+def overlapping_projects(state_dir: str) -> list:
+    return sorted(name[len("overlap-"):] for name in os.listdir(state_dir) if name.startswith("overlap-"))